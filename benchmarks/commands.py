@@ -0,0 +1,117 @@
+"""
+In-process QueueBot command benchmark
+
+Runs commands straight through QueueBot.queue_command (no gateway, no HTTP) with
+the mock users from test/utils.py, and reports commands per second for each
+transport. The null and memory transports show the cost of the command logic
+alone. The stdout transport (printing into an in-memory buffer, like the unit
+tests' redirect_stdout) is what testing mode used before transports existed.
+It also reports how long on_message takes to ignore ordinary chatter, both in
+other channels and in a listen channel (the bot logs to a file like it does in production).
+
+    python -m benchmarks.commands --commands 50000
+"""
+
+import io
+import os
+import time
+import random
+import asyncio
+import argparse
+from contextlib import redirect_stdout
+
+from queuebot import QueueBot, QueueConfig, NullTransport, MemoryTransport, StdoutTransport
+from test.utils import MockAuthor, MockMessage, MockVoice, MockLogger, MockGuild
+
+from .harness import BENCH_CONFIG, bench_logger, report
+
+STUDENT_COMMANDS = ["!q join"] * 3 + ["!q leave", "!q position", "!q count", "!q ping"]
+TRANSPORTS = {
+    "null": NullTransport,
+    "memory": lambda: MemoryTransport(maxlen=1000),
+    "stdout": StdoutTransport,
+}
+
+
+async def no_presence(**kwargs):
+    pass
+
+
+async def run_commands(transport, messages):
+    """
+    Returns: seconds taken to run every message through a new QueueBot
+    """
+    config = QueueConfig(dict(BENCH_CONFIG, CHECK_VOICE_WAITING="False"), test_mode=True)
+    bot = QueueBot(config, None, testing=True, transport=transport)
+    bot.logger = MockLogger()
+    bot.waiting_room = MockVoice("waiting-room")
+    bot.change_presence = no_presence
+
+    start = time.perf_counter()
+    for message in messages:
+        await bot.queue_command(message)
+    return time.perf_counter() - start
+
+
+async def ignored_message_us(count, channel_name):
+    """
+    Returns: average microseconds on_message takes to ignore a non-command message
+             sent to channel_name
+    """
+    config = QueueConfig(dict(BENCH_CONFIG, CHECK_VOICE_WAITING="False"), test_mode=True)
+    bot = QueueBot(config, bench_logger(os.devnull), testing=True, transport=NullTransport())
+    guild = MockGuild(text_channels=["join-queue", "general"])
+    await bot.apply_config(config, guild)
+    bot.is_initialized = True
+
+    channel = next(c for c in guild.text_channels if c.name == channel_name)
+    author = MockAuthor("Chatty", None)
+    messages = []
+    for i in range(count):
+        message = MockMessage(f"is anyone around? question {i} " + "x" * random.randint(0, 100), author)
+        message.channel = channel
+        messages.append(message)
+
+    start = time.perf_counter()
+    for message in messages:
+        await bot.on_message(message)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def build_messages(count, students, tas):
+    student_users = [MockAuthor(f"Student{i}", None) for i in range(students)]
+    ta_users = [MockAuthor(f"TA{i}", None, ["UGTA"]) for i in range(tas)]
+    messages = []
+    for _ in range(count):
+        if random.random() < 0.1:
+            messages.append(MockMessage("!q next", random.choice(ta_users)))
+        else:
+            messages.append(MockMessage(random.choice(STUDENT_COMMANDS), random.choice(student_users)))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=20000, help="commands to run per transport")
+    parser.add_argument("--students", type=int, default=500, help="simulated students")
+    parser.add_argument("--tas", type=int, default=6, help="simulated TAs")
+    parser.add_argument("--transports", nargs="+", choices=list(TRANSPORTS), default=list(TRANSPORTS))
+    parser.add_argument("--seed", type=int, default=120)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    messages = build_messages(args.commands, args.students, args.tas)
+    loop = asyncio.get_event_loop()
+
+    rows = [("commands", args.commands)]
+    for name in args.transports:
+        with io.StringIO() as buf, redirect_stdout(buf):
+            seconds = loop.run_until_complete(run_commands(TRANSPORTS[name](), messages))
+        rows.append((f"{name} commands/s", args.commands / seconds))
+    rows.append(("ignored message us (other channel)", loop.run_until_complete(ignored_message_us(args.commands, "general"))))
+    rows.append(("ignored message us (listen channel)", loop.run_until_complete(ignored_message_us(args.commands, "join-queue"))))
+    report("commands", rows)
+
+
+if __name__ == "__main__":
+    main()
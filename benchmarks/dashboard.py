@@ -0,0 +1,150 @@
+"""
+Dashboard server-sent events benchmark
+
+Starts a QueueBot's dashboard on a local port, connects many SSE clients to it
+and runs queue commands through the bot. Reports how long each queue change took
+to reach every client (from the start of the command to the client reading the
+event), how many diffs were delivered and how many clients were dropped for
+falling behind. The bot and the clients share one event loop, like a dashboard
+and its viewers sharing a small server.
+
+    python -m benchmarks.dashboard --clients 500 --commands 500 --rate 50
+"""
+
+import time
+import random
+import asyncio
+import argparse
+
+import aiohttp
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from queuebot import QueueBot, QueueConfig, QueueDashboard, NullTransport
+from test.utils import MockAuthor, MockMessage, MockLogger
+
+from .harness import BENCH_CONFIG, percentile, report
+
+
+async def no_presence(**kwargs):
+    pass
+
+
+async def listen(session, url, arrivals, ready):
+    """
+    Read server-sent events until the stream ends, recording when each version arrived
+
+    Parameters:
+        session: aiohttp ClientSession
+        url: dashboard events url
+        arrivals: dictionary of version -> list of arrival times (appended to)
+        ready: asyncio.Event set once the snapshot was read
+
+    Returns: number of diffs read
+    """
+    diffs = 0
+    version = None
+    async with session.get(url) as response:
+        async for line in response.content:
+            if line.startswith(b"id: "):
+                version = int(line.split(b":")[-1])
+            elif line.startswith(b"event: snapshot"):
+                ready.set()
+            elif line.startswith(b"event: diff"):
+                diffs += 1
+                arrivals.setdefault(version, []).append(time.perf_counter())
+    return diffs
+
+
+async def run(clients, commands, rate, students):
+    config = QueueConfig(dict(BENCH_CONFIG, CHECK_VOICE_WAITING="False"), test_mode=True)
+    bot = QueueBot(config, None, testing=True, transport=NullTransport())
+    bot.logger = MockLogger()
+    bot.change_presence = no_presence
+    bot.dashboard = QueueDashboard(bot, "127.0.0.1", 0)
+    await bot.dashboard.start()
+    url = f"http://127.0.0.1:{bot.dashboard.port}/events"
+
+    arrivals = {}
+    readies = [asyncio.Event() for _ in range(clients)]
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+    listeners = [asyncio.ensure_future(listen(session, url, arrivals, ready)) for ready in readies]
+    connect_start = time.perf_counter()
+    await asyncio.wait_for(asyncio.gather(*(ready.wait() for ready in readies)), 60)
+    connect_seconds = time.perf_counter() - connect_start
+
+    student_users = [MockAuthor(f"Student{i}", None) for i in range(students)]
+    ta = MockAuthor("TA", None, ["UGTA"])
+    sent_at = {}
+    interval = 1 / rate if rate > 0 else 0
+    start = time.perf_counter()
+    for i in range(commands):
+        if random.random() < 0.3:
+            message = MockMessage("!q next", ta)
+        else:
+            message = MockMessage(random.choice(["!q join", "!q join", "!q leave"]), random.choice(student_users))
+        version = bot.dashboard.version
+        command_start = time.perf_counter()
+        await bot.run_command(message)
+        if bot.dashboard.version != version:
+            sent_at[bot.dashboard.version] = command_start
+        # Let the clients read (and pace the commands)
+        await asyncio.sleep(max(0, start + (i + 1) * interval - time.perf_counter()))
+    await asyncio.sleep(0.5)
+    seconds = time.perf_counter() - start
+
+    connected = bot.dashboard.client_count
+    dropped = bot.dashboard.dropped
+    await bot.dashboard.stop()
+    delivered = sum(await asyncio.gather(*listeners))
+    await session.close()
+
+    latencies = [(arrival - sent_at[version]) * 1000
+                 for version, times in arrivals.items() if version in sent_at for arrival in times]
+    return [
+        ("clients", clients),
+        ("connect seconds", connect_seconds),
+        ("commands", commands),
+        ("queue versions", len(sent_at)),
+        ("commands/s", commands / seconds),
+        ("diffs delivered", delivered),
+        ("diffs expected", len(sent_at) * clients),
+        ("clients still connected", connected),
+        ("clients dropped", dropped),
+        ("delivery ms p50", percentile(latencies, 50)),
+        ("delivery ms p99", percentile(latencies, 99)),
+        ("delivery ms max", max(latencies) if latencies else float("nan")),
+    ]
+
+
+def raise_file_limit():
+    """
+    Each client uses two sockets (its own and the server's). Allow as many open files as possible
+    """
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=300, help="concurrent SSE clients")
+    parser.add_argument("--commands", type=int, default=500, help="queue commands to run")
+    parser.add_argument("--rate", type=float, default=50, help="commands per second (0 for as fast as possible)")
+    parser.add_argument("--students", type=int, default=100, help="simulated students")
+    parser.add_argument("--seed", type=int, default=120)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    raise_file_limit()
+    loop = asyncio.get_event_loop()
+    report("dashboard", loop.run_until_complete(run(args.clients, args.commands, args.rate, args.students)))
+
+
+if __name__ == "__main__":
+    main()
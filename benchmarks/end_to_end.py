@@ -0,0 +1,108 @@
+"""
+End to end QueueBot benchmark
+
+Connects the real QueueBot to a local fake Discord gateway/REST server
+(test/fake_discord.py), injects simulated students running commands and
+measures the time from a command being sent until its reply reaches the
+REST API.
+
+Run from the repository root:
+    python -m benchmarks.end_to_end --students 3000 --commands 5000
+"""
+
+import re
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict, deque
+
+from .harness import BENCH_CONFIG, build_server, bench_logger, start_bot, stop_bot, percentile, report
+
+MENTION = re.compile(r"<@!?(\d+)>")
+
+# Each of these commands replies with exactly one message mentioning the student
+COMMANDS = ["!q join"] * 4 + ["!q position", "!q count", "!q leave"]
+
+
+async def run_benchmark(args):
+    fake, students, tas = build_server(args.students, in_waiting_room=True if args.waiting < 0 else args.waiting)
+    logger = bench_logger(args.log_file)
+    fake.chunk_delay = args.chunk_delay
+    config = dict(BENCH_CONFIG, LAZY_MEMBERS=str(args.lazy_members))
+    bot, task, startup = await start_bot(fake, config, logger=logger)
+    members_cached = len(bot.guilds[0].members)
+
+    fake.rate_limit_every(args.rate_limit_every, args.retry_after)
+
+    injected = defaultdict(deque)  # user id -> times commands were sent
+    voice_events = 0
+    start = time.perf_counter()
+    for i in range(args.commands):
+        student = random.choice(students)
+        injected[student["id"]].append(time.perf_counter())
+        await fake.send_message(student, "join-queue", random.choice(COMMANDS))
+
+        if args.voice_every and i % args.voice_every == 0:
+            student = random.choice(students)
+            await fake.move_voice(student, None if student["id"] in fake.voice_states else "waiting-room")
+            voice_events += 1
+        if args.chatter:
+            await fake.send_message(random.choice(students), "join-queue", "is anyone around?")
+        if args.rate:
+            await asyncio.sleep(1 / args.rate)
+
+    await fake.wait_until(lambda: len(fake.sent) >= args.commands, timeout=args.timeout)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for sent in fake.sent:
+        match = MENTION.search(sent.content or "")
+        if match and injected[match.group(1)]:
+            latencies.append(sent.sent_at - injected[match.group(1)].popleft())
+
+    await stop_bot(fake, bot, task)
+
+    report("end to end", [
+        ("students", args.students),
+        ("commands", args.commands),
+        ("startup to ready (s)", startup),
+        ("members cached at ready", members_cached),
+        ("total time (s)", elapsed),
+        ("commands/s", args.commands / elapsed),
+        ("latency p50 (ms)", percentile(latencies, 50) * 1000),
+        ("latency p95 (ms)", percentile(latencies, 95) * 1000),
+        ("latency p99 (ms)", percentile(latencies, 99) * 1000),
+        ("latency max (ms)", max(latencies) * 1000),
+        ("replies", len(fake.sent)),
+        ("presence updates", len(fake.presences)),
+        ("429s served", fake.rate_limited),
+        ("voice state events", voice_events),
+        ("member chunk requests", len(fake.member_requests)),
+        ("final queue length", len(bot._queue)),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=2000, help="simulated students in the server")
+    parser.add_argument("--commands", type=int, default=2000, help="commands to send")
+    parser.add_argument("--rate", type=float, default=0, help="commands per second (0 = as fast as possible)")
+    parser.add_argument("--chatter", action="store_true", help="send a non-command message after every command")
+    parser.add_argument("--voice-every", type=int, default=10, help="send a voice state change every N commands (0 = never)")
+    parser.add_argument("--rate-limit-every", type=int, default=500, help="respond with a 429 to every Nth REST request (0 = never)")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="seconds the 429 responses ask the bot to wait")
+    parser.add_argument("--log-file", help="let QueueBot log to this file (disabled by default)")
+    parser.add_argument("--waiting", type=int, default=-1, help="students who start in the waiting room (-1 = all)")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds the fake server takes to send each member chunk")
+    parser.add_argument("--lazy-members", action="store_true", help="start the bot with LAZY_MEMBERS (no member chunking)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for all replies")
+    parser.add_argument("--seed", type=int, default=120)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    asyncio.get_event_loop().run_until_complete(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
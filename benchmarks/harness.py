@@ -0,0 +1,134 @@
+"""
+Helpers shared by the benchmarks: building a fake Discord server, running the
+real QueueBot against it and summarizing timings
+"""
+
+import time
+import asyncio
+import logging
+
+import discord
+
+from queuebot import QueueBot, QueueConfig
+from test.fake_discord import FakeDiscord
+
+BENCH_CONFIG = {
+    "SECRET_TOKEN": "BENCHMARK_TOKEN",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "True",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+    # The benchmarks wait for one reply per command, so joins are never turned away
+    "SEND_BACKLOG": "0",
+}
+
+
+def build_server(students, tas=6, in_waiting_room=True):
+    """
+    Create a fake course server with the channels BENCH_CONFIG expects
+
+    Parameters:
+        students: number of students to create
+        tas: number of TAs to create
+        in_waiting_room: True if every student starts in the waiting room
+                         (or the number of students who start there)
+
+    Returns: (FakeDiscord, list of raw student users, list of raw TA users)
+    """
+    fake = FakeDiscord()
+    fake.add_role("UGTA")
+    fake.add_text_channel("join-queue")
+    fake.add_text_channel("general")
+    fake.add_text_channel("queue-alerts")
+    fake.add_voice_channel("waiting-room")
+    for office in BENCH_CONFIG["VOICE_OFFICES"]:
+        fake.add_voice_channel(office)
+
+    ta_users = fake.add_users(tas, prefix="TA", roles=["UGTA"])
+    student_users = fake.add_users(students)
+    if in_waiting_room:
+        waiting = student_users if in_waiting_room is True else student_users[:in_waiting_room]
+        for user in waiting:
+            fake.voice_states[user["id"]] = fake._voice_state(user["id"], fake.channels["waiting-room"]["id"])
+
+    return fake, student_users, ta_users
+
+
+def bench_logger(log_file=None):
+    """
+    Returns: a logger for QueueBot. Only logs to log_file if given
+    """
+    logger = logging.getLogger("queuebot.benchmark")
+    logger.setLevel(logging.DEBUG if log_file else logging.WARNING)
+    logger.propagate = False
+    logger.handlers = []
+    if log_file:
+        handler = logging.FileHandler(log_file, encoding="utf-8")
+        handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+async def start_bot(fake, config=None, logger=None, **options):
+    """
+    Start the fake server and connect a QueueBot to it
+
+    Parameters:
+        fake: FakeDiscord server (not started yet)
+        config: config dictionary (defaults to BENCH_CONFIG)
+        logger: logger passed to QueueBot
+        options: passed to QueueBot (and then discord.Client)
+
+    Returns: (bot, task running the bot, seconds from start() until the bot was initialized)
+    """
+    url = await fake.start()
+    discord.http.Route.BASE = url + "/api/v7"
+    options.setdefault("guild_ready_timeout", 0.1)
+
+    bot = QueueBot(QueueConfig(config or BENCH_CONFIG), logger or bench_logger(), **options)
+    bot.api_url = url + "/api/v8"
+
+    start = time.perf_counter()
+    task = asyncio.ensure_future(bot.start(bot.config.SECRET_TOKEN))
+    while not bot.is_initialized:
+        if task.done():
+            task.result()  # Raise the startup error
+        await asyncio.sleep(0.001)
+
+    return bot, task, time.perf_counter() - start
+
+
+async def stop_bot(fake, bot, task):
+    await bot.close()
+    await task
+    await fake.stop()
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def report(title, rows):
+    """
+    Print benchmark results as an aligned table
+
+    Parameters:
+        title: heading for the results
+        rows: list of (name, value) tuples
+    """
+    width = max(len(name) for name, _ in rows)
+    print(f"== {title} ==")
+    for name, value in rows:
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        print(f"  {name:<{width}}  {value}")
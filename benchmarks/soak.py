@@ -0,0 +1,141 @@
+"""
+Long running QueueBot memory benchmark
+
+Runs the real QueueBot against the local fake Discord server (test/fake_discord.py)
+for several simulated hours of office hours traffic: students joining the server,
+moving in and out of voice, chatting and running commands while TAs pop the queue.
+After every simulated hour it reports the process RSS, the memory traced by
+tracemalloc in discord.py and queuebot.py, and the size of discord.py's caches.
+
+Compare the default caches with MEMORY_LEAN:
+    python -m benchmarks.soak --hours 6
+    python -m benchmarks.soak --hours 6 --lean
+"""
+
+import gc
+import os
+import sys
+import random
+import asyncio
+import argparse
+import tracemalloc
+
+from .harness import BENCH_CONFIG, build_server, bench_logger, start_bot, stop_bot, report
+
+# Only count memory allocated by the bot (not the fake server or the benchmark)
+BOT_FILTERS = [
+    tracemalloc.Filter(True, "*" + os.sep + "discord" + os.sep + "*"),
+    tracemalloc.Filter(True, "*queuebot.py"),
+]
+
+STUDENT_COMMANDS = ["!q join"] * 3 + ["!q leave", "!q position", "!q count", "!q list"]
+
+
+def rss_mb():
+    """
+    Returns: resident set size of this process in MB (peak RSS where /proc is not available)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def bot_traced_mb(snapshot):
+    return sum(stat.size for stat in snapshot.filter_traces(BOT_FILTERS).statistics("filename")) / 2**20
+
+
+async def simulate_hour(fake, students, tas, hour, args):
+    """
+    Send one simulated hour of traffic spread over args.hour_seconds seconds
+    """
+    events = (["join"] * args.joins_per_hour + ["command"] * args.commands_per_hour +
+              ["chatter"] * args.chatter_per_hour + ["voice"] * args.voice_per_hour +
+              ["next"] * args.next_per_hour)
+    random.shuffle(events)
+    delay = args.hour_seconds / max(1, len(events))
+
+    for i, event in enumerate(events):
+        if event == "join":
+            students.append(await fake.member_join(f"Hour{hour}Student{i}"))
+        elif event == "command":
+            await fake.send_message(random.choice(students), "join-queue", random.choice(STUDENT_COMMANDS))
+        elif event == "chatter":
+            channel = random.choice(["join-queue", "general"])
+            await fake.send_message(random.choice(students), channel, "is anyone around? " + "x" * random.randint(0, 200))
+        elif event == "voice":
+            student = random.choice(students)
+            await fake.move_voice(student, None if student["id"] in fake.voice_states else "waiting-room")
+        elif event == "next":
+            await fake.send_message(random.choice(tas), "join-queue", "!q next")
+        await asyncio.sleep(delay)
+
+
+async def run_benchmark(args):
+    fake, students, tas = build_server(args.students, in_waiting_room=args.waiting)
+    config = dict(BENCH_CONFIG, MEMORY_LEAN=str(args.lean))
+
+    tracemalloc.start()
+    bot, task, startup = await start_bot(fake, config, logger=bench_logger(args.log_file))
+    gc.collect()
+    first = tracemalloc.take_snapshot()
+
+    print(f"{'hour':>4} {'rss MB':>8} {'bot MB':>8} {'objects':>9} {'members':>8} {'users':>7} {'messages':>9} {'queue':>6}")
+    for hour in range(args.hours + 1):
+        if hour > 0:
+            await simulate_hour(fake, students, tas, hour, args)
+            # The fake server keeps every reply. Drop them so only the bot's memory grows
+            await asyncio.sleep(0.1)
+            fake.sent.clear()
+            fake.presences.clear()
+
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot()
+        guild = bot.guilds[0]
+        print(f"{hour:>4} {rss_mb():>8.1f} {bot_traced_mb(snapshot):>8.2f} {len(gc.get_objects()):>9} "
+              f"{len(guild.members):>8} {len(bot.users):>7} {len(bot.cached_messages):>9} {len(bot._queue):>6}", flush=True)
+
+    print()
+    print("Largest growth in bot memory since startup:")
+    growth = snapshot.filter_traces(BOT_FILTERS).compare_to(first.filter_traces(BOT_FILTERS), "lineno")
+    for stat in growth[:args.top]:
+        print(f"  {stat}")
+    print()
+
+    await stop_bot(fake, bot, task)
+    tracemalloc.stop()
+
+    report("soak", [
+        ("memory lean", args.lean),
+        ("simulated hours", args.hours),
+        ("startup to ready (s)", startup),
+        ("final members in server", len(fake.members)),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=int, default=3, help="simulated hours to run")
+    parser.add_argument("--hour-seconds", type=float, default=10.0, help="real seconds each simulated hour takes")
+    parser.add_argument("--students", type=int, default=2000, help="students in the server at the start")
+    parser.add_argument("--waiting", type=int, default=200, help="students who start in the waiting room")
+    parser.add_argument("--joins-per-hour", type=int, default=200, help="new members joining the server each hour")
+    parser.add_argument("--commands-per-hour", type=int, default=1500, help="student commands each hour")
+    parser.add_argument("--chatter-per-hour", type=int, default=3000, help="non-command messages each hour")
+    parser.add_argument("--voice-per-hour", type=int, default=600, help="voice channel joins/leaves each hour")
+    parser.add_argument("--next-per-hour", type=int, default=400, help="!q next commands from TAs each hour")
+    parser.add_argument("--lean", action="store_true", help="start the bot with MEMORY_LEAN")
+    parser.add_argument("--top", type=int, default=10, help="number of allocation sites to list")
+    parser.add_argument("--log-file", help="let QueueBot log to this file (disabled by default)")
+    parser.add_argument("--seed", type=int, default=120)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    asyncio.get_event_loop().run_until_complete(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Queue store throughput benchmark
+
+Runs a mix of queue operations (join, position, count, list, next, leave and front)
+against the in-memory store and the SQLite store (DATABASE_FILE), then against the
+SQLite store from several processes at once, like a bot plus web boards or backup bots
+sharing the same database. Reports operations per second.
+
+    python -m benchmarks.store --ops 20000 --processes 4
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+from queuebot import DiscordUser, MemoryStore, SQLiteStore
+
+from .harness import report
+
+# (operation, weight)
+OPERATIONS = [("join", 30), ("position", 25), ("count", 15), ("list", 10), ("next", 10), ("leave", 7), ("front", 3)]
+
+
+def run_ops(store, ops, users, seed):
+    """
+    Returns: seconds taken to run ops random operations on store
+    """
+    rand = random.Random(seed)
+    names = [name for name, _ in OPERATIONS]
+    weights = [weight for _, weight in OPERATIONS]
+    plan = rand.choices(names, weights, k=ops)
+    picks = [rand.choice(users) for _ in range(ops)]
+
+    start = time.perf_counter()
+    for op, user in zip(plan, picks):
+        if op == "join":
+            if user not in store:
+                store.append(user)
+        elif op == "position":
+            if user in store:
+                store.index(user)
+        elif op == "count":
+            len(store)
+        elif op == "list":
+            store.head(10)
+        elif op == "next":
+            store.popleft_many(1)
+        elif op == "leave":
+            if user in store:
+                store.remove(user)
+        elif op == "front":
+            store.move_to_front([user])
+    return time.perf_counter() - start
+
+
+def make_users(count, offset=0):
+    return [DiscordUser(offset + i, f"Student{offset + i}", "0001", None) for i in range(count)]
+
+
+def worker(path, ops, users, seed, results):
+    store = SQLiteStore(path, timeout=30)
+    try:
+        results.put(run_ops(store, ops, make_users(users, offset=seed * users), seed))
+    finally:
+        store.close()
+
+
+def concurrent(path, processes, ops, users, seed):
+    """
+    Returns: total operations per second of processes processes sharing the database at path
+    """
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker, args=(path, ops, users, seed + i, results))
+               for i in range(processes)]
+    start = time.perf_counter()
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    elapsed = time.perf_counter() - start
+    for _ in workers:
+        results.get()
+    return processes * ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20000, help="operations per run (per process when concurrent)")
+    parser.add_argument("--users", type=int, default=300, help="simulated students per process")
+    parser.add_argument("--processes", type=int, default=4, help="processes sharing the SQLite database")
+    parser.add_argument("--seed", type=int, default=120)
+    args = parser.parse_args()
+
+    users = make_users(args.users)
+    rows = [("operations", args.ops)]
+    rows.append(("memory ops/s", args.ops / run_ops(MemoryStore(), args.ops, users, args.seed)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "queue.db")
+        store = SQLiteStore(path)
+        rows.append(("sqlite ops/s", args.ops / run_ops(store, args.ops, users, args.seed)))
+        store.clear()
+        store.close()
+
+        rows.append((f"sqlite {args.processes} processes ops/s (total)",
+                     concurrent(path, args.processes, args.ops, args.users, args.seed)))
+
+    report("queue store", rows)
+
+
+if __name__ == "__main__":
+    main()
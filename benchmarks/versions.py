@@ -0,0 +1,101 @@
+"""
+Queue version memory benchmark
+
+Keeps every version of the in-memory queue while running a mix of queue operations,
+the way the undo history and board snapshots do, and measures the extra memory each
+retained version costs. Compares QueueVersion (which shares unchanged chunks between
+versions) with copying the whole queue into a tuple for every version. Also reports
+how long taking a snapshot takes.
+
+    python -m benchmarks.versions --sizes 100 1000 5000 --versions 200
+"""
+
+import time
+import random
+import argparse
+import tracemalloc
+
+from queuebot import QueueVersion, MemoryStore
+
+from .harness import report
+from .store import make_users
+
+# (operation, weight)
+OPERATIONS = [("join", 40), ("next", 30), ("leave", 20), ("front", 10)]
+
+
+def mutate(version, op, user):
+    """
+    Returns: the version after applying op to version
+    """
+    if op == "join":
+        return version if user in version else version.append(user)
+    if op == "next":
+        return version.popleft_many(1)[1]
+    if op == "leave":
+        return version.remove_ids({user.uuid})
+    return version.move_to_front([user])
+
+
+def retained_bytes(size, versions, seed, copy):
+    """
+    Returns: bytes allocated to keep versions versions of a queue of size students.
+             If copy is True every version is a full tuple copy instead of a QueueVersion
+    """
+    rand = random.Random(seed)
+    users = make_users(size * 2)
+    names = [name for name, _ in OPERATIONS]
+    weights = [weight for _, weight in OPERATIONS]
+    plan = list(zip(rand.choices(names, weights, k=versions), (rand.choice(users) for _ in range(versions))))
+    version = QueueVersion.of(users[:size])
+
+    history = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for op, user in plan:
+        version = mutate(version, op, user)
+        history.append(tuple(version) if copy else version)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+
+def snapshot_time(size, snapshots):
+    """
+    Returns: microseconds per snapshot of a queue of size students, as (snapshot, tuple copy)
+    """
+    store = MemoryStore(make_users(size))
+    start = time.perf_counter()
+    for _ in range(snapshots):
+        store.snapshot()
+    shared = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(snapshots):
+        tuple(store)
+    copied = time.perf_counter() - start
+    return shared / snapshots * 1e6, copied / snapshots * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="queue lengths to test")
+    parser.add_argument("--versions", type=int, default=200, help="versions kept per queue length")
+    parser.add_argument("--snapshots", type=int, default=10000, help="snapshots timed per queue length")
+    parser.add_argument("--seed", type=int, default=120)
+    args = parser.parse_args()
+
+    rows = [("versions kept", args.versions)]
+    for size in args.sizes:
+        shared = retained_bytes(size, args.versions, args.seed, copy=False) / args.versions
+        copied = retained_bytes(size, args.versions, args.seed, copy=True) / args.versions
+        version_us, copy_us = snapshot_time(size, args.snapshots)
+        rows.append((f"{size} students: bytes per version", shared))
+        rows.append((f"{size} students: bytes per tuple copy", copied))
+        rows.append((f"{size} students: snapshot us", version_us))
+        rows.append((f"{size} students: tuple copy us", copy_us))
+
+    report("queue versions", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,16 +30,70 @@ NOTICES:
     then have a different queue size)
 """
 
+import io
 import os
+import re
+import csv
 import sys
+import glob
+import gzip
 import json
+import shutil
+import signal
 import logging
 import logging.handlers
+import math
+import time
+import random
+import datetime
+import sqlite3
+import tempfile
 import asyncio
+import threading
+import itertools
+import aiohttp
 import discord
 
+from aiohttp import web
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from abc import ABC, abstractmethod
 from enum import Enum
-from collections import deque
+from queue import SimpleQueue
+from contextlib import contextmanager
+from collections import deque, OrderedDict
+
+CONFIG_FILE = "config.json"
+# Seconds between checks for changes to CONFIG_FILE
+CONFIG_POLL_INTERVAL = 5
+# Seconds between attempts to take LOCK_FILE while waiting as a standby
+LOCK_POLL_INTERVAL = 0.1
+# Most seconds a SIGTERM shutdown waits for running commands to finish
+SHUTDOWN_TIMEOUT = 10
+# Seconds an office room stays reserved for an automatically dispatched student
+DISPATCH_TIMEOUT = 120
+# Seconds between "the bot is busy" replies while joins are turned away
+SHED_REPLY_INTERVAL = 5
+# Seconds between checks for queue changes made by other processes sharing DATABASE_FILE
+STORE_POLL_INTERVAL = 1
+# Log files are rotated (and the old segment compressed) once they reach this size
+LOG_SEGMENT_BYTES = 1000000
+# Compressed log segments are deleted (oldest first) once they take more space than this
+# or are older than LOG_ARCHIVE_DAYS
+LOG_ARCHIVE_BYTES = 200 * 1000000
+LOG_ARCHIVE_DAYS = 180
+# Seconds between logs of everyone in the queue (only logged if the queue changed)
+QUEUE_SNAPSHOT_INTERVAL = 60
+# High volume LOG_FORMAT=json events which are only logged LOG_SAMPLE_RATE of the time
+SAMPLED_EVENTS = {"send", "presence"}
+# Most users in one chunk of a QueueVersion
+VERSION_CHUNK_SIZE = 32
+# Most queue events waiting for one async event bus subscriber (see Overflow)
+EVENT_BUFFER_SIZE = 256
 
 
 class DiscordUser():
@@ -119,6 +173,469 @@ class DiscordUser():
         return other == self.uuid
 
 
+def user_id(user):
+    """
+    Returns: the discord id of a DiscordUser, discord.py user or plain id
+    """
+    if isinstance(user, DiscordUser):
+        return user.uuid
+    return getattr(user, "id", user)
+
+
+class QueueVersion:
+    """
+    One version of the queue, which never changes once made. Users are kept in chunks
+    (tuples of at most VERSION_CHUNK_SIZE users). A change returns a new version which only
+    copies the chunks it touches (and the tuple of chunks) and shares every other chunk
+    with this one, so old versions can be kept around (snapshots, !q undo) for little memory
+
+    Parameters:
+        chunks: tuple of non-empty tuples of DiscordUser objects
+        length: total number of users in chunks
+    """
+    __slots__ = ("chunks", "length")
+
+    def __init__(self, chunks=(), length=0):
+        self.chunks = chunks
+        self.length = length
+
+    @staticmethod
+    def of(users):
+        """
+        Returns: QueueVersion holding users (an iterable of DiscordUser objects) in order
+        """
+        users = tuple(users)
+        return QueueVersion(QueueVersion._chunk(users), len(users))
+
+    @staticmethod
+    def _chunk(users):
+        return tuple(users[i:i + VERSION_CHUNK_SIZE] for i in range(0, len(users), VERSION_CHUNK_SIZE))
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def __contains__(self, user):
+        uuid = user_id(user)
+        return any(q_user.uuid == uuid for chunk in self.chunks for q_user in chunk)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("queue index out of range")
+        for chunk in self.chunks:
+            if index < len(chunk):
+                return chunk[index]
+            index -= len(chunk)
+
+    def index(self, user):
+        uuid = user_id(user)
+        for i, q_user in enumerate(self):
+            if q_user.uuid == uuid:
+                return i
+        raise ValueError(f"{user} is not in the queue")
+
+    def extend(self, users):
+        """
+        Returns: new version with users added to the end
+        """
+        users = tuple(users)
+        if len(users) == 0:
+            return self
+        length = self.length + len(users)
+        chunks = self.chunks
+        # Top up the last chunk before starting new ones
+        if len(chunks) > 0 and len(chunks[-1]) < VERSION_CHUNK_SIZE:
+            room = VERSION_CHUNK_SIZE - len(chunks[-1])
+            chunks = chunks[:-1] + (chunks[-1] + users[:room],)
+            users = users[room:]
+        return QueueVersion(chunks + QueueVersion._chunk(users), length)
+
+    def append(self, user):
+        """
+        Returns: new version with user added to the end
+        """
+        return self.extend((user,))
+
+    def popleft_many(self, count):
+        """
+        Returns: (list of up to count users from the front, new version without them)
+        """
+        popped = []
+        chunks = self.chunks
+        while len(chunks) > 0 and len(popped) < count:
+            take = count - len(popped)
+            if take >= len(chunks[0]):
+                popped.extend(chunks[0])
+                chunks = chunks[1:]
+            else:
+                popped.extend(chunks[0][:take])
+                chunks = (chunks[0][take:],) + chunks[1:]
+        return popped, QueueVersion(chunks, self.length - len(popped))
+
+    def remove_ids(self, ids):
+        """
+        Returns: new version without the users whose id is in ids (a set). Only chunks
+                 with one of them in it are copied
+        """
+        chunks = []
+        length = 0
+        for chunk in self.chunks:
+            if any(q_user.uuid in ids for q_user in chunk):
+                chunk = tuple(q_user for q_user in chunk if q_user.uuid not in ids)
+            if len(chunk) > 0:
+                chunks.append(chunk)
+                length += len(chunk)
+        return QueueVersion(tuple(chunks), length)
+
+    def move_to_front(self, users):
+        """
+        Returns: new version with users (in the given order) added/moved to the front
+        """
+        users = tuple(users)
+        rest = self.remove_ids(set(q_user.uuid for q_user in users))
+        return QueueVersion(QueueVersion._chunk(users) + rest.chunks, len(users) + rest.length)
+
+
+class QueueStore:
+    """
+    Where the queue lives. A store acts like the deque the queue used to be
+    (len, iteration, in, index, [i], append, extend, popleft, remove and clear) and adds
+    the batch operations below, which a store must apply all at once.
+    The implementations here work on top of the deque methods
+    """
+    def head(self, count):
+        """
+        Returns: list of the first count DiscordUser objects in the queue
+        """
+        return list(itertools.islice(self, count))
+
+    def snapshot(self):
+        """
+        Returns: QueueVersion of the queue as it is now (later changes don't affect it)
+        """
+        return QueueVersion.of(self)
+
+    def find(self, user):
+        """
+        Returns: index of user in the queue (None if they are not in it)
+        """
+        try:
+            return self.index(user)
+        except ValueError:
+            return None
+
+    def add(self, user):
+        """
+        Add user to the end of the queue unless they are already in it.
+        A store must check and add at once
+
+        Returns: (True if the user was added, index of the user in the queue)
+        """
+        index = self.find(user)
+        if index is not None:
+            return False, index
+        self.append(user)
+        return True, len(self) - 1
+
+    def discard(self, user):
+        """
+        Remove user from the queue if they are in it. A store must check and remove at once
+
+        Returns: True if the user was removed
+        """
+        if user not in self:
+            return False
+        self.remove(user)
+        return True
+
+    def popleft_many(self, count):
+        """
+        Returns: list of up to count DiscordUser objects removed from the front of the queue
+        """
+        return [self.popleft() for _ in range(min(count, len(self)))]
+
+    def remove_ids(self, ids):
+        """
+        Remove every queued user whose id is in ids (a set)
+
+        Returns: None
+        """
+        self.replace([q_user for q_user in self if q_user.uuid not in ids])
+
+    def move_to_front(self, users):
+        """
+        Add/move users (list of DiscordUser objects) to the front of the queue in the given order
+
+        Returns: None
+        """
+        ids = set(q_user.uuid for q_user in users)
+        self.replace(list(users) + [q_user for q_user in self if q_user.uuid not in ids])
+
+    def replace(self, users):
+        """
+        Replace everyone in the queue with users (list of DiscordUser objects)
+
+        Returns: None
+        """
+        self.clear()
+        self.extend(users)
+
+    def changed(self):
+        """
+        Returns: True if another process changed the queue since the last call
+        """
+        return False
+
+    def close(self):
+        pass
+
+
+class MemoryStore(QueueStore):
+    """
+    Keeps the queue in this process (the default). Every change replaces self.version with
+    a new QueueVersion, so snapshot() is O(1) and iterating the queue always sees
+    the version it started with, even if the queue changes in the meantime
+
+    Parameters:
+        users: iterable of DiscordUser objects to start with
+    """
+    def __init__(self, users=()):
+        self.version = QueueVersion.of(users)
+
+    def snapshot(self):
+        return self.version
+
+    def __len__(self):
+        return len(self.version)
+
+    def __iter__(self):
+        return iter(self.version)
+
+    def __contains__(self, user):
+        return user in self.version
+
+    def __getitem__(self, index):
+        return self.version[index]
+
+    def index(self, user):
+        return self.version.index(user)
+
+    def append(self, user):
+        self.version = self.version.append(user)
+
+    def extend(self, users):
+        self.version = self.version.extend(users)
+
+    def popleft(self):
+        popped = self.popleft_many(1)
+        if len(popped) == 0:
+            raise IndexError("pop from an empty queue")
+        return popped[0]
+
+    def popleft_many(self, count):
+        popped, self.version = self.version.popleft_many(count)
+        return popped
+
+    def remove(self, user):
+        if user not in self.version:
+            raise ValueError(f"{user} is not in the queue")
+        self.version = self.version.remove_ids({user_id(user)})
+
+    def remove_ids(self, ids):
+        self.version = self.version.remove_ids(ids)
+
+    def move_to_front(self, users):
+        self.version = self.version.move_to_front(users)
+
+    def clear(self):
+        self.version = QueueVersion()
+
+    def replace(self, users):
+        self.version = QueueVersion.of(users)
+
+
+class SQLiteStore(QueueStore):
+    """
+    Keeps the queue in a SQLite database (config.DATABASE_FILE) so several processes
+    can share it. The database uses write-ahead logging so readers never wait on the bot.
+    Every change runs in a single transaction and other processes' changes are
+    picked up through changed()
+
+    Statements run on the event loop. The store is meant for one writer (the bot) and any
+    number of readers: while another process holds the write lock, the bot waits for it
+    (up to timeout seconds) without handling anything else
+
+    Parameters:
+        path: path to the database file (created if it does not exist)
+        timeout: seconds to wait for another process's transaction to finish
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS queue (
+            position INTEGER PRIMARY KEY,
+            uuid INTEGER NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            discriminator TEXT NOT NULL,
+            nick TEXT,
+            join_time REAL
+        );
+    """
+    COLUMNS = "uuid, name, discriminator, nick, join_time"
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        # Autocommit. Changes use explicit BEGIN IMMEDIATE transactions
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SQLiteStore.SCHEMA)
+        self._data_version = self._version()
+
+    def _version(self):
+        # Changes whenever another connection commits
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _users(self, rows):
+        return [SQLiteStore._user(row) for row in rows]
+
+    @staticmethod
+    def _user(row):
+        q_user = DiscordUser(*row[:4])
+        q_user.join_time = row[4]
+        return q_user
+
+    def _insert(self, db, users, at_front=False):
+        # New positions go after the last one (or before the first one) so nobody else moves
+        edge = "COALESCE(MIN(position), 1) - 1" if at_front else "COALESCE(MAX(position), 0) + 1"
+        for q_user in users:
+            db.execute(f"INSERT OR IGNORE INTO queue (position, {SQLiteStore.COLUMNS}) " +
+                       f"VALUES ((SELECT {edge} FROM queue), ?, ?, ?, ?, ?)",
+                       (q_user.uuid, q_user.name, q_user.discriminator, q_user.nick, q_user.join_time))
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+
+    def __iter__(self):
+        return iter(self._users(self._db.execute(f"SELECT {SQLiteStore.COLUMNS} FROM queue ORDER BY position")))
+
+    def __contains__(self, user):
+        return self._db.execute("SELECT 1 FROM queue WHERE uuid = ?", (user_id(user),)).fetchone() is not None
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        row = self._db.execute(f"SELECT {SQLiteStore.COLUMNS} FROM queue ORDER BY position LIMIT 1 OFFSET ?",
+                               (index,)).fetchone() if index >= 0 else None
+        if row is None:
+            raise IndexError("queue index out of range")
+        return SQLiteStore._user(row)
+
+    def _find(self, db, user):
+        # One statement, so the position and the count come from the same snapshot
+        row = db.execute("SELECT (SELECT COUNT(*) FROM queue AS ahead WHERE ahead.position < queue.position) " +
+                         "FROM queue WHERE uuid = ?", (user_id(user),)).fetchone()
+        return row[0] if row is not None else None
+
+    def find(self, user):
+        return self._find(self._db, user)
+
+    def index(self, user):
+        index = self.find(user)
+        if index is None:
+            raise ValueError(f"{user} is not in the queue")
+        return index
+
+    def head(self, count):
+        return self._users(self._db.execute(f"SELECT {SQLiteStore.COLUMNS} FROM queue ORDER BY position LIMIT ?",
+                                            (count,)))
+
+    def append(self, user):
+        with self._transaction() as db:
+            self._insert(db, [user])
+
+    def add(self, user):
+        with self._transaction() as db:
+            added = db.execute("SELECT 1 FROM queue WHERE uuid = ?", (user_id(user),)).fetchone() is None
+            if added:
+                self._insert(db, [user])
+            return added, self._find(db, user)
+
+    def extend(self, users):
+        with self._transaction() as db:
+            self._insert(db, users)
+
+    def popleft(self):
+        popped = self.popleft_many(1)
+        if len(popped) == 0:
+            raise IndexError("pop from an empty queue")
+        return popped[0]
+
+    def popleft_many(self, count):
+        with self._transaction() as db:
+            rows = db.execute(f"SELECT position, {SQLiteStore.COLUMNS} FROM queue ORDER BY position LIMIT ?",
+                              (count,)).fetchall()
+            if len(rows) > 0:
+                db.execute("DELETE FROM queue WHERE position <= ?", (rows[-1][0],))
+        return [SQLiteStore._user(row[1:]) for row in rows]
+
+    def remove(self, user):
+        if not self.discard(user):
+            raise ValueError(f"{user} is not in the queue")
+
+    def discard(self, user):
+        with self._transaction() as db:
+            return db.execute("DELETE FROM queue WHERE uuid = ?", (user_id(user),)).rowcount > 0
+
+    def remove_ids(self, ids):
+        with self._transaction() as db:
+            db.executemany("DELETE FROM queue WHERE uuid = ?", ((uuid,) for uuid in ids))
+
+    def move_to_front(self, users):
+        with self._transaction() as db:
+            db.executemany("DELETE FROM queue WHERE uuid = ?", ((q_user.uuid,) for q_user in users))
+            self._insert(db, reversed(users), at_front=True)
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM queue")
+
+    def replace(self, users):
+        with self._transaction() as db:
+            db.execute("DELETE FROM queue")
+            self._insert(db, users)
+
+    def changed(self):
+        version = self._version()
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        return True
+
+    def close(self):
+        self._db.close()
+
+
+class ConfigError(Exception):
+    """
+    Raised when a config option is invalid or does not match the discord server
+    """
+    pass
+
+
 class QueueConfig:
     """
     A storage class which holds all config values for QueueBot.
@@ -152,7 +669,7 @@ class QueueConfig:
             from_env: True if config values come from environmental variables (for Docker)
 
         Returns: A clean dictionary (whitespace trimmed, etc.) with config options
-        NOTE: This method terminates the program if a config option is invalid
+        Raises: ConfigError if a config option is invalid
         """
         # TODO Logger Level config option
         prefix = "QUEUE_" if from_env else ""
@@ -165,42 +682,111 @@ class QueueConfig:
             "ALERTS_CHANNEL": "You must define an alerts channel so the bot can send you notification message"
         }
 
-        config_clean = {
-            "SECRET_TOKEN": config_obj["SECRET_TOKEN"].strip(),
-            "TA_ROLES": [r.strip() for r in config_obj["TA_ROLES"] if r],
-            "CHECK_VOICE_WAITING": config_obj["CHECK_VOICE_WAITING"].strip().lower() == "true",
-            "LISTEN_CHANNELS": [c.strip().lstrip("#") for c in config_obj["LISTEN_CHANNELS"] if c],
-            "ALERT_ON_FIRST_JOIN": config_obj["ALERT_ON_FIRST_JOIN"].strip().lower() == "true",
-        }
+        try:
+            config_clean = {
+                "SECRET_TOKEN": config_obj["SECRET_TOKEN"].strip(),
+                "TA_ROLES": [r.strip() for r in config_obj["TA_ROLES"] if r],
+                "CHECK_VOICE_WAITING": config_obj["CHECK_VOICE_WAITING"].strip().lower() == "true",
+                "LISTEN_CHANNELS": [c.strip().lstrip("#") for c in config_obj["LISTEN_CHANNELS"] if c],
+                "ALERT_ON_FIRST_JOIN": config_obj["ALERT_ON_FIRST_JOIN"].strip().lower() == "true",
+                "SLASH_COMMANDS": config_obj.get("SLASH_COMMANDS", "False").strip().lower() == "true",
+                "LAZY_MEMBERS": config_obj.get("LAZY_MEMBERS", "False").strip().lower() == "true",
+                "MEMORY_LEAN": config_obj.get("MEMORY_LEAN", "False").strip().lower() == "true",
+                "AUTO_DISPATCH": config_obj.get("AUTO_DISPATCH", "False").strip().lower() == "true",
+                "AUTO_MOVE": config_obj.get("AUTO_MOVE", "False").strip().lower() == "true",
+                "OFFICE_HOURS": [h.strip() for h in config_obj.get("OFFICE_HOURS", []) if h and h.strip()],
+            }
+
+            if config_clean["ALERT_ON_FIRST_JOIN"]:
+                config_clean["ALERTS_CHANNEL"] = config_obj["ALERTS_CHANNEL"].strip()
+
+            if config_clean["CHECK_VOICE_WAITING"]:
+                config_clean["VOICE_WAITING"] = config_obj["VOICE_WAITING"].strip()
+
+            if config_clean["ALERT_ON_FIRST_JOIN"]:
+                config_clean["VOICE_OFFICES"] = [v.strip()
+                                                 for v in config_obj["VOICE_OFFICES"] if v]
+        except KeyError as e:
+            raise ConfigError(f"{prefix}{e.args[0]} is missing!")
+
+        try:
+            config_clean["VOICE_WAITING_GRACE"] = float(str(config_obj.get("VOICE_WAITING_GRACE", "0")).strip() or "0")
+        except ValueError:
+            config_clean["VOICE_WAITING_GRACE"] = -1
+        if config_clean["VOICE_WAITING_GRACE"] < 0:
+            raise ConfigError(prefix + "VOICE_WAITING_GRACE must be a number of seconds (0 disables it)")
+
+        try:
+            config_clean["CLOSING_MINUTES"] = float(str(config_obj.get("CLOSING_MINUTES", "10")).strip() or "0")
+        except ValueError:
+            config_clean["CLOSING_MINUTES"] = -1
+        if config_clean["CLOSING_MINUTES"] < 0:
+            raise ConfigError(prefix + "CLOSING_MINUTES must be a number of minutes (0 disables it)")
+
+        try:
+            OfficeHours.parse(config_clean["OFFICE_HOURS"])
+        except ValueError as e:
+            raise ConfigError(f"{prefix}OFFICE_HOURS: {e}")
 
-        if config_clean["ALERT_ON_FIRST_JOIN"]:
-            config_clean["ALERTS_CHANNEL"] = config_obj["ALERTS_CHANNEL"].strip()
+        try:
+            config_clean["CAPACITY"] = int(str(config_obj.get("CAPACITY", "0")).strip() or "0")
+        except ValueError:
+            config_clean["CAPACITY"] = -1
+        if config_clean["CAPACITY"] < 0:
+            raise ConfigError(prefix + "CAPACITY must be a whole number of people (0 means no limit)")
+
+        try:
+            config_clean["SEND_BACKLOG"] = int(str(config_obj.get("SEND_BACKLOG", "25")).strip() or "25")
+        except ValueError:
+            config_clean["SEND_BACKLOG"] = -1
+        if config_clean["SEND_BACKLOG"] < 0:
+            raise ConfigError(prefix + "SEND_BACKLOG must be a whole number of messages (0 never turns joins away)")
+
+        config_clean["LOG_FORMAT"] = str(config_obj.get("LOG_FORMAT", "text")).strip().lower()
+        if config_clean["LOG_FORMAT"] not in ("text", "json"):
+            raise ConfigError(prefix + "LOG_FORMAT must be either text or json")
 
-        if config_clean["CHECK_VOICE_WAITING"]:
-            config_clean["VOICE_WAITING"] = config_obj["VOICE_WAITING"].strip()
+        try:
+            config_clean["LOG_SAMPLE_RATE"] = float(str(config_obj.get("LOG_SAMPLE_RATE", "1")).strip() or "1")
+        except ValueError:
+            config_clean["LOG_SAMPLE_RATE"] = -1
+        if not 0 <= config_clean["LOG_SAMPLE_RATE"] <= 1:
+            raise ConfigError(prefix + "LOG_SAMPLE_RATE must be a number between 0 and 1")
 
-        if config_clean["ALERT_ON_FIRST_JOIN"]:
-            config_clean["VOICE_OFFICES"] = [v.strip()
-                                             for v in config_obj["VOICE_OFFICES"] if v]
+        try:
+            config_clean["DASHBOARD_PORT"] = int(str(config_obj.get("DASHBOARD_PORT", "0")).strip() or "0")
+        except ValueError:
+            config_clean["DASHBOARD_PORT"] = -1
+        if not 0 <= config_clean["DASHBOARD_PORT"] <= 65535:
+            raise ConfigError(prefix + "DASHBOARD_PORT must be a port number (0 disables the dashboard)")
+        config_clean["DASHBOARD_HOST"] = str(config_obj.get("DASHBOARD_HOST", "")).strip() or "127.0.0.1"
+
+        # Optional paths (empty disables them)
+        config_clean["STATE_FILE"] = str(config_obj.get("STATE_FILE", "")).strip()
+        config_clean["LOCK_FILE"] = str(config_obj.get("LOCK_FILE", "")).strip()
+        config_clean["DATABASE_FILE"] = str(config_obj.get("DATABASE_FILE", "")).strip()
+        if config_clean["LOCK_FILE"] and fcntl is None:
+            raise ConfigError(prefix + "LOCK_FILE is not supported on this operating system")
+
+        if config_clean["AUTO_DISPATCH"] and not config_clean["ALERT_ON_FIRST_JOIN"]:
+            raise ConfigError(prefix + "AUTO_DISPATCH uses the VOICE_OFFICES rooms. ALERT_ON_FIRST_JOIN must be enabled")
+
+        if config_clean["AUTO_MOVE"] and not config_clean["CHECK_VOICE_WAITING"]:
+            raise ConfigError(prefix + "AUTO_MOVE moves students out of VOICE_WAITING. CHECK_VOICE_WAITING must be enabled")
 
         if config_clean["SECRET_TOKEN"] == "YOUR_SECRET_TOKEN_HERE":
-            print(prefix + "SECRET_TOKEN is empty!")
-            print(error["SECRET_TOKEN"])
-            sys.exit(1)
+            raise ConfigError(prefix + "SECRET_TOKEN is empty!\n" + error["SECRET_TOKEN"])
 
-        # Simple error checking. Make sure non-booleans are nonempty
+        # Simple error checking. Make sure non-booleans/numbers are nonempty
         for key, val in config_clean.items():
-            if isinstance(val, bool):
+            if isinstance(val, (bool, int, float)) or key in ("STATE_FILE", "LOCK_FILE", "DATABASE_FILE", "OFFICE_HOURS"):
                 continue
             if len(val) == 0:
-                print(prefix + key, "is empty!")
-                print(error[key])
-                sys.exit(1)
+                raise ConfigError(f"{prefix}{key} is empty!\n{error[key]}")
 
         if config_clean["CHECK_VOICE_WAITING"] and config_clean["ALERT_ON_FIRST_JOIN"] and \
                         config_clean["VOICE_WAITING"] in config_clean["VOICE_OFFICES"]:
-            print(config_clean["VOICE_WAITING"], "can be either the waiting room or an office room not both!")
-            sys.exit(1)
+            raise ConfigError(config_clean["VOICE_WAITING"] + " can be either the waiting room or an office room not both!")
 
         return config_clean
 
@@ -208,6 +794,24 @@ class QueueConfig:
         return QueueConfig(self.original_config.copy(),
                            from_env=self.from_env, test_mode=self.test_mode)
 
+    def keep_option(self, key, other):
+        """
+        Replace the value of one option with its value in another config
+        (ex: an option which only changes when the bot restarts)
+
+        Parameters:
+            key: name of the option
+            other: QueueConfig object to take the value from
+
+        Returns: None
+        """
+        setattr(self, key, getattr(other, key))
+        self.clean_config[key] = other.clean_config[key]
+        if key in other.original_config:
+            self.original_config[key] = other.original_config[key]
+        else:
+            self.original_config.pop(key, None)
+
     def __str__(self):
         retval = []
         banner_width = 60
@@ -228,247 +832,2537 @@ class CmdPrefix(Enum):
     WARNING = object()
     ERROR = object()
 
-# TODO Alert user if they're in voice channel and not in queue?
 
-class QueueBot(discord.Client):
+PREFIX_EMOTES = {
+    CmdPrefix.WARNING: "⚠️",
+    CmdPrefix.SUCCESS: "✅",
+    CmdPrefix.ERROR: "‼️",
+}
+
+
+class SendRecord:
     """
-    Instantiate the QueueBot that connects to a Discord server to manage a single queue
+    A message QueueBot sends. Transports deliver (or capture) these
 
     Parameters:
-        config: A QueueConfig object specifying config options
-        logger: A logger object created from Python's logging module
-        testing: Used for unit testing. Leave as False unless testing
+        channel: channel the message is sent to
+        content: message text without the prefix emote (or None)
+        message_type: CmdPrefix of the message (or None)
+        embed: discord.py embed (or None)
+        allowed_mentions: discord.py AllowedMentions (or None)
+        file: discord.py File to attach (or None)
     """
+    __slots__ = ("channel", "content", "message_type", "embed", "allowed_mentions", "file")
+
+    def __init__(self, channel, content=None, message_type=None, embed=None, allowed_mentions=None, file=None):
+        self.channel = channel
+        self.content = content
+        self.message_type = message_type
+        self.embed = embed
+        self.allowed_mentions = allowed_mentions
+        self.file = file
+
+    @property
+    def text(self):
+        """
+        Message text as it appears in Discord (with the prefix emote)
+        """
+        if self.message_type in PREFIX_EMOTES:
+            return PREFIX_EMOTES[self.message_type] + " " + self.content
+        return self.content
 
-    # TODO Use config testing instead of optional param
-    def __init__(self, config, logger, testing=False):
-        assert isinstance(config, QueueConfig)
+    def __repr__(self):
+        return f"SendRecord(channel={self.channel}, text={self.text!r}, embed={self.embed is not None})"
 
-        intents = discord.Intents.default()
-        intents.typing = False
-        intents.presences = False
-        intents.dm_messages = False
-        intents.invites = False
-        # Cache voice channels only if queuebot checks voice channel state
-        intents.members = True if config.CHECK_VOICE_WAITING or config.ALERT_ON_FIRST_JOIN else False
-        super().__init__(intents=intents)  # Initialize discord.py properties
 
-        self.is_initialized = False
-        self.config = config
-        self.logger = logger
-        # This queue holds DiscordUser objects
-        # Items are pulled off the left and pushed onto the right
-        self._queue = deque()
+class LocalMessage:
+    """
+    Stands in for the discord.py message when a transport does not send to Discord,
+    so callers can still edit it and react to it (ex: confirmations)
 
-        self.testing = testing
-        self.waiting_room = None
-        self.alerts_channel = None
+    Parameters:
+        record: SendRecord of the message
+    """
+    _ids = itertools.count(1)
 
-        self.msg_help = {
-            "STUDENT": """__STUDENT COMMANDS:__
-> `!q help` - Get this help message
-> `!q join`  - Join the queue
-> `!q leave` - Leave the queue
-> `!q position` - See how many people are in front of you
-> `!q list` - Get a list of the next 10 people in line""",
+    def __init__(self, record):
+        self.id = next(LocalMessage._ids)
+        self.record = record
+        self.channel = record.channel
+        self.content = record.text
+        self.reactions = []
 
-            "TA": """__TA COMMANDS:__
-> `!q help` - Get this help message
-> `!q ping` - Bot should reply with `Pong!` Used to make sure bot can receive/send messages
-> `!q next` - Get the next person to help **(REMOVES FROM QUEUE)**
-> `!q peek` - See the next person in the queue WITHOUT removing them
-> `!q clear` - Empty the queue (requires confirmation)
-> `!q add @user` - add @user to the end of the queue (you must @mention the person)
-> `!q remove @user` - remove @user from the queue (you must @mention the person)
-> `!q front @user` - adds/moves @user to the front of the queue (you must @mention the person)
-> `!q list` - Get a list of the next 10 people in line
+    async def edit(self, content=None):
+        self.content = content
+
+    async def add_reaction(self, emoji):
+        self.reactions.append(emoji)
+
+
+class Transport(ABC):
+    """
+    Delivers the messages QueueBot sends. Subclasses implement send()
+    """
+    @abstractmethod
+    async def send(self, record):
+        """
+        Parameters:
+            record: SendRecord to deliver
+
+        Returns: the sent discord.py message (a LocalMessage if nothing was sent to Discord)
+        """
+
+
+class DiscordTransport(Transport):
+    """
+    Sends messages to Discord (the default)
+
+    Parameters:
+        bot: QueueBot whose messages are sent (used for logging)
+    """
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def send(self, record):
+        text = record.text
+        if self.bot.config.LOG_FORMAT == "json":
+            self.bot.log_event("send", channel=record.channel.name, length=len(text) if text else 0,
+                               type=record.message_type.name if record.message_type else None,
+                               embed=record.embed is not None)
+        else:
+            self.bot.logger.info(f"[{record.channel.name}]  [#{self.bot.user}] [embed? {record.embed is not None}] {text.rstrip() if text else ''}")
+        # Only text channels take files (slash command replies don't)
+        files = {"file": record.file} if record.file is not None else {}
+        return await record.channel.send(content=text, embed=record.embed, allowed_mentions=record.allowed_mentions, **files)
+
+
+class StdoutTransport(Transport):
+    """
+    Prints messages instead of sending them (the default in testing mode)
+    """
+    async def send(self, record):
+        print("SEND:", record.text, end="")
+        embed = record.embed
+        if embed:
+            print(f" embed.title='{embed.title}', embed.description={embed.description}, fields={embed.fields}")
+        elif record.file:
+            print(f" file='{record.file.filename}'")
+        else:
+            print()  # End current line
+        return LocalMessage(record)
+
+
+class MemoryTransport(Transport):
+    """
+    Keeps every SendRecord in self.sent instead of sending it
+    Attached files are read into memory when sent (like an upload), since the sender may close them afterwards
+
+    Parameters:
+        maxlen: most records kept (oldest are dropped first). None keeps all of them
+    """
+    def __init__(self, maxlen=None):
+        self.sent = deque(maxlen=maxlen)
+
+    async def send(self, record):
+        if record.file is not None:
+            record.file = discord.File(io.BytesIO(record.file.fp.read()), record.file.filename)
+        self.sent.append(record)
+        return LocalMessage(record)
+
+    def texts(self):
+        """
+        Returns: list of the text of every kept message (oldest first)
+        """
+        return [record.text for record in self.sent]
+
+
+class NullTransport(Transport):
+    """
+    Drops every message. Only counts them
+    """
+    def __init__(self):
+        self.count = 0
+
+    async def send(self, record):
+        self.count += 1
+        return LocalMessage(record)
+
+
+class QueueEventType(Enum):
+    JOIN = "join"          # A student joined the queue
+    WAITLIST = "waitlist"  # A student joined the waitlist
+    LEAVE = "leave"        # A student left the queue or the waitlist
+    ADD = "add"            # TAs added students (!q add, !q import)
+    REMOVE = "remove"      # Students were removed (!q remove, left the waiting room)
+    POP = "pop"            # Students were taken off the front (!q next, AUTO_DISPATCH)
+    FRONT = "front"        # Students were moved to the front
+    UNDO = "undo"          # A TA command was taken back (!q undo)
+    PROMOTE = "promote"    # Students were moved from the waitlist into the queue
+    CLEAR = "clear"        # The queue was emptied (!q clear, end of office hours)
+    RELOAD = "reload"      # The whole queue was replaced (STATE_FILE, changed by another process)
+
+
+class QueueEvent:
+    """
+    A change to the queue, published to QueueBot.events right after it is made
+
+    Parameters:
+        kind: QueueEventType
+        users: list of DiscordUser objects the change was about (in queue order)
+        queue_length: number of people in the queue after the change
+        waitlist_length: number of people on the waitlist after the change
+    """
+    __slots__ = ("kind", "users", "queue_length", "waitlist_length", "time")
+
+    def __init__(self, kind, users, queue_length, waitlist_length):
+        self.kind = kind
+        self.users = users
+        self.queue_length = queue_length
+        self.waitlist_length = waitlist_length
+        self.time = time.time()
+
+    def __repr__(self):
+        return f"QueueEvent({self.kind.name}, {len(self.users)} users, queue_length={self.queue_length})"
+
+
+class Overflow(Enum):
+    DROP_OLDEST = 1  # Throw away the oldest waiting event (subscribers which only need the latest state)
+    DROP_NEWEST = 2  # Throw away the new event
+    DISCONNECT = 3   # Unsubscribe
+
+
+class Subscription:
+    """
+    A subscriber to an EventBus (returned by EventBus.subscribe)
+
+    Parameters:
+        handler: function or coroutine function called with each QueueEvent
+        kinds: set of QueueEventTypes to receive (None for every event)
+        maxsize: most events waiting for an async handler
+        overflow: Overflow policy once maxsize events are waiting
+    """
+    __slots__ = ("handler", "kinds", "maxsize", "overflow", "is_async", "buffer", "task", "dropped", "closed")
+
+    def __init__(self, handler, kinds, maxsize, overflow):
+        self.handler = handler
+        self.kinds = kinds
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.is_async = asyncio.iscoroutinefunction(handler)
+        self.buffer = deque()
+        self.task = None
+        # Events thrown away by the overflow policy
+        self.dropped = 0
+        self.closed = False
+
+
+class EventBus:
+    """
+    Delivers QueueEvents to subscribers in the order they were published. publish() never waits:
+    plain functions are called right away (keep them cheap) and each coroutine function gets its own
+    bounded buffer which a task works through one event at a time, so a slow subscriber only
+    falls behind (and eventually loses events, see Overflow) instead of holding up commands
+
+    Parameters:
+        loop: event loop subscriber tasks run on
+        on_error: function called with (subscription, event, exception) when a handler raises
+    """
+    def __init__(self, loop, on_error=None):
+        self.loop = loop
+        self.on_error = on_error
+        self._subscriptions = []
+
+    def subscribe(self, handler, kinds=None, maxsize=EVENT_BUFFER_SIZE, overflow=Overflow.DROP_OLDEST):
+        """
+        Parameters:
+            handler: function or coroutine function called with each QueueEvent
+            kinds: iterable of QueueEventTypes to receive (None for every event)
+            maxsize: most events waiting for an async handler
+            overflow: Overflow policy once maxsize events are waiting
+
+        Returns: Subscription object (pass to unsubscribe)
+        """
+        subscription = Subscription(handler, frozenset(kinds) if kinds is not None else None, maxsize, overflow)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stop delivering events to a subscriber. Events already waiting for it are thrown away
+
+        Returns: None
+        """
+        subscription.closed = True
+        subscription.buffer.clear()
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def publish(self, event):
+        """
+        Hand an event to every subscriber that wants it
+
+        Returns: None
+        """
+        for subscription in tuple(self._subscriptions):
+            if subscription.kinds is not None and event.kind not in subscription.kinds:
+                continue
+            if not subscription.is_async:
+                self._call(subscription, event)
+                continue
+
+            if len(subscription.buffer) >= subscription.maxsize:
+                subscription.dropped += 1
+                if subscription.overflow is Overflow.DROP_NEWEST:
+                    continue
+                elif subscription.overflow is Overflow.DISCONNECT:
+                    self.unsubscribe(subscription)
+                    continue
+                subscription.buffer.popleft()
+            subscription.buffer.append(event)
+            if subscription.task is None:
+                subscription.task = self.loop.create_task(self._deliver(subscription))
+
+    def _call(self, subscription, event):
+        try:
+            subscription.handler(event)
+        except Exception as e:
+            self._error(subscription, event, e)
+
+    def _error(self, subscription, event, exception):
+        if self.on_error is not None:
+            self.on_error(subscription, event, exception)
+
+    async def _deliver(self, subscription):
+        try:
+            while len(subscription.buffer) > 0 and not subscription.closed:
+                event = subscription.buffer.popleft()
+                try:
+                    await subscription.handler(event)
+                except Exception as e:
+                    self._error(subscription, event, e)
+        finally:
+            subscription.task = None
+
+    @property
+    def pending(self):
+        """
+        Number of subscribers with events waiting or being handled
+        """
+        return sum(1 for subscription in self._subscriptions if subscription.task is not None)
+
+    async def drain(self):
+        """
+        Wait until every subscriber has handled every event published so far
+
+        Returns: None
+        """
+        while True:
+            tasks = [subscription.task for subscription in self._subscriptions if subscription.task is not None]
+            if len(tasks) == 0:
+                return
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """
+        Unsubscribe everyone and stop delivering events
+
+        Returns: None
+        """
+        for subscription in tuple(self._subscriptions):
+            self.unsubscribe(subscription)
+            if subscription.task is not None:
+                subscription.task.cancel()
+
+
+# TA commands which accept several mentions (ex: "!q add @user1 @user2")
+BATCH_COMMANDS = {"next", "pop", "remove", "add", "front"}
+# Most users a single batched command can pop/add/remove/move
+MAX_BATCH_SIZE = 20
+# TA commands "!q undo" can take back and how many of them are kept
+UNDOABLE_COMMANDS = {"next", "pop", "remove", "add", "front", "clear", "empty", "import"}
+UNDO_HISTORY = 20
+# Columns of "!q export" files (and the fields of each JSON object)
+EXPORT_FIELDS = ["position", "uuid", "name", "discriminator", "nick", "join_time"]
+# Largest file (bytes) and most rows "!q import" accepts
+MAX_IMPORT_BYTES = 8 * 1000000
+MAX_IMPORT_ROWS = 10000
+MENTION_PATTERN = re.compile(r"<@!?(\d+)>")
+
+CONFIRM_EMOJI = "✅"
+CANCEL_EMOJI = "❌"
+
+# Most DM channels kept open for !q help (least recently used are dropped first)
+DM_POOL_SIZE = 256
+# Seconds before !q help sends the list of commands to the same user again
+HELP_COOLDOWN = 60
+# Highest position "!q join notify k" accepts. Only this many people at the front are checked after each change
+MAX_NOTIFY_POSITION = 10
+
+
+class PendingConfirmation:
+    """
+    A confirmation message waiting for a TA to react to it.
+    Destructive TA commands (ex: "!q clear") register one of these instead
+    of holding their coroutine open until someone reacts
+
+    Parameters:
+        message: discord.py message object the TA reacts to
+        on_confirm: coroutine function called with (message, member) when a TA reacts with CONFIRM_EMOJI
+        cancel_text: the message is edited to this text when canceled or expired
+        timer: asyncio.TimerHandle which expires the confirmation
+    """
+    def __init__(self, message, on_confirm, cancel_text, timer):
+        self.message = message
+        self.on_confirm = on_confirm
+        self.cancel_text = cancel_text
+        self.timer = timer
+
+
+class UndoStep:
+    """
+    A TA command which "!q undo" can take back
+
+    Parameters:
+        label: the command (ex: "!q next")
+        user: DiscordUser object of the TA who ran it
+        before: QueueVersion right before the command
+        after: QueueVersion right after the command
+    """
+    __slots__ = ("label", "user", "before", "after")
+
+    def __init__(self, label, user, before, after):
+        self.label = label
+        self.user = user
+        self.before = before
+        self.after = after
+
+
+class TimerWheel:
+    """
+    A hashed timing wheel. Timers are placed in one of `slots` buckets (each `tick` seconds wide)
+    so scheduling and canceling a timer is O(1) no matter how many are pending.
+    A single task advances the wheel (only while timers are pending) and hands every key that
+    expired during a tick to on_expire at once
+
+    Parameters:
+        loop: asyncio event loop to run on
+        on_expire: coroutine function called with a list of expired keys
+        tick: seconds per slot (timer precision)
+        slots: number of slots in the wheel (timers longer than slots * tick wrap around)
+        on_error: function called with (keys, exception) when on_expire raises.
+                  The wheel keeps running either way
+    """
+    def __init__(self, loop, on_expire, tick=1.0, slots=64, on_error=None):
+        self.loop = loop
+        self.on_expire = on_expire
+        self.on_error = on_error
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]  # key -> remaining trips around the wheel
+        self._where = {}  # key -> slot index
+        self._cursor = 0
+        self._task = None
+
+    def schedule(self, key, delay):
+        """
+        Start (or restart) the timer for key. It expires after delay seconds (rounded up to a tick)
+
+        Returns: None
+        """
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % len(self._slots)
+        self._slots[slot][key] = (ticks - 1) // len(self._slots)
+        self._where[key] = slot
+
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+
+    def cancel(self, key):
+        """
+        Stop the timer for key
+
+        Returns: True if a timer was pending
+        """
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+
+        del self._slots[slot][key]
+        return True
+
+    def _advance(self):
+        """
+        Move the wheel forward one tick
+
+        Returns: list of keys which expired
+        """
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        bucket = self._slots[self._cursor]
+        expired = []
+        for key, trips in list(bucket.items()):
+            if trips == 0:
+                expired.append(key)
+                del bucket[key]
+                del self._where[key]
+            else:
+                bucket[key] = trips - 1
+
+        return expired
+
+    async def _run(self):
+        try:
+            next_tick = self.loop.time()
+            while len(self._where) > 0:
+                next_tick += self.tick
+                await asyncio.sleep(max(0, next_tick - self.loop.time()))
+                expired = self._advance()
+                if len(expired) > 0:
+                    try:
+                        await self.on_expire(expired)
+                    except Exception as e:
+                        # Other timers are still pending
+                        if self.on_error is not None:
+                            self.on_error(expired, e)
+        finally:
+            self._task = None
+
+    def clear(self):
+        """
+        Stop all timers
+        """
+        for bucket in self._slots:
+            bucket.clear()
+        self._where.clear()
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def __len__(self):
+        return len(self._where)
+
+
+class OfficeTracker:
+    """
+    Keeps track of who is in each office room from voice state events so free TAs
+    can be found without rescanning room.members. Every update is O(1)
+    A room is available when it has a TA, no students and no student on their way (reserved)
+
+    Parameters:
+        rooms: list of discord.py office room voice channels
+    """
+    def __init__(self, rooms):
+        self.rooms = {room.id: room for room in rooms}
+        self._tas = {room.id: set() for room in rooms}
+        self._students = {room.id: set() for room in rooms}
+        self._reserved = {}  # room id -> id of the student sent there
+        self.available = OrderedDict()  # room ids in the order they became available
+
+    def join(self, room_id, member_id, is_ta):
+        (self._tas if is_ta else self._students)[room_id].add(member_id)
+        if not is_ta:
+            # The student sent to the room (or someone else) showed up
+            self._reserved.pop(room_id, None)
+        self._refresh(room_id)
+
+    def leave(self, room_id, member_id):
+        self._tas[room_id].discard(member_id)
+        self._students[room_id].discard(member_id)
+        if len(self._tas[room_id]) == 0:
+            self._reserved.pop(room_id, None)
+        self._refresh(room_id)
+
+    def reserve(self, room_id, student_id):
+        self._reserved[room_id] = student_id
+        self._refresh(room_id)
+
+    def release(self, room_id, student_id):
+        """
+        Stop holding a room for a student who never showed up
+
+        Returns: True if the room was still reserved for the student
+        """
+        if self._reserved.get(room_id) != student_id:
+            return False
+        del self._reserved[room_id]
+        self._refresh(room_id)
+        return True
+
+    def tas(self, room_id):
+        return self._tas[room_id]
+
+    def _refresh(self, room_id):
+        if len(self._tas[room_id]) > 0 and len(self._students[room_id]) == 0 and room_id not in self._reserved:
+            if room_id not in self.available:
+                self.available[room_id] = None
+        else:
+            self.available.pop(room_id, None)
+
+
+class QueueState(Enum):
+    OPEN = "open"
+    CLOSING = "closing"
+    CLOSED = "closed"
+
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+SESSION_PATTERN = re.compile(r"([a-z]{3})[a-z]*\s+(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})")
+WEEK_SECONDS = 7 * 24 * 3600
+
+
+class OfficeHours:
+    """
+    Weekly office hours schedule (config.OFFICE_HOURS). The queue is open during a session,
+    closing (no new students) for the last closing_minutes of it and closed in between
+
+    Parameters:
+        entries: list of sessions like "Mon 14:00-16:00" (local time)
+        closing_minutes: length of the closing period at the end of each session
+    """
+    def __init__(self, entries, closing_minutes=0):
+        # (start, end) in seconds since Monday 00:00, sorted by start
+        self.sessions = OfficeHours.parse(entries)
+        self.closing = closing_minutes * 60
+
+    @staticmethod
+    def parse(entries):
+        """
+        Parameters:
+            entries: list of sessions like "Mon 14:00-16:00"
+
+        Returns: sorted list of (start, end) seconds since Monday 00:00
+        Raises: ValueError if an entry is invalid
+        """
+        sessions = []
+        for entry in entries:
+            match = SESSION_PATTERN.fullmatch(entry.strip().lower())
+            if match is None or match.group(1) not in WEEKDAYS:
+                raise ValueError(f"'{entry}' is invalid. Use the format 'Mon 14:00-16:00'")
+            day = WEEKDAYS.index(match.group(1)) * 24 * 3600
+            start_h, start_m, end_h, end_m = (int(g) for g in match.group(2, 3, 4, 5))
+            if start_h > 23 or end_h > 24 or start_m > 59 or end_m > 59:
+                raise ValueError(f"'{entry}' is not a valid time")
+            start = day + start_h * 3600 + start_m * 60
+            end = day + end_h * 3600 + end_m * 60
+            if end <= start:
+                raise ValueError(f"'{entry}' must end after it starts (sessions can not go past midnight)")
+            sessions.append((start, end))
+        return sorted(sessions)
+
+    def state(self, now):
+        """
+        Parameters:
+            now: datetime to get the queue state at (local time)
+
+        Returns: (QueueState, seconds of local (wall clock) time until the state changes,
+                  datetime the next session starts)
+        """
+        week = now.weekday() * 24 * 3600 + now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+        for start, end in self.sessions:
+            if start <= week < end:
+                if week >= end - self.closing:
+                    return QueueState.CLOSING, end - week, None
+                return QueueState.OPEN, end - self.closing - week, None
+
+        # Closed. Wait for the next session (possibly next week)
+        until = min((start - week) % WEEK_SECONDS for start, _ in self.sessions)
+        return QueueState.CLOSED, until, now + datetime.timedelta(seconds=until)
+
+
+# Queue length history kept by QueueHistory: tier -> (seconds per sample, samples kept)
+HISTORY_TIERS = {
+    "minutes": (60, 24 * 60),    # One day
+    "hours": (60 * 60, 14 * 24),  # Two weeks
+    "days": (24 * 60 * 60, 365),  # One year
+}
+# Number of samples "!q history <tier>" shows
+HISTORY_WINDOWS = {"minutes": 60, "hours": 24, "days": 30}
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+class RingBuffer:
+    """
+    Fixed size buffer. Once full, appending overwrites the oldest item
+
+    Parameters:
+        capacity: most items kept
+    """
+    def __init__(self, capacity):
+        self._items = [None] * capacity
+        self._start = 0
+        self._len = 0
+
+    def append(self, item):
+        end = (self._start + self._len) % len(self._items)
+        self._items[end] = item
+        if self._len < len(self._items):
+            self._len += 1
+        else:
+            self._start = (self._start + 1) % len(self._items)
+
+    def last(self):
+        """
+        Returns: newest item (None if empty)
+        """
+        if self._len == 0:
+            return None
+        return self._items[(self._start + self._len - 1) % len(self._items)]
+
+    def replace_last(self, item):
+        self._items[(self._start + self._len - 1) % len(self._items)] = item
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self._items[(self._start + i) % len(self._items)]
+
+    def __len__(self):
+        return self._len
+
+
+class QueueHistory:
+    """
+    Queue length over time, downsampled into the tiers of HISTORY_TIERS.
+    Every tier is a RingBuffer so memory use never grows no matter how long the bot runs.
+    A sample is a (start time, peak length, last length) tuple covering one tier interval
+
+    Parameters:
+        tiers: dictionary of tier name -> (seconds per sample, samples kept)
+    """
+    def __init__(self, tiers=HISTORY_TIERS):
+        self.tiers = {name: (width, RingBuffer(kept)) for name, (width, kept) in tiers.items()}
+
+    def record(self, length, now=None):
+        """
+        Record the queue length (call whenever the queue changes)
+
+        Parameters:
+            length: current queue length
+            now: unix time of the change (defaults to now)
+
+        Returns: None
+        """
+        now = time.time() if now is None else now
+        for width, samples in self.tiers.values():
+            start = now - now % width
+            last = samples.last()
+            if last is not None and last[0] == start:
+                samples.replace_last((start, max(last[1], length), length))
+            else:
+                # The queue kept its previous length until this change
+                peak = length if last is None else max(last[2], length)
+                samples.append((start, peak, length))
+
+    def series(self, tier, count, now=None):
+        """
+        Peak queue length of each of the last count intervals of a tier (oldest first).
+        Intervals without changes repeat the last known length
+
+        Parameters:
+            tier: name of the tier
+            count: number of intervals
+            now: unix time the last interval contains (defaults to now)
+
+        Returns: list of (start time, peak length or None if unknown) tuples
+        """
+        now = time.time() if now is None else now
+        width, samples = self.tiers[tier]
+        current = now - now % width
+        first = current - width * (count - 1)
+
+        by_start = {}
+        carry = None
+        for start, peak, last in samples:
+            if start < first:
+                carry = last
+            else:
+                by_start[start] = (peak, last)
+
+        series = []
+        for i in range(count):
+            start = first + width * i
+            if start in by_start:
+                peak, carry = by_start[start]
+                series.append((start, peak))
+            else:
+                series.append((start, carry))
+        return series
+
+
+def sparkline(values):
+    """
+    Draw numbers as a line of block characters scaled to the largest value
+
+    Parameters:
+        values: list of numbers (None is drawn as a space)
+
+    Returns: string with one character per value
+    """
+    top = max([v for v in values if v is not None], default=0)
+    line = []
+    for value in values:
+        if value is None:
+            line.append(" ")
+        elif top == 0:
+            line.append(SPARK_CHARS[0])
+        else:
+            line.append(SPARK_CHARS[round(value / top * (len(SPARK_CHARS) - 1))])
+    return "".join(line)
+
+
+# Slash command ("/q <subcommand>") definition registered with Discord when SLASH_COMMANDS is enabled
+# "clear" is left out since its confirmation relies on reactions to a regular message
+SLASH_COMMAND = {
+    "name": "q",
+    "description": "Office hours queue",
+    "options": [
+        {"type": 1, "name": "join", "description": "Join the queue"},
+        {"type": 1, "name": "leave", "description": "Leave the queue"},
+        {"type": 1, "name": "position", "description": "See how many people are in front of you"},
+        {"type": 1, "name": "list", "description": "Get a list of the next 10 people in line"},
+        {"type": 1, "name": "count", "description": "See how many people are in the queue"},
+        {"type": 1, "name": "help", "description": "Get a list of commands"},
+        {"type": 1, "name": "ping", "description": "Make sure the bot can receive/send messages"},
+        {"type": 1, "name": "next", "description": "(TA) Get the next person to help",
+         "options": [{"type": 4, "name": "count", "description": "Number of people to pop"}]},
+        {"type": 1, "name": "peek", "description": "(TA) See the next person without removing them"},
+        {"type": 1, "name": "add", "description": "(TA) Add a user to the end of the queue",
+         "options": [{"type": 6, "name": "user", "description": "User to add", "required": True}]},
+        {"type": 1, "name": "remove", "description": "(TA) Remove a user from the queue",
+         "options": [{"type": 6, "name": "user", "description": "User to remove", "required": True}]},
+        {"type": 1, "name": "front", "description": "(TA) Add/move a user to the front of the queue",
+         "options": [{"type": 6, "name": "user", "description": "User to move", "required": True}]},
+        {"type": 1, "name": "history", "description": "(TA) Chart the queue length over time",
+         "options": [{"type": 3, "name": "range", "description": "Time range to show",
+                      "choices": [{"name": "last hour", "value": "minutes"}, {"name": "last day", "value": "hours"},
+                                  {"name": "last month", "value": "days"}]}]},
+        {"type": 1, "name": "undo", "description": "(TA) Take back the last TA command which changed the queue"},
+    ]
+}
+
+# Replies to these (read-only) subcommands are only shown to the user who ran them
+EPHEMERAL_COMMANDS = {"position", "list", "count", "help", "ping", "peek", "history"}
+
+INTERACTION_APPLICATION_COMMAND = 2
+INTERACTION_OPTION_USER = 6
+INTERACTION_RESPONSE_MESSAGE = 4
+INTERACTION_FLAG_EPHEMERAL = 1 << 6
+
+
+class InteractionMember:
+    """
+    A member built from the raw user/member data of an interaction.
+    Only used when the member is not in discord.py's member cache
+
+    Parameters:
+        user: raw user dictionary
+        member: raw guild member dictionary (or None)
+        roles: list of discord.py role objects the member has
+    """
+    def __init__(self, user, member, roles):
+        self.id = int(user["id"])
+        self.name = user["username"]
+        self.discriminator = user["discriminator"]
+        self.nick = member.get("nick") if member else None
+        self.roles = roles
+        self.mention = f"<@{self.id}>"
+
+    def __str__(self):
+        return f"{self.name}#{self.discriminator}"
+
+
+class InteractionChannel:
+    """
+    Stands in for a discord.py text channel when a command comes from a slash command.
+    QueueBot.send() calls send() on it which replies to the interaction
+    instead of posting a new message to the channel
+
+    Parameters:
+        bot: QueueBot which received the interaction
+        interaction: raw INTERACTION_CREATE payload
+        channel: discord.py text channel the command was run in (None if not cached)
+        ephemeral: True if replies should only be visible to the user who ran the command
+    """
+    def __init__(self, bot, interaction, channel, ephemeral):
+        self.bot = bot
+        self.id = interaction["id"]
+        self.token = interaction["token"]
+        self.application_id = interaction["application_id"]
+        self.channel = channel
+        self.name = channel.name if channel is not None else interaction["channel_id"]
+        self.ephemeral = ephemeral
+        self.responded = False
+
+    async def send(self, content=None, embed=None, allowed_mentions=None):
+        data = {}
+        if content is not None:
+            data["content"] = content
+        if embed is not None:
+            data["embeds"] = [embed.to_dict()]
+        if allowed_mentions is not None:
+            data["allowed_mentions"] = allowed_mentions.to_dict()
+        if self.ephemeral:
+            data["flags"] = INTERACTION_FLAG_EPHEMERAL
+
+        # The first reply responds to the interaction. Any others are sent as followup messages
+        if not self.responded:
+            self.responded = True
+            route = f"/interactions/{self.id}/{self.token}/callback"
+            data = {"type": INTERACTION_RESPONSE_MESSAGE, "data": data}
+        else:
+            route = f"/webhooks/{self.application_id}/{self.token}"
+
+        await self.bot.api_request("POST", route, json=data)
+
+
+class InteractionMessage:
+    """
+    A message-like object built from a slash command so it can be run by QueueBot.queue_command()
+
+    Parameters:
+        content: the equivalent "!q ..." command
+        author: discord.py member (or InteractionMember) who ran the command
+        channel: InteractionChannel to reply to
+        mentions: members passed to the command's user option (in order)
+    """
+    def __init__(self, content, author, channel, mentions):
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.mentions = mentions
+
+
+# Diffs kept so reconnecting dashboard clients can catch up without a full snapshot
+DASHBOARD_HISTORY = 256
+# Events waiting to be sent to one dashboard client before it is disconnected
+DASHBOARD_CLIENT_BUFFER = 64
+# Seconds between comments sent to idle dashboard clients (keeps proxies from closing the stream)
+DASHBOARD_KEEPALIVE = 15
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Queue</title>
+<style>
+body { font-family: sans-serif; max-width: 40em; margin: 2em auto; }
+li { padding: 0.2em 0; }
+.joined { color: #777; font-size: 0.9em; }
+</style>
+</head>
+<body>
+<h1>Queue <span id="length"></span></h1>
+<p id="waitlist"></p>
+<ol id="queue"></ol>
+<script>
+let queue = [];
+let version = null;
+let source = null;
+
+function render(data) {
+    document.getElementById("length").textContent = "(" + queue.length + ")";
+    document.getElementById("waitlist").textContent = data.waitlist ? data.waitlist + " on the waitlist" : "";
+    const list = document.getElementById("queue");
+    list.replaceChildren(...queue.map(entry => {
+        const item = document.createElement("li");
+        item.textContent = entry.name + " ";
+        if (entry.joined) {
+            const joined = document.createElement("span");
+            joined.className = "joined";
+            joined.textContent = "joined " + new Date(entry.joined * 1000).toLocaleTimeString();
+            item.appendChild(joined);
+        }
+        return item;
+    }));
+}
+
+function connect() {
+    source = new EventSource("events");
+    source.addEventListener("snapshot", event => {
+        const data = JSON.parse(event.data);
+        queue = data.queue;
+        version = data.version;
+        render(data);
+    });
+    source.addEventListener("diff", event => {
+        const data = JSON.parse(event.data);
+        if (data.base !== version) {
+            // Missed a change. Start over with a snapshot
+            source.close();
+            version = null;
+            connect();
+            return;
+        }
+        queue.splice(data.start, data.delete, ...data.insert);
+        version = data.version;
+        render(data);
+    });
+}
+
+connect();
+</script>
+</body>
+</html>
+"""
+
+
+class QueueDashboard:
+    """
+    Read-only web view of the queue (used with DASHBOARD_PORT). Serves a page at /,
+    the queue as JSON at /queue and server-sent events at /events
+    It subscribes to the bot's queue events while running and publishes a diff after every change. Each change is sent to every client
+    as one splice (start, delete, insert) which turns the previous version of the queue into
+    the new one. Clients which fall behind are disconnected and catch up from the last version
+    they saw (SSE Last-Event-ID) when they reconnect. Event ids start with an epoch picked when
+    the dashboard is made, so clients which saw an earlier run of the bot get a snapshot instead
+
+    Parameters:
+        bot: QueueBot whose queue is shown
+        host: address to listen on
+        port: port to listen on (0 picks a free port)
+    """
+    def __init__(self, bot, host, port):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        # Versions restart at 0 with every run. The epoch tells runs apart
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        # Uuids and rows of the queue as of self.version
+        self._keys = []
+        self._entries = []
+        self._waitlist_length = 0
+        # (version, encoded diff event) for the last DASHBOARD_HISTORY versions
+        self._diffs = deque(maxlen=DASHBOARD_HISTORY)
+        # One asyncio.Queue of encoded events per connected client
+        self._clients = set()
+        # Number of clients disconnected for falling behind
+        self.dropped = 0
+        self._runner = None
+        self._subscription = None
+
+    async def start(self):
+        """
+        Start listening for HTTP requests
+
+        Returns: None
+        Raises: OSError if the address can't be used
+        """
+        app = web.Application()
+        app.router.add_get("/", self.handle_page)
+        app.router.add_get("/queue", self.handle_queue)
+        app.router.add_get("/events", self.handle_events)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError:
+            await self._runner.cleanup()
+            self._runner = None
+            raise
+        self.port = self._runner.addresses[0][1]
+        self.publish()
+        self._subscription = self.bot.events.subscribe(self.on_queue_event)
+
+    async def stop(self):
+        """
+        Disconnect every client and stop listening
+
+        Returns: None
+        """
+        if self._subscription is not None:
+            self.bot.events.unsubscribe(self._subscription)
+            self._subscription = None
+        for client in list(self._clients):
+            self._disconnect(client)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    @staticmethod
+    def entry(q_user):
+        """
+        Returns: what the dashboard shows for a queued DiscordUser
+        """
+        return {"name": q_user.get_name(), "joined": q_user.join_time}
+
+    def encode(self, event, version, data):
+        """
+        Returns: bytes of one server-sent event (its id is "epoch:version")
+        """
+        return f"id: {self.epoch}:{version}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+    def last_version(self, event_id):
+        """
+        Parameters:
+            event_id: Last-Event-ID a reconnecting client sent (None if it sent none)
+
+        Returns: the last version the client saw, or None if the id is invalid or from another epoch
+        """
+        epoch, _, version = (event_id or "").partition(":")
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(version)
+        except ValueError:
+            return None
+
+    def snapshot(self):
+        """
+        Returns: the whole queue as of self.version
+        """
+        return {"version": self.version, "queue": self._entries, "waitlist": self._waitlist_length}
+
+    def on_queue_event(self, event):
+        """
+        Event bus subscriber. Publishes a diff for the change
+
+        Parameters:
+            event: QueueEvent
+
+        Returns: None
+        """
+        self.publish()
+
+    def publish(self):
+        """
+        Compare the queue to the last published version and send the difference to every client
+        Only the changed middle of the queue is sent (everything between the unchanged front and back)
+
+        Returns: the diff sent, or None if nothing shown on the dashboard changed
+        """
+        queue = list(self.bot._queue.snapshot())
+        keys = [q_user.uuid for q_user in queue]
+        old_keys = self._keys
+        waitlist_length = len(self.bot._waitlist)
+
+        limit = min(len(old_keys), len(keys))
+        start = 0
+        while start < limit and old_keys[start] == keys[start]:
+            start += 1
+        end = 0
+        while end < limit - start and old_keys[-1 - end] == keys[-1 - end]:
+            end += 1
+        delete = len(old_keys) - start - end
+        insert = [self.entry(q_user) for q_user in queue[start:len(keys) - end]]
+        if delete == 0 and len(insert) == 0 and waitlist_length == self._waitlist_length:
+            return None
+
+        self._keys = keys
+        self._entries[start:start + delete] = insert
+        self._waitlist_length = waitlist_length
+        self.version += 1
+        diff = {"version": self.version, "base": self.version - 1, "start": start, "delete": delete,
+                "insert": insert, "waitlist": waitlist_length}
+        event = self.encode("diff", self.version, diff)
+        self._diffs.append((self.version, event))
+
+        for client in list(self._clients):
+            try:
+                client.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                self._disconnect(client)
+        return diff
+
+    def catch_up(self, last_version):
+        """
+        Parameters:
+            last_version: last version a client saw (None for a new client)
+
+        Returns: bytes with the diffs since last_version, or a snapshot if they are no longer kept
+        """
+        if last_version is not None and last_version == self.version:
+            return b""
+        if last_version is not None and 0 <= last_version < self.version and \
+                len(self._diffs) > 0 and self._diffs[0][0] <= last_version + 1:
+            return b"".join(event for version, event in self._diffs if version > last_version)
+        return self.encode("snapshot", self.version, self.snapshot())
+
+    def _disconnect(self, client):
+        """
+        Throw away a client's pending events and tell its handler to end the stream
+        """
+        self._clients.discard(client)
+        while not client.empty():
+            client.get_nowait()
+        client.put_nowait(None)
+
+    async def handle_page(self, request):
+        return web.Response(text=DASHBOARD_PAGE, content_type="text/html")
+
+    async def handle_queue(self, request):
+        return web.json_response(self.snapshot())
+
+    async def handle_events(self, request):
+        """
+        Stream queue changes as server-sent events until the client disconnects or falls behind
+
+        Returns: aiohttp StreamResponse
+        """
+        last_version = self.last_version(request.headers.get("Last-Event-ID"))
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        client = asyncio.Queue(maxsize=DASHBOARD_CLIENT_BUFFER)
+        self._clients.add(client)
+        try:
+            await response.write(b"retry: 1000\n\n" + self.catch_up(last_version))
+            while True:
+                try:
+                    event = await asyncio.wait_for(client.get(), DASHBOARD_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    await response.write(b": keepalive\n\n")
+                    continue
+                # Send everything that is already waiting in one write
+                events = [event]
+                while event is not None and not client.empty():
+                    event = client.get_nowait()
+                    events.append(event)
+                await response.write(b"".join(e for e in events if e is not None))
+                if event is None:
+                    break
+        except ConnectionResetError:
+            pass
+        finally:
+            self._clients.discard(client)
+        return response
+
+
+# TODO Alert user if they're in voice channel and not in queue?
+
+class QueueBot(discord.Client):
+    """
+    Instantiate the QueueBot that connects to a Discord server to manage a single queue
+
+    Parameters:
+        config: A QueueConfig object specifying config options
+        logger: A logger object created from Python's logging module
+        testing: Used for unit testing. Leave as False unless testing
+        transport: Transport the bot's messages go through
+                   (defaults to DiscordTransport, or StdoutTransport when testing)
+        options: Extra keyword arguments passed to discord.Client (ex: guild_ready_timeout)
+    """
+
+    # TODO Use config testing instead of optional param
+    def __init__(self, config, logger, testing=False, transport=None, **options):
+        assert isinstance(config, QueueConfig)
+
+        intents = discord.Intents.default()
+        intents.typing = False
+        intents.presences = False
+        intents.dm_messages = False
+        intents.invites = False
+        # Cache voice channels only if queuebot checks voice channel state
+        intents.members = True if config.CHECK_VOICE_WAITING or config.ALERT_ON_FIRST_JOIN else False
+        # Skip downloading every server member before on_ready. Members in voice channels
+        # still come with the server data/voice events and command authors are cached as they show up
+        if intents.members and (config.LAZY_MEMBERS or config.MEMORY_LEAN):
+            options.setdefault("chunk_guilds_at_startup", False)
+        if config.MEMORY_LEAN:
+            # Only keep what the bot uses: no message cache and members only while they are in voice
+            intents.emojis = False
+            intents.integrations = False
+            intents.webhooks = False
+            intents.bans = False
+            member_cache_flags = discord.MemberCacheFlags.none()
+            member_cache_flags.voice = intents.members
+            options.setdefault("max_messages", None)
+            options.setdefault("member_cache_flags", member_cache_flags)
+        super().__init__(intents=intents, **options)  # Initialize discord.py properties
+
+        self.is_initialized = False
+        self.config = config
+        self.logger = logger
+        # This queue holds DiscordUser objects
+        # Items are pulled off the left and pushed onto the right
+        # With DATABASE_FILE the queue is kept in SQLite so other processes can share it
+        self._queue = SQLiteStore(config.DATABASE_FILE) if config.DATABASE_FILE else MemoryStore()
+        self._store_watcher = None
+        # Students waiting for room in the queue once it reaches config.CAPACITY (same order as the queue)
+        self._waitlist = deque()
+        # Messages handed to the transport which have not been sent yet
+        self._sends_in_flight = 0
+        self._shed_reply_at = 0
+
+        self.testing = testing
+        if transport is None:
+            transport = StdoutTransport() if testing else DiscordTransport(self)
+        self.transport = transport
+        self.waiting_room = None
+        self.alerts_channel = None
+        self.office_rooms = []
+        self.listen_channels = []
+        # Ids of self.listen_channels, checked by on_message for every message
+        self.listen_channel_ids = frozenset()
+        self._config_watcher = None
+        self._config_mtime = None
+        # Office room occupancy for AUTO_DISPATCH (built by apply_config)
+        self.office_tracker = None
+        # AUTO_MOVE voice channel moves which have not finished yet
+        self._move_tasks = set()
+        # Scheduled office hours (built by apply_config). The queue is always open without a schedule
+        self.office_hours = None
+        self.queue_state = QueueState.OPEN
+        self._schedule_timer = None
+        # Reply to "!q join" while the queue is not open (None while it is open)
+        self._closed_reply = None
+        # Queue list shown when the next session opens (rendered when the last one closed)
+        self._open_board = None
+        # Queue length over time for !q history
+        self.history = QueueHistory()
+        # Last UNDO_HISTORY TA commands which changed the queue (UndoStep objects, oldest first)
+        self._undo = deque(maxlen=UNDO_HISTORY)
+        # Number of queue changes, and the number when the queue was last logged in full
+        self._queue_changes = 0
+        self._snapshot_changes = 0
+        self._snapshot_task = None
+        # Read-only web view of the queue (started by on_ready with DASHBOARD_PORT)
+        self.dashboard = None
+        # Every change to the queue is published here. Side effects of queue changes subscribe to it
+        self.events = EventBus(self.loop, self._event_error)
+        self.events.subscribe(self.record_change)
+        # Only the latest queue length matters for the presence
+        self.events.subscribe(self.update_presence, maxsize=1, overflow=Overflow.DROP_OLDEST)
+        self.events.subscribe(self.alert_on_first_join, kinds=[QueueEventType.JOIN])
+        # Set while a presence update is waiting on discord.py's rate limit
+        self._presence_pending = False
+        self._presence_stale = False
+        # Set by SIGTERM. No new commands are accepted while the bot shuts down
+        self.is_shutting_down = False
+        self._running_commands = 0
+        self._lock_file = None
+        # Seconds from start() until the bot was ready for commands
+        self.startup_time = None
+        self._start_time = None
+
+        # Removes queued students who leave the waiting room for longer than VOICE_WAITING_GRACE seconds
+        self.voice_sweeper = None
+        if config.CHECK_VOICE_WAITING and config.VOICE_WAITING_GRACE > 0:
+            self.voice_sweeper = TimerWheel(self.loop, self.prune_absent, tick=min(1.0, config.VOICE_WAITING_GRACE / 10),
+                                            on_error=self._sweeper_error)
+        # Confirmation messages waiting for a TA reaction (message id -> PendingConfirmation)
+        self._confirmations = {}
+        # Base url for slash command registration/replies (tests point this to a local stand-in)
+        self.api_url = "https://discord.com/api/v8"
+        self._api_session = None
+
+        self.msg_help = {
+            "STUDENT": f"""__STUDENT COMMANDS:__
+> `!q help` - Get this help message
+> `!q join`  - Join the queue
+> `!q join notify 3` - Join the queue and get a Direct Message once you are at position #3 (up to {MAX_NOTIFY_POSITION})
+> `!q leave` - Leave the queue
+> `!q position` - See how many people are in front of you
+> `!q list` - Get a list of the next 10 people in line""",
+
+            "TA": """__TA COMMANDS:__
+> `!q help` - Get this help message
+> `!q ping` - Bot should reply with `Pong!` Used to make sure bot can receive/send messages
+> `!q next` - Get the next person to help **(REMOVES FROM QUEUE)**
+> `!q next 3 @ta1 @ta2 @ta3` - Get the next 3 people and assign them to the mentioned TAs (mentions are optional)
+> `!q peek` - See the next person in the queue WITHOUT removing them
+> `!q clear` - Empty the queue (requires confirmation)
+> `!q undo` - Take back the last `next`, `add`, `remove`, `front`, `clear` or `import` (people who joined since stay in the queue)
+> `!q add @user` - add @user to the end of the queue (you must @mention the person)
+> `!q remove @user` - remove @user from the queue (you must @mention the person)
+> `!q front @user` - adds/moves @user to the front of the queue (you must @mention the person)
+> `!q list` - Get a list of the next 10 people in line
+> `!q history` - Chart the queue length over the last hour (`!q history hours` or `!q history days` for the last day or month)
+> `!q export` - Get the queue as a CSV file (`!q export json` for JSON)
+> `!q import` - Add everyone in an attached `!q export` file to the end of the queue
+
+NOTE: add, remove and front accept several mentions (ex: `!q add @user1 @user2`). Order is preserved
+NOTE: Student commands are commands that require no permissions to run (TAs can also run student commands)"""
+        }
+        # Full DM sent by !q help for each kind of user (built once instead of on every request)
+        self.help_payloads = {
+            "STUDENT": self.msg_help["STUDENT"],
+            "TA": self.msg_help["STUDENT"] + "\n\n" + self.msg_help["TA"],
+        }
+        # user id -> DM channel, least recently used first
+        self._dm_channels = OrderedDict()
+        # user id -> time help was last sent, oldest first
+        self._help_sent = OrderedDict()
+        # user id -> position to send a Direct Message at ("!q join notify k")
+        self._notify_at = {}
+        # (DiscordUser, position) waiting for self._notify_task to send their Direct Message
+        self._notify_due = []
+        self._notify_task = None
+        self.events.subscribe(self.check_notify, kinds=[QueueEventType.POP, QueueEventType.REMOVE, QueueEventType.LEAVE,
+                                                        QueueEventType.FRONT, QueueEventType.PROMOTE,
+                                                        QueueEventType.CLEAR, QueueEventType.RELOAD, QueueEventType.UNDO])
+
+    async def on_ready(self):
+        """
+        Discord.py calls this on initialization (does not run in testing mode)
+        It does some setup and saves the waiting room voice channel to self.waiting_room
+
+        Returns: None
+        """
+        self.logger.info('Logged in as {0}!'.format(self.user))
+
+        if len(self.guilds) == 0:
+            self.logger.error("The bot is not connected to any servers! " +
+                              "Please add the bot to a server as shown in the README")
+
+        self.logger.debug(f"Found server '{self.guilds[0].name}'. Comparing config to server channels")
+
+        try:
+            await self.apply_config(self.config, self.guilds[0])
+        except ConfigError as e:
+            self.logger.error(e)
+            sys.exit(1)
+
+        if self.config.MEMORY_LEAN:
+            await self.trim_guild_state(self.guilds[0])
+
+        await self.update_presence()
+        self.is_initialized = True
+
+        if self.startup_time is None and self._start_time is not None:
+            self.startup_time = time.perf_counter() - self._start_time
+            self.logger.info(f"Ready for commands {self.startup_time:.2f}s after starting " +
+                             f"({len(self.guilds[0].members)} members cached)")
+
+        if self._config_watcher is None:
+            self.watch_config()
+        if self.config.DATABASE_FILE and self._store_watcher is None:
+            self._store_watcher = self.loop.create_task(self.watch_store())
+        if self._snapshot_task is None:
+            self._snapshot_task = self.loop.create_task(self.snapshot_queue())
+        if self.config.DASHBOARD_PORT and self.dashboard is None:
+            await self.start_dashboard(self.config.DASHBOARD_HOST, self.config.DASHBOARD_PORT)
+
+    async def start_dashboard(self, host, port):
+        """
+        Start serving the read-only queue dashboard. The bot keeps running without it
+        if the address can't be used
+
+        Parameters:
+            host: address to listen on
+            port: port to listen on
+
+        Returns: True if the dashboard started
+        """
+        dashboard = QueueDashboard(self, host, port)
+        try:
+            await dashboard.start()
+        except OSError as e:
+            self.logger.error(f"Unable to start the dashboard on {host}:{port}: {e}")
+            return False
+        self.dashboard = dashboard
+        self.logger.info(f"Dashboard running at http://{host}:{dashboard.port}/")
+        return True
+
+    async def trim_guild_state(self, guild):
+        """
+        Used with MEMORY_LEAN. Drops server data the bot never reads (emojis) and
+        fetches the members already in voice channels, which discord.py does not cache
+        from the server data when it only keeps members who are in voice
+
+        Parameters:
+            guild: discord.py guild the bot is in
+
+        Returns: None
+        """
+        guild.emojis = ()
+        self._connection._emojis.clear()
+
+        if not self.intents.members:
+            return
+
+        missing = [user_id for user_id in guild._voice_states if guild.get_member(user_id) is None]
+        # Discord accepts at most 100 user ids per request
+        for i in range(0, len(missing), 100):
+            await guild.query_members(user_ids=missing[i:i + 100], limit=100, cache=True)
+        self.logger.debug(f"Fetched {len(missing)} members in voice channels")
+
+    async def start(self, *args, **kwargs):
+        """
+        Connect to Discord (see discord.Client.start). Records when startup began so
+        on_ready can report how long it took
+        With LOCK_FILE set, the bot logs in then waits as a warm standby until it holds
+        the lock. The queue is loaded from STATE_FILE right before connecting
+        """
+        self._start_time = time.perf_counter()
+        try:
+            # Replaces discord.py's handler (which stops the event loop right away)
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: self.loop.create_task(self.shutdown()))
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass  # No signal handlers on Windows
+
+        await self.login(*args, bot=kwargs.pop("bot", True))
+        if self.config.LOCK_FILE:
+            await self.acquire_lock(self.config.LOCK_FILE)
+            # Only count the takeover, not the time spent waiting
+            self._start_time = time.perf_counter()
+        if self.config.STATE_FILE:
+            self.load_state(self.config.STATE_FILE)
+        await self.connect(reconnect=kwargs.pop("reconnect", True))
+
+    async def acquire_lock(self, path):
+        """
+        Take an exclusive lock on path, waiting while another QueueBot holds it.
+        The lock is released when the bot closes (or the process exits)
+
+        Parameters:
+            path: path to the lock file
+
+        Returns: None
+        """
+        lock_file = open(path, "a+")
+        waiting = False
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if not waiting:
+                    self.logger.info(f"Another QueueBot holds {path}. Waiting as a standby")
+                    waiting = True
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        self.logger.info(f"Took {path}" + (". Taking over from the previous QueueBot" if waiting else ""))
+
+    def save_state(self, path):
+        """
+        Write the queue to path. The file is replaced atomically so a crash
+        never leaves a half written queue
+
+        Parameters:
+            path: path to the state file
+
+        Returns: None
+        """
+        state = {
+            "version": 1,
+            "queue": [{"uuid": u.uuid, "name": u.name, "discriminator": u.discriminator, "nick": u.nick,
+                       "join_time": u.join_time} for u in self._queue],
+            "waitlist": [{"uuid": u.uuid, "name": u.name, "discriminator": u.discriminator, "nick": u.nick,
+                          "join_time": u.join_time} for u in self._waitlist],
+            "notify": {str(uuid): position for uuid, position in self._notify_at.items()},
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+        self.logger.info(f"Saved {len(self._queue)} queued users to {path}")
+
+    def load_state(self, path):
+        """
+        Replace the queue with the one saved in path (if it exists)
+
+        Parameters:
+            path: path to the state file
+
+        Returns: True if a queue was loaded
+        """
+        if not os.path.exists(path):
+            return False
+
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            queue = deque(DiscordUser(u["uuid"], u["name"], u["discriminator"], u["nick"]) for u in state["queue"])
+            waitlist = deque(DiscordUser(u["uuid"], u["name"], u["discriminator"], u["nick"])
+                             for u in state.get("waitlist", []))
+            for q_user, u in zip(itertools.chain(queue, waitlist), itertools.chain(state["queue"], state.get("waitlist", []))):
+                q_user.join_time = u.get("join_time")
+            notify_at = {int(uuid): int(position) for uuid, position in state.get("notify", {}).items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.error(f"Unable to load the queue from {path}: {e}")
+            return False
+
+        self._queue.replace(queue)
+        self._waitlist = waitlist
+        self._notify_at = notify_at
+        # Undo steps were taken on the replaced queue
+        self._undo.clear()
+        self.publish_change(QueueEventType.RELOAD, list(queue))
+        self.logger.info(f"Loaded {len(queue)} queued users from {path}")
+        return True
+
+    async def shutdown(self):
+        """
+        Stop accepting commands, wait (up to SHUTDOWN_TIMEOUT seconds) for running
+        commands to send their replies (and AUTO_MOVE moves and event subscribers to finish),
+        save the queue to STATE_FILE, then disconnect.
+        Called on SIGTERM
+
+        Returns: None
+        """
+        if self.is_shutting_down:
+            return
+        self.is_shutting_down = True
+        self.logger.info("Shutting down. No longer accepting commands")
+
+        if self.voice_sweeper is not None:
+            self.voice_sweeper.clear()
+        if self._schedule_timer is not None:
+            self._schedule_timer.cancel()
+
+        deadline = self.loop.time() + SHUTDOWN_TIMEOUT
+        while (self._running_commands > 0 or len(self._move_tasks) > 0 or self.events.pending > 0 or
+               self._notify_task is not None) and \
+                self.loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        if self._running_commands > 0:
+            self.logger.warning(f"Shutting down with {self._running_commands} commands still running")
+
+        self.log_snapshot()
+        if self.config.STATE_FILE:
+            self.save_state(self.config.STATE_FILE)
+        await self.close()
+
+    async def apply_config(self, config, guild):
+        """
+        Find the channels a config refers to then switch the bot over to it.
+        Everything is looked up before anything is changed so a bad config leaves
+        the current one in place. The queue is not touched
+
+        Parameters:
+            config: QueueConfig object to switch to
+            guild: discord.py guild to look for the channels in
+
+        Returns: None
+        Raises: ConfigError if the config does not match the server
+        """
+        waiting_room = None
+        office_rooms = []
+        alerts_channel = None
+        if config.CHECK_VOICE_WAITING:
+            waiting_room = await self.get_waiting_room(guild.voice_channels, config)
+        if config.ALERT_ON_FIRST_JOIN:
+            office_rooms = await self.get_office_rooms(guild.voice_channels, config)
+            alerts_channel = await self.get_alerts_channel(guild.text_channels, config)
+        listen_channels = await self.check_listen_channels(guild.text_channels, config)
+
+        # Swap everything in at once (no awaits) so commands never see a mix of old and new settings
+        old_config = self.config
+        self.config = config
+        self.waiting_room = waiting_room
+        self.office_rooms = office_rooms
+        self.alerts_channel = alerts_channel
+        self.listen_channels = listen_channels
+        self.listen_channel_ids = frozenset(channel.id for channel in listen_channels)
+
+        if not config.CHECK_VOICE_WAITING or config.VOICE_WAITING_GRACE <= 0:
+            if self.voice_sweeper is not None:
+                self.voice_sweeper.clear()
+            self.voice_sweeper = None
+        elif self.voice_sweeper is None:
+            self.voice_sweeper = TimerWheel(self.loop, self.prune_absent, tick=min(1.0, config.VOICE_WAITING_GRACE / 10),
+                                            on_error=self._sweeper_error)
+
+        await self.reset_office_tracker()
+        self.reset_schedule()
+
+        # Register on startup or when a reload turns slash commands on
+        if config.SLASH_COMMANDS and (not self.is_initialized or not old_config.SLASH_COMMANDS):
+            await self.register_slash_commands(guild)
+
+    async def reset_office_tracker(self):
+        """
+        Start tracking the office rooms for AUTO_DISPATCH (or stop if it is disabled).
+        The rooms are only scanned here. Voice state events keep the tracker up to date
+
+        Returns: None
+        """
+        if not self.config.AUTO_DISPATCH:
+            self.office_tracker = None
+            return
+
+        tracker = OfficeTracker(self.office_rooms)
+        for room in self.office_rooms:
+            for member in room.members:
+                tracker.join(room.id, member.id, await self.is_ta(member.roles))
+        self.office_tracker = tracker
+        await self.dispatch_students()
+
+    async def dispatch_students(self):
+        """
+        Used with AUTO_DISPATCH. Pops the next student for every available office room
+        (longest waiting room first) and tells the student where to go.
+        The room is held for the student for DISPATCH_TIMEOUT seconds
+
+        Returns: Number of students dispatched
+        """
+        tracker = self.office_tracker
+        if tracker is None:
+            return 0
+
+        dispatched = 0
+        while len(self._queue) > 0 and len(tracker.available) > 0:
+            room_id = next(iter(tracker.available))
+            room = tracker.rooms[room_id]
+            student = self._queue.popleft()
+            self.publish_change(QueueEventType.POP, [student])
+            tracker.reserve(room_id, student.uuid)
+            self.loop.call_later(DISPATCH_TIMEOUT, self._expire_dispatch, room_id, student.uuid)
+            dispatched += 1
+
+            self.logger.info(f"Dispatched {student} to {room.name}")
+            if len(self.listen_channels) > 0:
+                self.schedule_move(student, None, self.listen_channels[0], room)
+                tas = " ".join(f"<@{ta_id}>" for ta_id in tracker.tas(room_id))
+                await self.send(self.listen_channels[0], f"{student.get_mention()} please join the '{room.name}' " +
+                                f"voice channel. {tas} will help you there\nRemaining people in the queue: {len(self._queue)}")
+
+        if dispatched > 0:
+            await self.promote_waitlist()
+        return dispatched
+
+    def _expire_dispatch(self, room_id, student_id):
+        if self.office_tracker is not None and self.office_tracker.release(room_id, student_id):
+            self.logger.info(f"<@{student_id}> did not join the office room in time. Dispatching again")
+            self.loop.create_task(self.dispatch_students())
+
+    def reset_schedule(self, now=None):
+        """
+        Load the office hours schedule from the config (or stop it if OFFICE_HOURS is empty)
+        and set the queue state without announcing it. Queued students are kept
+
+        Parameters:
+            now: datetime to use as the current time (for testing)
+
+        Returns: None
+        """
+        if self._schedule_timer is not None:
+            self._schedule_timer.cancel()
+            self._schedule_timer = None
+
+        if len(self.config.OFFICE_HOURS) == 0:
+            self.office_hours = None
+            self.queue_state = QueueState.OPEN
+            self._closed_reply = None
+            return
+
+        self.office_hours = OfficeHours(self.config.OFFICE_HOURS, self.config.CLOSING_MINUTES)
+        self._set_schedule_state(now or datetime.datetime.now())
+
+    def _set_schedule_state(self, now):
+        """
+        Set self.queue_state from the schedule, cache the join reply for it
+        and start the timer for the next change
+
+        Returns: the previous QueueState
+        """
+        state, delay, next_open = self.office_hours.state(now)
+        old_state = self.queue_state
+        self.queue_state = state
+        if state is QueueState.OPEN:
+            self._closed_reply = None
+        elif state is QueueState.CLOSING:
+            self._closed_reply = "office hours are ending soon. The queue is closed to new students"
+        else:
+            self._closed_reply = "the queue is closed. Office hours start again " + next_open.strftime("%a %b %d at %H:%M")
+
+        # The delay is in wall clock time. Compare aware datetimes so the timer
+        # still fires on time when a DST change falls before the boundary
+        boundary = (now + datetime.timedelta(seconds=delay)).astimezone()
+        delay = max(0.0, (boundary - now.astimezone()).total_seconds())
+        # Wake up just after the change so the schedule is past the boundary
+        self._schedule_timer = self.loop.call_later(delay + 0.01, self._schedule_expired)
+        return old_state
+
+    def _schedule_expired(self):
+        self._schedule_timer = None
+        self.loop.create_task(self.advance_schedule())
+
+    async def advance_schedule(self, now=None):
+        """
+        Called by the schedule timer. Switches the queue to the state the schedule is in
+        and announces the change in the first listen channel:
+            open: the queue list pre-rendered when the last session closed is sent
+            closing: students are told the queue no longer takes new students
+            closed: everyone left in the queue is removed at once (and listed in the logs)
+
+        Parameters:
+            now: datetime to use as the current time (for testing)
+
+        Returns: the new QueueState
+        """
+        if self.office_hours is None:
+            return self.queue_state
+
+        if self._schedule_timer is not None:
+            self._schedule_timer.cancel()
+        old_state = self._set_schedule_state(now or datetime.datetime.now())
+        state = self.queue_state
+        if state is old_state:
+            return state
+
+        self.logger.info(f"Queue is now {state.value} (was {old_state.value})")
+        channel = self.listen_channels[0] if len(self.listen_channels) > 0 else None
+        if state is QueueState.OPEN:
+            board = self._open_board if self._open_board is not None else self.render_board()
+            self._open_board = None
+            if channel is not None:
+                await self.send(channel, "Office hours have started. Type `!q join` to join the queue",
+                                CmdPrefix.SUCCESS, embed=board)
+        elif state is QueueState.CLOSING:
+            if channel is not None:
+                minutes = self.config.CLOSING_MINUTES
+                await self.send(channel, f"Office hours end in {minutes:g} minutes. The queue is closed to new students",
+                                CmdPrefix.WARNING)
+        else:
+            await self.close_queue(channel)
+        return state
+
+    async def close_queue(self, channel):
+        """
+        End the session: empty the queue in one batch, log who was left in it
+        and render the queue list for the next session
+
+        Parameters:
+            channel: discord.py channel to announce the end of office hours in (or None)
+
+        Returns: list of DiscordUser objects who were still in the queue (or on the waitlist)
+        """
+        archived = list(self._queue) + list(self._waitlist)
+        self._queue.clear()
+        self._waitlist.clear()
+        # Commands from the last session can't be undone into the next one
+        self._undo.clear()
+        self.publish_change(QueueEventType.CLEAR, archived)
+        if self.voice_sweeper is not None:
+            self.voice_sweeper.clear()
+        self.logger.info(f"Office hours are over. {len(archived)} people were left in the queue: " +
+                         ", ".join(str(q_user) for q_user in archived))
+
+        if channel is not None:
+            message = "Office hours are over and the queue is closed"
+            if len(archived) > 0:
+                message += ". Removed from the queue: " + " ".join(q_user.get_mention() for q_user in archived)
+            await self.send(channel, message, CmdPrefix.WARNING)
+        self._open_board = self.render_board()
+        return archived
+
+    async def reload_config(self, config, guild=None):
+        """
+        Switch to a new config without restarting (the queue stays as is)
+        Options that can only change on restart (SECRET_TOKEN and options that change the
+        gateway intents) keep their current values. If the new config does not match the
+        server, the current config is kept
+
+        Parameters:
+            config: QueueConfig object to switch to
+            guild: discord.py guild to look for channels in (defaults to the bot's server)
+
+        Returns: True if the config was switched
+        """
+        if config.SECRET_TOKEN != self.config.SECRET_TOKEN:
+            self.logger.warning("SECRET_TOKEN changed. The new token will be used after restarting the bot")
+            config.keep_option("SECRET_TOKEN", self.config)
+        for key in ("LAZY_MEMBERS", "MEMORY_LEAN", "LOCK_FILE", "DATABASE_FILE", "DASHBOARD_PORT", "DASHBOARD_HOST"):
+            if getattr(config, key) != getattr(self.config, key):
+                self.logger.warning(f"{key} changed. The new value will be used after restarting the bot")
+                config.keep_option(key, self.config)
+        if (config.CHECK_VOICE_WAITING or config.ALERT_ON_FIRST_JOIN) and not self.intents.members:
+            self.logger.error("Config not reloaded: CHECK_VOICE_WAITING and ALERT_ON_FIRST_JOIN can only be " +
+                              "enabled by restarting the bot")
+            return False
+
+        try:
+            await self.apply_config(config, guild if guild is not None else self.guilds[0])
+        except ConfigError as e:
+            self.logger.error(f"Config not reloaded: {e}")
+            return False
+
+        self.logger.info("Reloaded config:\n" + str(config))
+        return True
+
+    async def reload_config_source(self, path=CONFIG_FILE):
+        """
+        Re-read the config from the same place it was loaded from at startup
+        (environment variables or the config file) and switch to it
+
+        Parameters:
+            path: path to the config file
+
+        Returns: True if the config was switched
+        """
+        if not self.config.from_env and not os.path.exists(path):
+            self.logger.error(f"Config not reloaded: {path} does not exist")
+            return False
+
+        try:
+            config = read_config(self.config.from_env, path)
+        except (ConfigError, KeyError, ValueError, OSError) as e:
+            self.logger.error(f"Config not reloaded: {e}")
+            return False
+
+        return await self.reload_config(config)
+
+    async def poll_config_file(self, path):
+        """
+        Reload the config if the config file was modified since it was last checked
+
+        Parameters:
+            path: path to the config file
+
+        Returns: True if the config was switched
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return False
+
+        if self._config_mtime is None or mtime == self._config_mtime:
+            self._config_mtime = mtime
+            return False
+
+        self._config_mtime = mtime
+        self.logger.info(f"{path} changed. Reloading config")
+        return await self.reload_config_source(path)
 
-NOTE: Student commands are commands that require no permissions to run (TAs can also run student commands)"""
-        }
+    def watch_config(self):
+        """
+        Reload the config when SIGHUP is received and, when the config comes from
+        CONFIG_FILE, whenever the file changes (checked every CONFIG_POLL_INTERVAL seconds)
 
-    async def on_ready(self):
+        Returns: None
         """
-        Discord.py calls this on initialization (does not run in testing mode)
-        It does some setup and saves the waiting room voice channel to self.waiting_room
+        try:
+            self.loop.add_signal_handler(signal.SIGHUP, lambda: self.loop.create_task(self.reload_config_source()))
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass  # No SIGHUP on Windows
+
+        async def watch():
+            while not self.is_closed():
+                await self.poll_config_file(CONFIG_FILE)
+                await asyncio.sleep(CONFIG_POLL_INTERVAL)
+
+        if not self.config.from_env:
+            self._config_watcher = self.loop.create_task(watch())
+
+    async def watch_store(self):
+        """
+        Used with DATABASE_FILE. Every STORE_POLL_INTERVAL seconds, check whether another
+        process changed the shared queue and publish a RELOAD event if so
 
         Returns: None
         """
-        self.logger.info('Logged in as {0}!'.format(self.user))
+        while not self.is_closed():
+            if self._queue.changed():
+                self.logger.debug("Queue changed by another process")
+                self._undo.clear()
+                self.publish_change(QueueEventType.RELOAD, [])
+            await asyncio.sleep(STORE_POLL_INTERVAL)
+
+    async def snapshot_queue(self):
+        """
+        Every QUEUE_SNAPSHOT_INTERVAL seconds, log everyone in the queue if it changed
 
-        if len(self.guilds) == 0:
-            self.logger.error("The bot is not connected to any servers! " +
-                              "Please add the bot to a server as shown in the README")
+        Returns: None
+        """
+        while not self.is_closed():
+            await asyncio.sleep(QUEUE_SNAPSHOT_INTERVAL)
+            self.log_snapshot()
 
-        self.logger.debug(f"Found server '{self.guilds[0].name}'. Comparing config to server channels")
+    def log_snapshot(self):
+        """
+        Log everyone in the queue (and waitlist) if the queue changed since the last snapshot
+
+        Returns: True if a snapshot was logged
+        """
+        if self._snapshot_changes == self._queue_changes:
+            return False
+        self._snapshot_changes = self._queue_changes
 
-        if self.config.CHECK_VOICE_WAITING:
-            self.waiting_room = await self.get_waiting_room(self.guilds[0].voice_channels)
-        if self.config.ALERT_ON_FIRST_JOIN:
-            self.office_rooms = await self.get_office_rooms(self.guilds[0].voice_channels)
-            self.alerts_channel = await self.get_alerts_channel(self.guilds[0].text_channels)
+        if self.config.LOG_FORMAT == "json":
+            self.log_event("snapshot", queue_length=len(self._queue), queue=[q_user.uuid for q_user in self._queue],
+                           waitlist=[q_user.uuid for q_user in self._waitlist])
+        else:
+            self.logger.info('Queue state: ' + ", ".join(str(el) for el in self._queue))
+        return True
 
-        await self.check_listen_channels(self.guilds[0].text_channels)
+    def log_event(self, event, **fields):
+        """
+        Used with LOG_FORMAT=json. Log one event as a single line of compact JSON.
+        Events in SAMPLED_EVENTS are only logged LOG_SAMPLE_RATE of the time
+        (and record the rate so counts can be scaled back up)
 
-        await self.update_presence()
-        self.is_initialized = True
+        Parameters:
+            event: event name
+            fields: event fields (must be JSON serializable)
 
-    async def get_waiting_room(self, voice_channels):
+        Returns: None
+        """
+        rate = self.config.LOG_SAMPLE_RATE
+        if event in SAMPLED_EVENTS and rate < 1:
+            if random.random() >= rate:
+                return
+            fields["sample_rate"] = rate
+        self.logger.info(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, separators=(",", ":")))
+
+    async def get_waiting_room(self, voice_channels, config):
         """
-        Search all guild voice channels to find self.config.VOICE_WAITING
-        NOTE: This function terminates the program if it can't find the voice channel
+        Search all guild voice channels to find config.VOICE_WAITING
 
         Parameters:
             voice_channels: list of all voice channels in the guild
+            config: QueueConfig object to get the channel name from
 
         Returns: discord.py object represending waiting room voice channel
+        Raises: ConfigError if it can't find the voice channel
         """
         for channel in voice_channels:
-            if channel.name == self.config.VOICE_WAITING:
+            if channel.name == config.VOICE_WAITING:
                 self.logger.debug("Found waiting room voice channel")
                 return channel
 
-        self.logger.error(f"Unable to find voice channel '{self.config.VOICE_WAITING}'!" +
+        raise ConfigError(f"Unable to find voice channel '{config.VOICE_WAITING}'!" +
                           "\nAvailable voice channels: " + ", ".join([f"'{c.name}'" for c in voice_channels]))
-        sys.exit(1)
 
-    async def get_office_rooms(self, voice_channels):
+    async def get_office_rooms(self, voice_channels, config):
         """
-        Search all guild voice channels to find self.config.VOICE_OFFICES
-        NOTE: This function terminates the program if it can't find all the voice channels
+        Search all guild voice channels to find config.VOICE_OFFICES
 
         Parameters:
             voice_channels: list of all voice channels in the guild
+            config: QueueConfig object to get the channel names from
 
         Returns: list of discord.py objects represending office hour voice channels
+        Raises: ConfigError if it can't find all the voice channels
         """
-        config_offices = set(self.config.VOICE_OFFICES)
+        config_offices = set(config.VOICE_OFFICES)
         office_channels = list(filter(lambda c: c.name in config_offices, voice_channels))
 
         if len(office_channels) != len(config_offices):
             missing = config_offices - set([v.name for v in office_channels])
 
-            self.logger.error(f"Unable to find the following office channels: " + ", ".join([f"'{v}'" for v in missing]))
-            self.logger.error("Available voice channels: " + ", ".join([f"'{c.name}'" for c in voice_channels]))
-            sys.exit(1)
+            raise ConfigError(f"Unable to find the following office channels: " + ", ".join([f"'{v}'" for v in missing]) +
+                              "\nAvailable voice channels: " + ", ".join([f"'{c.name}'" for c in voice_channels]))
 
         self.logger.debug("Found all office room voice channels")
 
         return office_channels
 
-    async def get_alerts_channel(self, text_channels):
+    async def get_alerts_channel(self, text_channels, config):
         """
-        Search all guild text channels to find self.config.ALERT_CHANNEL
-        NOTE: This function terminates the program if it can't find all the voice channels
+        Search all guild text channels to find config.ALERT_CHANNEL
 
         Parameters:
-            voice_channels: list of all text channels in the guild
+            text_channels: list of all text channels in the guild
+            config: QueueConfig object to get the channel name from
 
         Returns: discord.py objects represending alert text channel
+        Raises: ConfigError if it can't find the text channel
         """
-        alert_channel = self.config.ALERTS_CHANNEL
+        alert_channel = config.ALERTS_CHANNEL
 
         for channel in text_channels:
             if channel.name == alert_channel:
                 self.logger.debug("Found alerts text channel")
                 return channel
 
-        self.logger.error(f"Unable to find voice channel '{alert_channel}'!")
-        self.logger.error("Available text channels: " + ", ".join([f"'{c.name}'" for c in text_channels]))
-        sys.exit(1)
+        raise ConfigError(f"Unable to find text channel '{alert_channel}'!" +
+                          "\nAvailable text channels: " + ", ".join([f"'{c.name}'" for c in text_channels]))
 
-    async def check_listen_channels(self, text_channels):
+    async def check_listen_channels(self, text_channels, config):
         """
-        Search all guild text channels to ensure all channels in self.config.LISTEN_CHANNELS exist
-        NOTE: This function terminates the program if it can't find all the voice channels
+        Search all guild text channels to ensure all channels in config.LISTEN_CHANNELS exist
 
         Parameters:
-            voice_channels: list of all text channels in the guild
+            text_channels: list of all text channels in the guild
+            config: QueueConfig object to get the channel names from
 
-        Returns: None
+        Returns: list of discord.py listen text channels (in config order)
+        Raises: ConfigError if it can't find all the text channels
         """
-        avail_channels = set()
+        avail_channels = {}
         for channel in text_channels:
-            avail_channels.add(channel.name)
+            avail_channels.setdefault(channel.name, channel)
 
-        for channel in self.config.LISTEN_CHANNELS:
+        for channel in config.LISTEN_CHANNELS:
             if channel not in avail_channels:
-                self.logger.error(f"Unable to find listen channel '{channel}'!")
-                sys.exit(1)
+                raise ConfigError(f"Unable to find listen channel '{channel}'!")
 
         self.logger.debug("Found all listen text channels")
+        return [avail_channels[channel] for channel in config.LISTEN_CHANNELS]
 
     async def on_message(self, message):
-        if not self.is_initialized:
+        """
+        Discord.py calls this for every message the bot can see. Most of them are chatter,
+        so the cheapest checks come first and nothing is logged until the message is a command
+
+        Parameters:
+            message: discord.py message object
+
+        Returns: None
+        """
+        # Ignore channels that are not in config.LISTEN_CHANNELS (including Direct Messages)
+        if message.channel.id not in self.listen_channel_ids:
+            return
+
+        # All commands start with !q
+        if message.content[:2].lower() != "!q":
             return
 
-        # Ignore Direct Messages
-        if not isinstance(message.channel, discord.TextChannel):
+        if not self.is_initialized or self.is_shutting_down:
             return
 
         # Ignore bot messages
         if message.author == self.user:
             return
 
-        # Ignore channels that are not config.CHANNEL
-        if message.channel.name not in self.config.LISTEN_CHANNELS:
+        if self.config.LOG_FORMAT == "text":
+            self.logger.info('[#{0.channel}] {0.author} ({0.author.id}): {0.content}'.format(message))
+        self.cache_member(message.guild, message.author)
+        await self.run_command(message)
+
+    def cache_member(self, guild, member):
+        """
+        Add a member seen in an event to discord.py's member cache.
+        Only needed with LAZY_MEMBERS since the cache is otherwise filled at startup
+        (MEMORY_LEAN only keeps members who are in voice channels)
+
+        Parameters:
+            guild: discord.py guild the member belongs to
+            member: discord.py member
+
+        Returns: None
+        """
+        if not self.config.LAZY_MEMBERS or self.config.MEMORY_LEAN or not self.intents.members:
             return
+        if isinstance(member, discord.Member) and guild.get_member(member.id) is None:
+            guild._add_member(member)
 
-        self.logger.info('[#{0.channel}] {0.author} ({0.author.id}): {0.content}'.format(message))
+    async def run_command(self, message):
+        """
+        Run a "!q" command then fill the queue from the waitlist (and AUTO_DISPATCH) if the queue changed
+        With LOG_FORMAT=json, a "command" event is logged once the command finishes
 
-        # All commands start with !q
-        if message.content.lower().startswith("!q"):
-            try:
-                update = await self.queue_command(message)
+        Parameters:
+            message: A discord.py message object (or InteractionMessage) where the message starts with '!q'
 
-                # Update Bot's user status to show # of people in the queue
-                # (queue_command will return True if queue was modified)
-                if update:
-                    await self.update_presence()
-            except Exception as e:
-                self.logger.error(e)
-                await self.send(message.channel, "An error has occurred.", CmdPrefix.ERROR)
-                raise e
+        Returns: None
+        """
+        self._running_commands += 1
+        start = time.perf_counter()
+        try:
+            words = message.content.split()
+            command = words[1].lower() if len(words) > 1 else ""
+            # Snapshots are O(1) with the in-memory queue (SQLiteStore reads the whole table)
+            before = self._queue.snapshot() if command in UNDOABLE_COMMANDS else None
+            update = await self.queue_command(message)
+            if update and before is not None:
+                self.remember_undo(f"!q {command}", message.author, before)
+
+            # queue_command will return True if queue was modified
+            if update:
+                await self.refill_queue()
+            if self.config.LOG_FORMAT == "json":
+                self.log_event("command", command=command,
+                               user=message.author.id, channel=message.channel.name if message.channel else None,
+                               slash=isinstance(message, InteractionMessage), updated=bool(update),
+                               queue_length=len(self._queue), latency_ms=round((time.perf_counter() - start) * 1000, 2))
+        except Exception as e:
+            self.logger.error(e)
+            await self.send(message.channel, "An error has occurred.", CmdPrefix.ERROR)
+            raise e
+        finally:
+            self._running_commands -= 1
+
+    async def api_request(self, method, route, **kwargs):
+        """
+        Make a request to Discord's REST API for features discord.py does not
+        support (slash commands). self.api_url is prepended to route
 
-    async def update_presence(self):
+        Parameters:
+            method: HTTP method
+            route: API route starting with '/'
+            kwargs: passed to aiohttp's request method (ex: json=...)
+
+        Returns: HTTP status code of the response
         """
-        Update the bot's profile activity to show how many people
-        are in the queue
+        if self._api_session is None:
+            self._api_session = aiohttp.ClientSession()
+
+        async with self._api_session.request(method, self.api_url + route, **kwargs) as resp:
+            if resp.status >= 400:
+                self.logger.error(f"{method} {route} failed ({resp.status}): {await resp.text()}")
+            return resp.status
+
+    async def register_slash_commands(self, guild):
+        """
+        Register the "/q" slash command with the given guild
+        Guild commands are available immediately (global commands can take up to an hour)
+
+        Parameters:
+            guild: discord.py guild object
 
         Returns: None
         """
+        app_info = await self.application_info()
+        await self.api_request("PUT", f"/applications/{app_info.id}/guilds/{guild.id}/commands",
+                               json=[SLASH_COMMAND],
+                               headers={"Authorization": f"Bot {self.config.SECRET_TOKEN}"})
+        self.logger.debug("Registered slash commands")
+
+    async def on_socket_response(self, msg):
+        """
+        Discord.py calls this for every gateway event. discord.py does not support
+        interactions so INTERACTION_CREATE events are picked out here
+
+        Parameters:
+            msg: raw gateway payload
 
-        # TODO If discord ever allows it, update presences to remove "Playing" from "Playing ### people in queue"
-        person = "people" if len(self._queue) != 1 else "person"
-        await self.change_presence(activity=discord.Game(name=f"{len(self._queue)} {person} in queue"))
-        self.logger.info('Queue state: ' + ", ".join(str(el) for el in self._queue))
+        Returns: None
+        """
+        if msg.get("t") == "INTERACTION_CREATE":
+            await self.on_interaction(msg["d"])
 
-    async def send(self, channel, content=None, message_type=None, *, embed=None, allowed_mentions=None):
+    def _interaction_member(self, guild, user, member):
         """
-        Simple wrapper of discord.py's send method.
-        This is primarily used when in testing mode as it prints out the message
+        Get the member associated with raw interaction data
+        Uses discord.py's member cache when possible
+
+        Parameters:
+            guild: discord.py guild the interaction came from (or None)
+            user: raw user dictionary
+            member: raw guild member dictionary (or None)
+
+        Returns: discord.py member or InteractionMember object
         """
-        prefix_emote = ""
-        if message_type is None:
-            pass
-        elif message_type is CmdPrefix.WARNING:
-            prefix_emote = "⚠️"
-        elif message_type is CmdPrefix.SUCCESS:
-            prefix_emote = "✅"
-        elif message_type is CmdPrefix.ERROR:
-            prefix_emote = "‼️"
-
-        if prefix_emote:
-            content = prefix_emote + " " + content
-
-        if not self.testing:
-            self.logger.info(f"[{channel.name}]  [#{self.user}] [embed? {embed is not None}] {content.rstrip() if content else ''}")
-            return await channel.send(content=content, embed=embed, allowed_mentions=allowed_mentions)
-        else:
-            print("SEND:", content, end="")
-            if embed:
-                print(f" embed.title='{embed.title}', embed.description={embed.description}, fields={embed.fields}")
+        if guild is None:
+            return InteractionMember(user, member, [])
+
+        cached = guild.get_member(int(user["id"]))
+        if cached is not None:
+            return cached
+
+        roles = []
+        if member is not None:
+            roles = [guild.get_role(int(r)) for r in member.get("roles", [])]
+            roles = [r for r in roles if r is not None]
+        return InteractionMember(user, member, roles)
+
+    async def on_interaction(self, interaction):
+        """
+        Run a "/q <subcommand>" slash command through the same handlers as "!q <subcommand>"
+        Replies to read-only subcommands (EPHEMERAL_COMMANDS) are only shown to the user who ran it
+
+        Parameters:
+            interaction: raw INTERACTION_CREATE payload
+
+        Returns: None
+        """
+        if not self.is_initialized or self.is_shutting_down or interaction.get("type") != INTERACTION_APPLICATION_COMMAND:
+            return
+
+        data = interaction["data"]
+        if data["name"] != SLASH_COMMAND["name"] or "member" not in interaction:
+            return
+
+        subcommand = data["options"][0]
+        channel = self.get_channel(int(interaction["channel_id"]))
+        reply = InteractionChannel(self, interaction, channel, subcommand["name"] in EPHEMERAL_COMMANDS)
+
+        # Same check as on_message: channels are matched by id, not by name
+        if channel is None or channel.id not in self.listen_channel_ids:
+            reply.ephemeral = True
+            await self.send(reply, "Queue commands can not be run in this channel", CmdPrefix.WARNING)
+            return
+
+        guild = self.get_guild(int(interaction["guild_id"]))
+        resolved = data.get("resolved", {})
+        author = self._interaction_member(guild, interaction["member"]["user"], interaction["member"])
+
+        # Rebuild the equivalent "!q" command
+        content = ["!q", subcommand["name"]]
+        mentions = []
+        for option in subcommand.get("options", []):
+            if option["type"] == INTERACTION_OPTION_USER:
+                user_id = option["value"]
+                mentions.append(self._interaction_member(guild, resolved["users"][user_id],
+                                                         resolved.get("members", {}).get(user_id)))
+                content.append(f"<@{user_id}>")
             else:
-                print()  # End current line
+                content.append(str(option["value"]))
+
+        message = InteractionMessage(" ".join(content), author, reply, mentions)
+        if self.config.LOG_FORMAT == "text":
+            self.logger.info('[#{0.channel.name}] {0.author} ({0.author.id}): {0.content} (slash command)'.format(message))
+        await self.run_command(message)
+
+    async def close(self):
+        if self._api_session is not None:
+            await self._api_session.close()
+        await super().close()
+        if self._lock_file is not None:
+            # Closing the file releases the lock for the standby
+            self._lock_file.close()
+            self._lock_file = None
+        if self._store_watcher is not None:
+            self._store_watcher.cancel()
+            self._store_watcher = None
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+        if self.dashboard is not None:
+            await self.dashboard.stop()
+            self.dashboard = None
+        self.events.close()
+        if self._notify_task is not None:
+            self._notify_task.cancel()
+        self._queue.close()
+
+    def add_confirmation(self, message, on_confirm, cancel_text, timeout=60.0):
+        """
+        Register a message as waiting for a TA to confirm it. The confirmation
+        is resolved by on_raw_reaction_add and expires after timeout seconds
+
+        Parameters:
+            message: discord.py message object the TA reacts to
+            on_confirm: coroutine function called with (message, member) once confirmed
+            cancel_text: the message is edited to this text when canceled or expired
+            timeout: seconds before the confirmation expires
+
+        Returns: PendingConfirmation object
+        """
+        timer = self.loop.call_later(timeout, self._expire_confirmation, message.id)
+        pending = PendingConfirmation(message, on_confirm, cancel_text, timer)
+        self._confirmations[message.id] = pending
+        return pending
+
+    def _expire_confirmation(self, message_id):
+        """
+        Called by the confirmation's timer once nobody has confirmed it in time
+
+        Parameters:
+            message_id: id of the confirmation message
+
+        Returns: None
+        """
+        pending = self._confirmations.pop(message_id, None)
+        if pending is not None:
+            self.loop.create_task(pending.message.edit(content=pending.cancel_text))
+
+    async def request_confirmation(self, channel, prompt, on_confirm, cancel_text, timeout=60.0):
+        """
+        Send a confirmation message and add the confirm/cancel reactions to it.
+        Returns immediately; on_confirm runs once a TA reacts with CONFIRM_EMOJI
+
+        Parameters:
+            channel: discord.py channel object to send message to
+            prompt: question to ask the TAs
+            on_confirm: coroutine function called with (message, member) once confirmed
+            cancel_text: the message is edited to this text when canceled or expired
+            timeout: seconds before the confirmation expires
+
+        Returns: discord.py message object of the confirmation message
+        """
+        message = await self.send(channel, f"{prompt}\nReact with {CONFIRM_EMOJI} to confirm or {CANCEL_EMOJI} to cancel")
+        self.add_confirmation(message, on_confirm, cancel_text, timeout)
+        await message.add_reaction(CONFIRM_EMOJI)
+        await message.add_reaction(CANCEL_EMOJI)
+        return message
+
+    async def on_raw_reaction_add(self, payload):
+        """
+        Discord.py calls this whenever a reaction is added to any message
+        Resolves pending confirmations. Reactions from the bot, from non-TAs and
+        reactions other than CONFIRM_EMOJI/CANCEL_EMOJI are ignored
+
+        Parameters:
+            payload: discord.RawReactionActionEvent
+
+        Returns: None
+        """
+        pending = self._confirmations.get(payload.message_id)
+        if pending is None or self.is_shutting_down:
+            return
+
+        if self.user is not None and payload.user_id == self.user.id:
+            return
+
+        if payload.member is None or not await self.is_ta(payload.member.roles):
+            return
+
+        emoji = str(payload.emoji)
+        if emoji != CONFIRM_EMOJI and emoji != CANCEL_EMOJI:
+            return
+
+        del self._confirmations[payload.message_id]
+        pending.timer.cancel()
+
+        if emoji == CONFIRM_EMOJI:
+            await pending.on_confirm(pending.message, payload.member)
+        else:
+            await pending.message.edit(content=pending.cancel_text)
+
+    async def on_voice_state_update(self, member, before, after):
+        """
+        Discord.py calls this when a member joins/leaves/moves between voice channels
+        Updates the office rooms for AUTO_DISPATCH.
+        Starts the member's grace timer when they leave the waiting room while in the queue
+        and stops it if they come back
+
+        Parameters:
+            member: discord.py member whose voice state changed
+            before: discord.py voice state before the change
+            after: discord.py voice state after the change
+
+        Returns: None
+        """
+        if before.channel == after.channel:
+            return
+
+        tracker = self.office_tracker
+        if tracker is not None:
+            if before.channel is not None and before.channel.id in tracker.rooms:
+                tracker.leave(before.channel.id, member.id)
+            if after.channel is not None and after.channel.id in tracker.rooms:
+                tracker.join(after.channel.id, member.id, await self.is_ta(member.roles))
+            if len(tracker.available) > 0:
+                await self.dispatch_students()
+
+        if self.voice_sweeper is None:
+            return
+
+        if after.channel == self.waiting_room:
+            self.voice_sweeper.cancel(member.id)
+        elif before.channel == self.waiting_room and (member in self._queue or member in self._waitlist):
+            self.logger.debug(f"{member} left the waiting room. Removing them in {self.config.VOICE_WAITING_GRACE}s")
+            self.voice_sweeper.schedule(member.id, self.config.VOICE_WAITING_GRACE)
+
+    async def prune_absent(self, user_ids):
+        """
+        Called by self.voice_sweeper with every user whose grace period ran out during the same tick.
+        Removes the ones who are still queued or on the waitlist (and still not in the waiting room)
+        with a single queue update and sends one summary message
+
+        Parameters:
+            user_ids: list of user ids whose grace period ran out
+
+        Returns: list of removed DiscordUser objects
+        """
+        expired = set(user_ids)
+        removed = [q_user for q_user in self._queue if q_user.uuid in expired and not self.in_waiting_room(q_user)]
+        waitlisted = [q_user for q_user in self._waitlist if q_user.uuid in expired and not self.in_waiting_room(q_user)]
+        if len(removed) + len(waitlisted) == 0:
+            return []
+
+        self._queue.remove_ids(set(q_user.uuid for q_user in removed))
+        if len(waitlisted) > 0:
+            waitlisted_ids = set(q_user.uuid for q_user in waitlisted)
+            self._waitlist = deque(q_user for q_user in self._waitlist if q_user.uuid not in waitlisted_ids)
+            removed.extend(waitlisted)
+        self.publish_change(QueueEventType.REMOVE, removed)
+        self.logger.info("Removed users who left the waiting room: " + ", ".join(str(q_user) for q_user in removed))
+
+        if len(self.listen_channels) > 0:
+            await self.send(self.listen_channels[0], " ".join(q_user.get_mention() for q_user in removed) +
+                            f" removed from the queue for leaving the '{self.config.VOICE_WAITING}' voice channel",
+                            CmdPrefix.WARNING)
+        await self.promote_waitlist()
+        return removed
+
+    def _sweeper_error(self, user_ids, exception):
+        self.logger.error(f"Unable to remove users who left the waiting room ({user_ids}): {exception!r}")
+
+    def publish_change(self, kind, users):
+        """
+        Publish a change that was just made to the queue (or the waitlist) to self.events
+
+        Parameters:
+            kind: QueueEventType
+            users: list of DiscordUser objects the change was about
+
+        Returns: QueueEvent object
+        """
+        event = QueueEvent(kind, users, len(self._queue), len(self._waitlist))
+        self.events.publish(event)
+        return event
+
+    def _event_error(self, subscription, event, exception):
+        self.logger.error(f"Queue event subscriber {getattr(subscription.handler, '__name__', subscription.handler)} " +
+                          f"failed on {event}: {exception!r}")
+
+    def record_change(self, event):
+        """
+        Event bus subscriber (called right away) which keeps the queue history and
+        the cached queue list up to date and logs the new queue length
+        The whole queue is only logged every QUEUE_SNAPSHOT_INTERVAL seconds
+
+        Parameters:
+            event: QueueEvent
+
+        Returns: None
+        """
+        self.history.record(event.queue_length)
+        self._open_board = None
+        self._queue_changes += 1
+        if self.config.LOG_FORMAT == "json":
+            self.log_event("presence", change=event.kind.value, queue_length=event.queue_length,
+                           waitlist_length=event.waitlist_length)
+        else:
+            self.logger.info(f"Queue length: {event.queue_length}")
+
+    async def alert_on_first_join(self, event):
+        """
+        Event bus subscriber for JOIN events. Alerts available TAs when someone joins an empty queue
+
+        Parameters:
+            event: QueueEvent
+
+        Returns: None
+        """
+        if event.queue_length == len(event.users):
+            await self.alert_avail_tas()
+
+    async def update_presence(self, event=None):
+        """
+        Update the bot's profile activity to show how many people
+        are in the queue. Subscribed to the event bus with a buffer of one event,
+        so changes made while a presence update is being sent are covered by one more update
+        discord.py rate limits presence updates, so while one is waiting to be sent
+        later calls only mark it as stale (it is sent again with the latest count)
+        instead of each waiting their turn
+
+        Parameters:
+            event: QueueEvent which triggered the update (None when called directly)
+
+        Returns: None
+        """
+        if self._presence_pending:
+            self._presence_stale = True
+            return
+
+        self._presence_pending = True
+        try:
+            self._presence_stale = True
+            while self._presence_stale:
+                self._presence_stale = False
+                # TODO If discord ever allows it, update presences to remove "Playing" from "Playing ### people in queue"
+                person = "people" if len(self._queue) != 1 else "person"
+                await self.change_presence(activity=discord.Game(name=f"{len(self._queue)} {person} in queue"))
+        finally:
+            self._presence_pending = False
+
+    async def send(self, channel, content=None, message_type=None, *, embed=None, allowed_mentions=None, file=None):
+        """
+        Simple wrapper of discord.py's send method.
+        The message goes through self.transport (Discord, or stdout when testing)
+
+        Returns: the sent discord.py message (a LocalMessage if the transport does not send to Discord)
+        """
+        self._sends_in_flight += 1
+        try:
+            return await self.transport.send(SendRecord(channel, content, message_type, embed, allowed_mentions, file))
+        finally:
+            self._sends_in_flight -= 1
+            if file is not None:
+                # discord.File stubs out fp.close() until File.close(), so the caller can close fp after sending
+                file.close()
 
     async def queue_command(self, message):
         """
@@ -487,7 +3381,8 @@ NOTE: Student commands are commands that require no permissions to run (TAs can
 
         user = DiscordUser(author.id, author.name, author.discriminator, author.nick)
 
-        if len(full_command) < 2 or len(full_command) > 3:
+        if len(full_command) < 2 or (len(full_command) > 3 and full_command[1].lower() not in BATCH_COMMANDS and
+                                     not (full_command[1].lower() in ("join", "addme") and full_command[2].lower() == "notify")):
             await self.send(channel, f"{user.get_mention()} invalid syntax. Type `!q join` to join the queue or `!q help` for all commands", CmdPrefix.WARNING)
             return False
 
@@ -502,7 +3397,14 @@ NOTE: Student commands are commands that require no permissions to run (TAs can
         elif command == "help":
             return await self.q_help(user, channel, message.author)
         elif command == "join" or command == "addme":
-            return await self.q_join(user, channel)
+            notify = None
+            if len(full_command) > 2 and full_command[2] == "notify":
+                notify = int(full_command[3]) if len(full_command) == 4 and full_command[3].isdigit() else 0
+                if not 1 <= notify <= MAX_NOTIFY_POSITION:
+                    await self.send(channel, f"{user.get_mention()} invalid syntax. Use `!q join notify 3` to get a Direct Message " +
+                                    f"once you are at position #3 (up to #{MAX_NOTIFY_POSITION})", CmdPrefix.WARNING)
+                    return False
+            return await self.q_join(user, channel, notify)
         elif command == "leave" or command == "removeme":
             return await self.q_leave(user, channel)
         elif command == "position" or command == "pos":
@@ -528,20 +3430,52 @@ NOTE: Student commands are commands that require no permissions to run (TAs can
                 return await self.q_peek(user, channel)
             elif command == "clear" or command == "empty":
                 return await self.q_clear(user, channel)
+            elif command == "undo":
+                return await self.q_undo(user, channel)
+
+        if command == "history":
+            return await self.q_history(user, full_command[2:], channel)
+        elif command == "export":
+            return await self.q_export(user, full_command[2:], channel)
+        elif command == "import":
+            return await self.q_import(user, getattr(message, "attachments", []), channel)
+
+        # "!q next 3 @ta1 @ta2 @ta3" pops 3 people and assigns them to the mentioned TAs
+        if command == "next" or command == "pop":
+            return await self.q_pop_many(user, full_command[2:], self.get_mentions(message), channel)
 
         # Don't check for length (user could accidentally write out name - including spaces - instead of mentioning)
         # As a result, the command will account for it and print out the necessary warning message
         if command == "add":
-            return await self.q_add_other(user, message.mentions, channel)
+            return await self.q_add_other(user, self.get_mentions(message), channel)
         elif command == "remove":
-            return await self.q_remove_other(user, message.mentions, channel)
+            return await self.q_remove_other(user, self.get_mentions(message), channel)
         elif command == "front":
-            return await self.q_move_front_other(user, message.mentions, channel)
+            return await self.q_move_front_other(user, self.get_mentions(message), channel)
 
         # Didn't find matching command
         await self.send(channel, f"{user.get_mention()} invalid format. Type `!q join` to join the queue or `!q help` for all commands", CmdPrefix.WARNING)
         return False
 
+    def get_mentions(self, message):
+        """
+        Get the users mentioned in a message in the order they were mentioned
+        (message.mentions does not keep the order). Duplicate mentions are removed
+
+        Parameters:
+            message: A discord.py message object
+
+        Returns: list of mentioned discord.py users
+        """
+        by_id = {m.id: m for m in message.mentions}
+        mentions = []
+        for user_id in MENTION_PATTERN.findall(message.content):
+            member = by_id.pop(int(user_id), None)
+            if member is not None:
+                mentions.append(member)
+
+        return mentions
+
     async def q_ping(self, channel):
         """
         If a user sends !q ping, reply with "Pong!"
@@ -561,6 +3495,8 @@ NOTE: Student commands are commands that require no permissions to run (TAs can
         to a given user with a list of available commands
         If they have a TA role, it will list student commands
         as well as TA commands
+        Users who already got the list in the last HELP_COOLDOWN seconds
+        are told to check their Direct Messages instead
         Can be run by anyone
 
         Parameters:
@@ -570,27 +3506,73 @@ NOTE: Student commands are commands that require no permissions to run (TAs can
 
         Returns: False (doesn't update queue)
         """
-        user_uuid = self.get_user(user.uuid)
-        command = f"{self.msg_help['STUDENT']}"
+        now = self.loop.time()
+        while self._help_sent and next(iter(self._help_sent.values())) <= now - HELP_COOLDOWN:
+            self._help_sent.popitem(last=False)
+
+        if user.uuid in self._help_sent:
+            self.logger.info("    > Help already sent")
+            await self.send(channel, f"{user.get_mention()} the list of commands was already sent to your Direct Messages", CmdPrefix.WARNING)
+            return False
+
         if await self.is_ta(author.roles):
-            command += "\n\n" + self.msg_help["TA"]
+            payload = self.help_payloads["TA"]
             self.logger.info("    > Sent TA help command")
         else:
+            payload = self.help_payloads["STUDENT"]
             self.logger.info("    > Sent student help command")
 
-        await user_uuid.send(command)
+        try:
+            dm_channel = await self.get_dm_channel(author)
+            await dm_channel.send(payload)
+        except discord.HTTPException as e:
+            # Usually the user has Direct Messages from server members turned off
+            self._dm_channels.pop(user.uuid, None)
+            self.logger.warning(f"    > Unable to send help to {user}: {e}")
+            await self.send(channel, f"{user.get_mention()} I could not send you a Direct Message. " +
+                            "Please allow Direct Messages from server members and try again", CmdPrefix.ERROR)
+            return False
+
+        self._help_sent[user.uuid] = now
         await self.send(channel, f"{user.get_mention()} a list of the commands has been sent to your Direct Messages", CmdPrefix.SUCCESS)
         return False
 
+    async def get_dm_channel(self, author):
+        """
+        Get the DM channel of a user, opening it if it is not in the pool.
+        At most DM_POOL_SIZE channels are kept (least recently used are dropped first)
+
+        Parameters:
+            author: discord.py user to get the DM channel of
+
+        Returns: discord.py DM channel
+        Raises: discord.HTTPException if the channel can't be opened
+        """
+        dm_channel = self._dm_channels.get(author.id)
+        if dm_channel is not None:
+            self._dm_channels.move_to_end(author.id)
+            return dm_channel
+
+        # Slash command members are not discord.py objects
+        if not hasattr(author, "create_dm"):
+            author = self.get_user(author.id) or await self.fetch_user(author.id)
+        dm_channel = await author.create_dm()
+
+        self._dm_channels[author.id] = dm_channel
+        if len(self._dm_channels) > DM_POOL_SIZE:
+            self._dm_channels.popitem(last=False)
+        return dm_channel
+
     async def alert_avail_tas(self):
         """
         Notify available TAs when someone joins the queue
         (where an available TA is a TA who is in an office hours
         room without a student in it)
+        With AUTO_DISPATCH, available TAs are sent a student instead
 
         Returns: Number of TAs mentioned
         """
-        if not self.config.ALERT_ON_FIRST_JOIN:
+        if not self.config.ALERT_ON_FIRST_JOIN or self.office_tracker is not None:
             return
 
         self.logger.debug("Getting active TAs for ALERT_ON_FIRST_JOIN")
@@ -616,39 +3598,168 @@ NOTE: Student commands are commands that require no permissions to run (TAs can
         await self.send(self.alerts_channel, message)
         return len(actives)
 
-    async def q_join(self, user, channel):
+    async def q_join(self, user, channel, notify=None):
+        """
+        If a user sends "!q join", attempt to add them to the queue
+        The user must be within the config["WAITING_ROOM"] voice channel before joining
+        Once the queue holds config.CAPACITY people, the user is added to the waitlist instead
+        With "!q join notify k", the user gets a Direct Message once they reach position k
+        (users already in the queue can run it to set k)
+        Can be run by anyone
+
+        Parameters:
+            user: DiscordUser object representing the user who ran the command
+            channel: discord.py channel object to send message to
+            notify: position to send the user a Direct Message at (None for no message)
+
+        Returns: True if the user is added to the queue (or waitlist)
+        """
+        # Closed by the office hours schedule. Skip every other check
+        if self._closed_reply is not None:
+            await self.send(channel, f"{user.get_mention()} {self._closed_reply}", CmdPrefix.WARNING)
+            return False
+
+        # Replies are piling up (usually Discord's rate limits). Turn joins away with at most
+        # one reply every SHED_REPLY_INTERVAL seconds instead of adding to the backlog
+        if 0 < self.config.SEND_BACKLOG <= self._sends_in_flight:
+            self.logger.warning(f"Turned away {user}: {self._sends_in_flight} messages waiting to be sent")
+            now = self.loop.time()
+            if now >= self._shed_reply_at:
+                self._shed_reply_at = now + SHED_REPLY_INTERVAL
+                await self.send(channel, "The bot is busy. Please wait a few seconds then run `!q join` again", CmdPrefix.WARNING)
+            return False
+
+        index = self._queue.find(user)
+        if index is not None:
+            await self.send(channel, f"{user.get_mention()} you are already in the queue at position #{index+1}" +
+                            self.watch_position(user, index + 1, notify), CmdPrefix.WARNING)
+            return False
+
+        if user in self._waitlist:
+            index = self._waitlist.index(user)
+            await self.send(channel, f"{user.get_mention()} you are already on the waitlist at position #{index+1}" +
+                            self.watch_position(user, None, notify), CmdPrefix.WARNING)
+            return False
+
+        if self.config.CHECK_VOICE_WAITING and not self.in_waiting_room(user):
+            await self.send(channel, f"{user.get_mention()} Please join the '{self.config.VOICE_WAITING}' \
+voice channel then __run `!q join` again__\n", CmdPrefix.WARNING)
+            return False
+
+        user.join_time = time.time()
+        # Full (or others are already waiting for room). Nobody skips the waitlist
+        if self.config.CAPACITY > 0 and (len(self._queue) >= self.config.CAPACITY or len(self._waitlist) > 0):
+            self._waitlist.append(user)
+            self.publish_change(QueueEventType.WAITLIST, [user])
+            await self.send(channel, f"""{user.get_mention()} the queue is full ({self.config.CAPACITY} people). \
+You have been added to the waitlist at position #{len(self._waitlist)}
+*You will be moved into the queue as it goes down*""" + self.watch_position(user, None, notify), CmdPrefix.SUCCESS)
+            # Lets run_command promote the waitlist if there is room after all
+            return True
+
+        # Checks and adds at once: another process sharing DATABASE_FILE may have added them since
+        added, index = self._queue.add(user)
+        if not added:
+            await self.send(channel, f"{user.get_mention()} you are already in the queue at position #{index+1}" +
+                            self.watch_position(user, index + 1, notify), CmdPrefix.WARNING)
+            return False
+
+        self.publish_change(QueueEventType.JOIN, [user])
+        self.logger.debug("Queue length after adding user = " + str(len(self._queue)))
+        await self.send(channel, f"""{user.get_mention()} you have been added at position #{index+1}
+*Please stay in the voice channel while you wait*""" + self.watch_position(user, index + 1, notify), CmdPrefix.SUCCESS)
+        return True
+
+    def watch_position(self, user, position, notify):
+        """
+        Used by "!q join notify k". Remember to send the user a Direct Message once they reach position k
+
+        Parameters:
+            user: DiscordUser object to watch
+            position: user's position in the queue (None if on the waitlist)
+            notify: position to send the Direct Message at (None does nothing)
+
+        Returns: text to add to the reply to "!q join"
+        """
+        if notify is None:
+            return ""
+        if position is not None and position <= notify:
+            self._notify_at.pop(user.uuid, None)
+            return f"\n*You are already within the first {notify}*"
+        self._notify_at[user.uuid] = notify
+        return f"\n*You will get a Direct Message once you are at position #{notify}*"
+
+    def check_notify(self, event):
+        """
+        Event bus subscriber for changes which can move people forward. Only the first
+        MAX_NOTIFY_POSITION people can have reached the position they asked to be told about,
+        so only they are checked. Their Direct Messages are sent together by self._notify_task
+
+        Parameters:
+            event: QueueEvent
+
+        Returns: None
+        """
+        if len(self._notify_at) == 0:
+            return
+        if event.kind in (QueueEventType.POP, QueueEventType.REMOVE, QueueEventType.LEAVE, QueueEventType.CLEAR):
+            for q_user in event.users:
+                self._notify_at.pop(q_user.uuid, None)
+        if len(self._notify_at) == 0 or event.queue_length == 0:
+            return
+
+        for position, q_user in enumerate(self._queue.head(MAX_NOTIFY_POSITION), start=1):
+            notify = self._notify_at.get(q_user.uuid)
+            if notify is not None and position <= notify:
+                del self._notify_at[q_user.uuid]
+                self._notify_due.append((q_user, position))
+
+        if len(self._notify_due) > 0 and self._notify_task is None:
+            self._notify_task = self.loop.create_task(self.send_notifications())
+
+    async def send_notifications(self):
         """
-        If a user sends "!q join", attempt to add them to the queue
-        The user must be within the config["WAITING_ROOM"] voice channel before joining
-        Can be run by anyone
+        Send the Direct Messages of everyone in self._notify_due at once. Everyone whose Direct
+        Messages are turned off is mentioned in one message in the first listen channel instead
+
+        Returns: None
+        """
+        try:
+            # Let the rest of the current command's changes join this batch
+            await asyncio.sleep(0)
+            while len(self._notify_due) > 0:
+                due, self._notify_due = self._notify_due, []
+                sent = await asyncio.gather(*(self.notify_position(q_user, position) for q_user, position in due))
+                self.logger.info(f"Sent {sum(sent)} position notifications")
+                failed = [q_user for (q_user, _), ok in zip(due, sent) if not ok]
+                if len(failed) > 0 and len(self.listen_channels) > 0:
+                    await self.send(self.listen_channels[0], " ".join(q_user.get_mention() for q_user in failed) +
+                                    " you are almost at the front of the queue", CmdPrefix.WARNING)
+        finally:
+            self._notify_task = None
+
+    async def notify_position(self, q_user, position):
+        """
+        Send a user the Direct Message they asked for with "!q join notify k"
 
         Parameters:
-            user: DiscordUser object representing the user who ran the command
-            channel: discord.py channel object to send message to
+            q_user: DiscordUser object to message
+            position: user's position in the queue
 
-        Returns: True if the user is added to the queue
+        Returns: True if the message was sent
         """
-        if user in self._queue:
-            index = self._queue.index(user)
-            await self.send(channel, f"{user.get_mention()} you are already in the queue at position #{index+1}", CmdPrefix.WARNING)
-            return False
-
-        if self.config.CHECK_VOICE_WAITING and user not in self.waiting_room.members:
-            await self.send(channel, f"{user.get_mention()} Please join the '{self.config.VOICE_WAITING}' \
-voice channel then __run `!q join` again__\n", CmdPrefix.WARNING)
+        try:
+            dm_channel = await self.get_dm_channel(discord.Object(id=q_user.uuid))
+            await dm_channel.send(f"You are now at position #{position} in the queue. Please get ready")
+        except discord.HTTPException as e:
+            self._dm_channels.pop(q_user.uuid, None)
+            self.logger.warning(f"Unable to send a position notification to {q_user}: {e}")
             return False
-
-        self._queue.append(user)
-        self.logger.debug("Queue length after adding user = " + str(len(self._queue)))
-        if len(self._queue) == 1:
-            await self.alert_avail_tas()
-        await self.send(channel, f"""{user.get_mention()} you have been added at position #{len(self._queue)}
-*Please stay in the voice channel while you wait*""", CmdPrefix.SUCCESS)
         return True
 
     async def q_leave(self, user, channel):
         """
-        If a user sends "!q leave", attempt to remove them to the queue
+        If a user sends "!q leave", attempt to remove them to the queue (or the waitlist)
         Can be run by anyone
 
         Parameters:
@@ -657,10 +3768,15 @@ voice channel then __run `!q join` again__\n", CmdPrefix.WARNING)
 
         Returns: True if the user is removed from the queue
         """
-        if user in self._queue:
-            self._queue.remove(user)
+        if self._queue.discard(user):
+            self.publish_change(QueueEventType.LEAVE, [user])
             await self.send(channel, f"{user.get_mention()} you have been removed from the queue", CmdPrefix.SUCCESS)
             return True
+        elif user in self._waitlist:
+            self._waitlist.remove(user)
+            self.publish_change(QueueEventType.LEAVE, [user])
+            await self.send(channel, f"{user.get_mention()} you have been removed from the waitlist", CmdPrefix.SUCCESS)
+            return False
         else:
             await self.send(channel, f"{user.get_mention()} you can not be removed from the queue because you never joined it", CmdPrefix.WARNING)
             return False
@@ -676,14 +3792,151 @@ voice channel then __run `!q join` again__\n", CmdPrefix.WARNING)
 
         Returns: False (doesn't update queue)
         """
-        if user in self._queue:
-            index = self._queue.index(user)
+        index = self._queue.find(user)
+        if index is not None:
             await self.send(channel, f"{user.get_mention()} you are at position #{index+1}")
+        elif user in self._waitlist:
+            index = self._waitlist.index(user)
+            await self.send(channel, f"{user.get_mention()} the queue is full. You are #{index+1} on the waitlist " +
+                            "and will be moved into the queue as it goes down")
         else:
             await self.send(channel, f"{user.get_mention()} you are not in the queue")
 
         return False
 
+    async def refill_queue(self):
+        """
+        Run after a command changes the queue. Fills the queue from the waitlist then
+        hands students to free TAs (AUTO_DISPATCH)
+
+        Returns: None
+        """
+        await self.promote_waitlist()
+        # Someone may have joined while a TA was free
+        await self.dispatch_students()
+
+    def drop_from_waitlist(self, users):
+        """
+        Take users off the waitlist (ex: a TA put them in the queue directly)
+        Doesn't publish an event. The caller's event covers the change
+
+        Parameters:
+            users: iterable of DiscordUser objects
+
+        Returns: list of the DiscordUser objects that were on the waitlist (in waitlist order)
+        """
+        ids = set(q_user.uuid for q_user in users)
+        if len(self._waitlist) == 0 or len(ids) == 0:
+            return []
+        dropped = [q_user for q_user in self._waitlist if q_user.uuid in ids]
+        if len(dropped) > 0:
+            self._waitlist = deque(q_user for q_user in self._waitlist if q_user.uuid not in ids)
+        return dropped
+
+    async def promote_waitlist(self):
+        """
+        Move students from the waitlist into the queue while it is under config.CAPACITY
+        (everyone if CAPACITY was turned off). Everyone promoted together is told in one message
+
+        Returns: list of promoted DiscordUser objects
+        """
+        if len(self._waitlist) == 0:
+            return []
+
+        room = len(self._waitlist) if self.config.CAPACITY <= 0 else self.config.CAPACITY - len(self._queue)
+        promoted = []
+        while len(promoted) < room and len(self._waitlist) > 0:
+            q_user = self._waitlist.popleft()
+            # Never queue someone twice (drop_from_waitlist should have taken them off already)
+            if self._queue.find(q_user) is None:
+                promoted.append(q_user)
+        if len(promoted) == 0:
+            return promoted
+
+        self._queue.extend(promoted)
+        self.publish_change(QueueEventType.PROMOTE, promoted)
+        first = len(self._queue) - len(promoted) + 1
+        self.logger.info("Moved from the waitlist into the queue: " + ", ".join(str(q_user) for q_user in promoted))
+        if len(self.listen_channels) > 0:
+            positions = f"position #{first}" if len(promoted) == 1 else f"positions #{first}-#{len(self._queue)}"
+            await self.send(self.listen_channels[0], " ".join(q_user.get_mention() for q_user in promoted) +
+                            f" you have been moved from the waitlist into the queue ({positions})", CmdPrefix.SUCCESS)
+        return promoted
+
+    def schedule_move(self, student, ta_id, channel, room=None):
+        """
+        With AUTO_MOVE, move a popped student from the waiting room to their TA's voice channel.
+        The move runs in the background so the command's reply is not held up by it
+
+        Parameters:
+            student: DiscordUser object of the popped student
+            ta_id: id of the TA whose voice channel the student is moved to (unused if room is given)
+            channel: discord.py channel to report problems in
+            room: discord.py voice channel to move the student to (defaults to the TA's channel)
+
+        Returns: None
+        """
+        if not self.config.AUTO_MOVE or self.waiting_room is None:
+            return
+
+        task = self.loop.create_task(self.move_student(student, ta_id, channel, room))
+        self._move_tasks.add(task)
+        task.add_done_callback(self._move_tasks.discard)
+
+    async def move_student(self, student, ta_id, channel, room=None):
+        """
+        Move a student who is in the waiting room to room (or the TA's current voice channel).
+        Students who are not in the waiting room and TAs who are not in voice are left alone
+
+        Parameters:
+            student: DiscordUser object of the student to move
+            ta_id: id of the TA whose voice channel the student is moved to (unused if room is given)
+            channel: discord.py channel to report problems in
+            room: discord.py voice channel to move the student to (defaults to the TA's channel)
+
+        Returns: True if the student was moved
+        """
+        guild = self.waiting_room.guild
+        member = guild.get_member(student.uuid)
+        if member is None or member.voice is None or member.voice.channel != self.waiting_room:
+            self.logger.debug(f"Not moving {student}: not in the waiting room")
+            return False
+
+        if room is None:
+            ta = guild.get_member(ta_id)
+            if ta is None or ta.voice is None or ta.voice.channel is None or ta.voice.channel == self.waiting_room:
+                self.logger.debug(f"Not moving {student}: the TA is not in an office room")
+                return False
+            room = ta.voice.channel
+
+        try:
+            await member.move_to(room, reason="Popped from the queue")
+        except discord.Forbidden:
+            self.logger.error(f"Unable to move {student} to {room.name}: missing the Move Members permission")
+            await self.send(channel, f"Unable to move {student.get_mention()} to '{room.name}'. " +
+                            "The bot needs the Move Members permission", CmdPrefix.WARNING)
+            return False
+        except discord.HTTPException as e:
+            # Usually the student left voice before the move
+            self.logger.warning(f"Unable to move {student} to {room.name}: {e}")
+            return False
+
+        self.logger.info(f"Moved {student} to {room.name}")
+        return True
+
+    def in_waiting_room(self, user):
+        """
+        Checks to see if a user is in the waiting room voice channel
+        NOTE: "user in self.waiting_room.members" does not work since discord.py's
+        Member.__eq__ only matches other discord.py users
+
+        Parameters:
+            user: DiscordUser object to look for
+
+        Returns: True if the user is in the waiting room (False otherwise)
+        """
+        return any(user == member for member in self.waiting_room.members)
+
     async def is_ta(self, roles):
         """
         Checks to see if a given user's role list is a TA
@@ -717,14 +3970,72 @@ voice channel then __run `!q join` again__\n", CmdPrefix.WARNING)
             return False
         else:
             q_next = self._queue.popleft()
+            self.publish_change(QueueEventType.POP, [q_next])
             in_voice = ""
             if self.config.CHECK_VOICE_WAITING:
-                in_voice = " (in voice)" if q_next in self.waiting_room.members else " (**not** in voice)"
+                in_voice = " (in voice)" if self.in_waiting_room(q_next) else " (**not** in voice)"
+            self.schedule_move(q_next, user.uuid, channel)
 
             await self.send(channel, f"""The next person is {q_next.get_mention()}{in_voice}
 Remaining people in the queue: {len(self._queue)}""")
             return True
 
+    async def q_pop_many(self, user, args, tas, channel):
+        """
+        If a user sends "!q next N @ta1 @ta2 ...", removes the next N people from the queue
+        The i-th person popped is assigned to the i-th mentioned TA.
+        If N is not given, one person is popped for each mentioned TA
+        Must be run by a user with a TA role
+
+        Parameters:
+            user: DiscordUser object representing the user who ran the command
+            args: command arguments after "next"
+            tas: list of mentioned discord.py users (in mention order)
+            channel: discord.py channel object to send message to
+
+        Returns: True if a user is removed
+        """
+        counts = [arg for arg in args if not MENTION_PATTERN.fullmatch(arg)]
+        count = len(tas) if len(tas) > 0 else 1
+        if len(counts) > 1 or (len(counts) == 1 and not counts[0].isdigit()):
+            await self.send(channel, f"{user.get_mention()} invalid syntax. Use `!q next N` or `!q next @ta1 @ta2`", CmdPrefix.ERROR)
+            return False
+        elif len(counts) == 1:
+            count = int(counts[0])
+
+        if count < 1 or count > MAX_BATCH_SIZE:
+            await self.send(channel, f"{user.get_mention()} you can pop between 1 and {MAX_BATCH_SIZE} people at a time", CmdPrefix.ERROR)
+            return False
+        if len(tas) > 0 and len(tas) != count:
+            await self.send(channel, f"{user.get_mention()} mention one TA for each person to pop ({count} people, {len(tas)} TAs)", CmdPrefix.ERROR)
+            return False
+
+        if len(self._queue) == 0:
+            await self.send(channel, "Queue is empty")
+            return False
+
+        popped = self._queue.popleft_many(count)
+        self.publish_change(QueueEventType.POP, popped)
+
+        lines = []
+        for i, q_next in enumerate(popped):
+            in_voice = ""
+            if self.config.CHECK_VOICE_WAITING:
+                in_voice = " (in voice)" if self.in_waiting_room(q_next) else " (**not** in voice)"
+            assigned = f" -> {tas[i].mention}" if len(tas) > 0 else ""
+            self.schedule_move(q_next, tas[i].id if len(tas) > 0 else user.uuid, channel)
+            lines.append(f"**{i+1}.** {q_next.get_mention()}{in_voice}{assigned}")
+
+        if len(popped) == 1:
+            header = "The next person is:"
+        else:
+            header = f"The next {len(popped)} people are:"
+        if len(popped) < count:
+            header += f" (only {len(popped)} of {count} requested were in the queue)"
+
+        await self.send(channel, header + "\n" + "\n".join(lines) + f"\nRemaining people in the queue: {len(self._queue)}")
+        return True
+
     async def q_peek(self, user, channel):
         """
         Check to see who is next in line without removing them
@@ -746,91 +4057,131 @@ Remaining people in the queue: {len(self._queue)}""")
 
     async def q_add_other(self, user, mentions, channel):
         """
-        Run when a TA calls "!q add @user". It will add the specified user
-        to the queue if they are not already in there. A user can only give one
-        user at a time (discord's API does not maintain mention order)
+        Run when a TA calls "!q add @user1 @user2 ...". It will add the specified users
+        to the end of the queue (in mention order) if they are not already in there
         Must be run by a user with a TA role
 
         Parameters:
             user: DiscordUser object representing the user who ran the command
-            mentions: list of mentions from the message object
+            mentions: list of mentioned discord.py users (in mention order)
             channel: discord.py channel object to send message to
 
         Returns: True if queue is updated; False otherwise
         """
-        # Make sure mentions contains only one user
-        if len(mentions) != 1:
-            await self.send(channel, f"{user.get_mention()} invalid syntax. You must mention the user to add", CmdPrefix.ERROR)
+        if len(mentions) == 0 or len(mentions) > MAX_BATCH_SIZE:
+            await self.send(channel, f"{user.get_mention()} invalid syntax. You must mention the user(s) to add", CmdPrefix.ERROR)
             return False
-        else:
-            author = mentions[0]
-            q_user = DiscordUser(author.id, author.name, author.discriminator, author.nick)
 
-            if q_user in self._queue:
-                index = self._queue.index(q_user)
-                await self.send(channel, f"{user.get_mention()} That person is already in the queue at position #{index}", CmdPrefix.WARNING)
-                return False
+        queued = {q_user.uuid: i for i, q_user in enumerate(self._queue)}
+        added = []
+        already = []
+        for author in mentions:
+            q_user = DiscordUser(author.id, author.name, author.discriminator, author.nick)
+            if q_user.uuid in queued:
+                already.append((q_user, queued[q_user.uuid]))
+            else:
+                q_user.join_time = time.time()
+                added.append(q_user)
+        self._queue.extend(added)
+        if len(added) > 0:
+            self.drop_from_waitlist(added)
+            self.publish_change(QueueEventType.ADD, added)
+
+        if len(mentions) == 1:
+            if len(already) == 1:
+                await self.send(channel, f"{user.get_mention()} That person is already in the queue at position #{already[0][1]+1}", CmdPrefix.WARNING)
             else:
-                self._queue.append(q_user)
                 await self.send(channel, f"{user.get_mention()} the person has been added at position #{len(self._queue)}", CmdPrefix.SUCCESS)
-                return True
+            return len(added) > 0
+
+        lines = []
+        if len(added) > 0:
+            first = len(self._queue) - len(added) + 1
+            lines.append(f"{user.get_mention()} added {len(added)} people at positions #{first}-#{len(self._queue)}: " +
+                         ", ".join(q_user.get_name() for q_user in added))
+        if len(already) > 0:
+            lines.append("Already in the queue: " +
+                         ", ".join(f"{q_user.get_name()} (#{index+1})" for q_user, index in already))
+
+        await self.send(channel, "\n".join(lines), CmdPrefix.SUCCESS if len(added) > 0 else CmdPrefix.WARNING)
+        return len(added) > 0
 
     async def q_remove_other(self, user, mentions, channel):
         """
-        Run when a TA calls "!q remove @user". It will remove the specified user
-        to the queue if they are in the queue. This command can only add one
-        user at a time (discord.py does not maintain mention order)
+        Run when a TA calls "!q remove @user1 @user2 ...". It will remove the specified users
+        from the queue (or the waitlist) if they are in it
         Doesn't check if user is a TA
 
         Parameters:
             user: DiscordUser object representing the user who ran the command
-            mentions: list of mentions from the message object
+            mentions: list of mentioned discord.py users (in mention order)
             channel: discord.py channel object to send message to
 
         Returns: True if queue is updated; False otherwise
         """
-        if len(mentions) != 1:
-            await self.send(channel, f"{user.get_mention()} invalid syntax. You must mention the user to remove", CmdPrefix.ERROR)
+        if len(mentions) == 0 or len(mentions) > MAX_BATCH_SIZE:
+            await self.send(channel, f"{user.get_mention()} invalid syntax. You must mention the user(s) to remove", CmdPrefix.ERROR)
             return False
-        else:
-            author = mentions[0]
-            q_user = DiscordUser(author.id, author.name, author.discriminator, author.nick)
 
-            if q_user in self._queue:
-                self._queue.remove(q_user)
-                await self.send(channel, f"{q_user.get_name()} has been removed from the queue", CmdPrefix.SUCCESS)
-                return True
+        targets = [DiscordUser(author.id, author.name, author.discriminator, author.nick) for author in mentions]
+        queued = set(q_user.uuid for q_user in self._queue)
+        removed = [q_user for q_user in targets if q_user.uuid in queued]
+        if len(removed) > 0:
+            self._queue.remove_ids(set(q_user.uuid for q_user in removed))
+        unlisted = self.drop_from_waitlist(q_user for q_user in targets if q_user.uuid not in queued)
+        unlisted_ids = set(q_user.uuid for q_user in unlisted)
+        missing = [q_user for q_user in targets if q_user.uuid not in queued and q_user.uuid not in unlisted_ids]
+        if len(removed) + len(unlisted) > 0:
+            self.publish_change(QueueEventType.REMOVE, removed + unlisted)
+
+        if len(targets) == 1:
+            if len(removed) == 1:
+                await self.send(channel, f"{removed[0].get_name()} has been removed from the queue", CmdPrefix.SUCCESS)
+            elif len(unlisted) == 1:
+                await self.send(channel, f"{unlisted[0].get_name()} has been removed from the waitlist", CmdPrefix.SUCCESS)
             else:
-                await self.send(channel, f"{q_user.get_name()} is not in the queue", CmdPrefix.WARNING)
-                return False
+                await self.send(channel, f"{missing[0].get_name()} is not in the queue", CmdPrefix.WARNING)
+            return len(removed) > 0
+
+        lines = []
+        if len(removed) > 0:
+            lines.append("Removed from the queue: " + ", ".join(q_user.get_name() for q_user in removed))
+        if len(unlisted) > 0:
+            lines.append("Removed from the waitlist: " + ", ".join(q_user.get_name() for q_user in unlisted))
+        if len(missing) > 0:
+            lines.append("Not in the queue: " + ", ".join(q_user.get_name() for q_user in missing))
+
+        await self.send(channel, "\n".join(lines), CmdPrefix.SUCCESS if len(missing) < len(targets) else CmdPrefix.WARNING)
+        return len(removed) > 0
 
     async def q_move_front_other(self, user, mentions, channel):
         """
-        Run when a TA calls "!q front @user". It will add the specified user
-        to the front of the queue. This command can only add one
-        user at a time (discord.py does not maintain mention order)
+        Run when a TA calls "!q front @user1 @user2 ...". It will add/move the specified users
+        to the front of the queue. The first user mentioned ends up at the front
         Doesn't check if user is a TA
 
         Parameters:
             user: DiscordUser object representing the user who ran the command
-            mentions: list of mentions from the message object
+            mentions: list of mentioned discord.py users (in mention order)
             channel: discord.py channel object to send message to
 
         Returns: True if queue is updated; False otherwise
         """
-        if len(mentions) != 1:
-            await self.send(channel, f"{user.get_mention()} invalid syntax. You must mention the user to remove", CmdPrefix.ERROR)
+        if len(mentions) == 0 or len(mentions) > MAX_BATCH_SIZE:
+            await self.send(channel, f"{user.get_mention()} invalid syntax. You must mention the user(s) to move", CmdPrefix.ERROR)
             return False
-        else:
-            author = mentions[0]
-            q_user = DiscordUser(author.id, author.name, author.discriminator, author.nick)
 
-            if q_user in self._queue:
-                self._queue.remove(q_user)
-            self._queue.appendleft(q_user)
+        targets = [DiscordUser(author.id, author.name, author.discriminator, author.nick) for author in mentions]
+        self._queue.move_to_front(targets)
+        self.drop_from_waitlist(targets)
+        self.publish_change(QueueEventType.FRONT, targets)
 
-            await self.send(channel, f"{q_user.get_name()} has been moved to the front of the queue", CmdPrefix.SUCCESS)
-            return True
+        if len(targets) == 1:
+            await self.send(channel, f"{targets[0].get_name()} has been moved to the front of the queue", CmdPrefix.SUCCESS)
+        else:
+            await self.send(channel, ", ".join(q_user.get_name() for q_user in targets) +
+                            " have been moved to the front of the queue", CmdPrefix.SUCCESS)
+        return True
 
     async def q_list(self, user, channel):
         """
@@ -844,31 +4195,43 @@ Remaining people in the queue: {len(self._queue)}""")
 
         Returns: False (doesn't update queue)
         """
+        await self.send(channel, embed=self.render_board())
+        return False
+
+    def render_board(self):
+        """
+        Build the "!q list" embed with the next 10 people in the queue
+
+        Returns: discord.py embed
+        """
         # List the next 10 people within the queue in a nice formatted box (embed)
         # TODO If no one is in the queue, simplify card
+        # Read one version of the queue so the list and the total always agree
+        queue = self._queue.snapshot()
         user_list = []
-        if len(self._queue) == 0:
+        if len(queue) == 0:
             user_list.append("No one in queue")
         else:
-            for i in range(0, min(10, len(self._queue))):
-                user = self._queue[i]
+            for i, user in enumerate(itertools.islice(queue, 10)):
                 in_voice = ""
                 if self.config.CHECK_VOICE_WAITING:
-                    in_voice = ' ** * **' if user not in self.waiting_room.members else ''  # Bold *
+                    in_voice = ' ** * **' if not self.in_waiting_room(user) else ''  # Bold *
                 user_list.append(f"**{i+1}.** {user.get_mention()}{in_voice}")
 
-            if len(self._queue) == 11:
+            if len(queue) == 11:
                 user_list.append("\n1 other not shown")
-            elif len(self._queue) > 11:
-                user_list.append(f"\n{len(self._queue)-10} others not shown")
+            elif len(queue) > 11:
+                user_list.append(f"\n{len(queue)-10} others not shown")
 
             if self.config.CHECK_VOICE_WAITING:
                 user_list.append("\n** * ** = user not in voice channel")
 
-        embed = discord.Embed(title="Queue List", description=f"Total in queue: {len(self._queue)}")
+        description = f"Total in queue: {len(queue)}"
+        if len(self._waitlist) > 0:
+            description += f" ({len(self._waitlist)} on the waitlist)"
+        embed = discord.Embed(title="Queue List", description=description)
         embed.add_field(name="Next 10 people:", value="\n".join(user_list), inline=False)
-        await self.send(channel, embed=embed)
-        return False
+        return embed
 
     async def q_count(self, user, channel):
         """
@@ -882,80 +4245,375 @@ Remaining people in the queue: {len(self._queue)}""")
 
         Returns: False (doesn't update queue)
         """
+        waitlist = f" and {len(self._waitlist)} on the waitlist" if len(self._waitlist) > 0 else ""
         if len(self._queue) == 1:
-            await self.send(channel, f"{user.get_mention()} there is 1 person in the queue")
+            await self.send(channel, f"{user.get_mention()} there is 1 person in the queue{waitlist}")
         else:
-            await self.send(channel, f"{user.get_mention()} there are {len(self._queue)} people in the queue")
+            await self.send(channel, f"{user.get_mention()} there are {len(self._queue)} people in the queue{waitlist}")
         return False
 
-    async def q_clear(self, user, channel):
+    async def q_history(self, user, args, channel):
         """
-        Asks a confirmation message asking if the user wants to clear the queue
+        If a TA sends "!q history [minutes|hours|days]", reply with a sparkline
+        of the peak queue length over the last hour (default), day or month
         Must be run by a user with a TA role
 
         Parameters:
             user: DiscordUser object representing the user who ran the command
+            args: command arguments after "history"
             channel: discord.py channel object to send message to
 
-        Returns: True if queue cleared; False otherwise
+        Returns: False (doesn't update queue)
         """
-        def check(reaction, user):
-            # Couldn't get self.is_ta() working since it was an asynchronous routine
-            has_ta_role = False
-            for r in user.roles:
-                if r.name in self.config.TA_ROLES:
-                    has_ta_role = True
-                    break
+        tier = args[0] if len(args) > 0 else "minutes"
+        if not tier.endswith("s"):
+            tier += "s"
+        if tier not in HISTORY_WINDOWS:
+            await self.send(channel, f"{user.get_mention()} invalid format. Use `!q history`, `!q history hours` or `!q history days`", CmdPrefix.WARNING)
+            return False
+
+        count = HISTORY_WINDOWS[tier]
+        series = self.history.series(tier, count)
+        known = [(start, peak) for start, peak in series if peak is not None]
+        if len(known) == 0:
+            await self.send(channel, f"{user.get_mention()} no queue history yet")
+            return False
+
+        time_format = "%a %b %d" if tier == "days" else "%a %H:%M"
+        peak_start, peak = max(known, key=lambda sample: sample[1])
+        first = time.strftime(time_format, time.localtime(series[0][0]))
+        await self.send(channel, f"{user.get_mention()} queue length over the last {count} {tier} " +
+                        f"(peak {peak} at {time.strftime(time_format, time.localtime(peak_start))}, now {len(self._queue)})\n" +
+                        f"```\n{sparkline([peak for _, peak in series])}\n{first} to now\n```")
+        return False
+
+    async def q_export(self, user, args, channel):
+        """
+        If a TA sends "!q export [csv|json]", reply with the queue as a CSV (default) or JSON file.
+        Rows are written straight to a temporary file as the queue is read
+        Must be run by a user with a TA role
+
+        Parameters:
+            user: DiscordUser object representing the user who ran the command
+            args: command arguments after "export"
+            channel: discord.py channel object to send message to
+
+        Returns: False (doesn't update queue)
+        """
+        file_format = args[0] if len(args) > 0 else "csv"
+        if file_format not in ("csv", "json"):
+            await self.send(channel, f"{user.get_mention()} invalid format. Use `!q export csv` or `!q export json`", CmdPrefix.WARNING)
+            return False
+
+        with tempfile.TemporaryFile() as fp:
+            count = export_queue(self._queue.snapshot(), fp, file_format)
+            fp.seek(0)
+            filename = f"queue-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.{file_format}"
+            self.logger.info(f"    > Exported {count} queued users")
+            await self.send(channel, f"{user.get_mention()} exported {count} {'person' if count == 1 else 'people'} in the queue",
+                            CmdPrefix.SUCCESS, file=discord.File(fp, filename))
+        return False
+
+    async def q_import(self, user, attachments, channel):
+        """
+        If a TA sends "!q import" with a file from "!q export" attached, add everyone
+        in the file (in position order) who is not already queued to the end of the queue at once.
+        The file is saved to a temporary file and read one row at a time
+        Must be run by a user with a TA role
+
+        Parameters:
+            user: DiscordUser object representing the user who ran the command
+            attachments: list of discord.py attachments of the command message
+            channel: discord.py channel object to send message to
+
+        Returns: True if anyone was added to the queue
+        """
+        if len(attachments) != 1:
+            await self.send(channel, f"{user.get_mention()} attach one CSV or JSON file from `!q export` to `!q import`", CmdPrefix.ERROR)
+            return False
+
+        attachment = attachments[0]
+        if attachment.size > MAX_IMPORT_BYTES:
+            await self.send(channel, f"{user.get_mention()} {attachment.filename} is too large to import", CmdPrefix.ERROR)
+            return False
 
-            if user == self.user or not has_ta_role:
+        file_format = "json" if attachment.filename.lower().endswith(".json") else "csv"
+        with tempfile.TemporaryFile() as fp:
+            await attachment.save(fp)
+            fp.seek(0)
+            try:
+                users, invalid = import_queue(fp, file_format)
+            except (ValueError, TypeError, csv.Error) as e:
+                await self.send(channel, f"{user.get_mention()} unable to read {attachment.filename}: {e}", CmdPrefix.ERROR)
                 return False
 
-            if str(reaction.emoji) == '✅':
-                return True
-            raise asyncio.TimeoutError()
+        queued = set(q_user.uuid for q_user in self._queue)
+        added = []
+        for q_user in users:
+            if q_user.uuid not in queued:
+                queued.add(q_user.uuid)
+                added.append(q_user)
+        self._queue.extend(added)
+        if len(added) > 0:
+            self.drop_from_waitlist(added)
+            self.publish_change(QueueEventType.ADD, added)
+        self.logger.info(f"    > Imported {len(added)} users from {attachment.filename}")
+
+        summary = f"{user.get_mention()} imported {len(added)} {'person' if len(added) == 1 else 'people'} from {attachment.filename}"
+        if len(added) > 0:
+            summary += f" (positions #{len(self._queue) - len(added) + 1}-#{len(self._queue)})"
+        if len(users) > len(added):
+            summary += f". {len(users) - len(added)} already in the queue"
+        if invalid > 0:
+            summary += f". Skipped {invalid} invalid {'row' if invalid == 1 else 'rows'}"
+        await self.send(channel, summary, CmdPrefix.SUCCESS if len(added) > 0 else CmdPrefix.WARNING)
+        return len(added) > 0
+
+    async def q_clear(self, user, channel):
+        """
+        Asks a confirmation message asking if the user wants to clear the queue
+        The queue is cleared later by on_raw_reaction_add once a TA confirms
+        Must be run by a user with a TA role
+
+        Parameters:
+            user: DiscordUser object representing the user who ran the command
+            channel: discord.py channel object to send message to
 
+        Returns: True if queue cleared immediately (testing mode); False otherwise
+        """
         if len(self._queue) == 0:
             await self.send(channel, "Queue is already empty")
             return False
 
         if self.testing:
-            print("In testing mode; not sending confirmation message")
+            # No confirmation in testing mode
+            cleared = list(self._queue)
             self._queue.clear()
+            self.publish_change(QueueEventType.CLEAR, cleared)
+            await self.send(channel, "Queue has been emptied")
             return True
 
-        message = await self.send(channel, """Are you sure you want to clear the queue?
-React with ✅ to confirm or ❌ to cancel""")
-
-        await message.add_reaction("✅")
-        await message.add_reaction("❌")
-        try:
-            reaction, user = await self.wait_for('reaction_add', timeout=60.0, check=check)
-        except asyncio.TimeoutError:
-            await message.edit(content="Clearing queue canceled")
-            return False
-        else:
-            self.logger.info(f"Emptying queue as per {user}'s request...")
+        async def clear(message, member):
+            self.logger.info(f"Emptying queue as per {member}'s request...")
             self.logger.debug("Queue prior to clearing: " +
                               ", ".join(str(el) for el in self._queue))
+            before = self._queue.snapshot()
             self._queue.clear()
+            self.publish_change(QueueEventType.CLEAR, list(before))
+            self.remember_undo("!q clear", member, before)
             await message.edit(content="Queue has been emptied")
-            return True
+            # Not run through run_command, so the waitlist has to be moved in here
+            await self.refill_queue()
+
+        await self.request_confirmation(channel, "Are you sure you want to clear the queue?",
+                                        clear, "Clearing queue canceled")
+        # The queue is only modified once a TA confirms
+        return False
+
+    def remember_undo(self, label, author, before):
+        """
+        Record a TA command which changed the queue so "!q undo" can take it back
+
+        Parameters:
+            label: the command (ex: "!q next")
+            author: discord.py member who ran the command
+            before: QueueVersion from right before the command
+
+        Returns: None
+        """
+        user = DiscordUser(author.id, author.name, author.discriminator, author.nick)
+        self._undo.append(UndoStep(label, user, before, self._queue.snapshot()))
+
+    async def q_undo(self, user, channel):
+        """
+        If a TA sends "!q undo", take back the last TA command which changed the queue.
+        Everyone the command took out is put back where they were and everyone it added is taken out.
+        Changes made since (people who joined or left) are kept
+        Must be run by a user with a TA role
+
+        Parameters:
+            user: DiscordUser object representing the user who ran the command
+            channel: discord.py channel object to send message to
+
+        Returns: True if the queue was changed
+        """
+        if len(self._undo) == 0:
+            await self.send(channel, f"{user.get_mention()} there is nothing to undo", CmdPrefix.WARNING)
+            return False
+
+        step = self._undo.pop()
+        after_ids = set(q_user.uuid for q_user in step.after)
+        current = self._queue.snapshot()
+        current_ids = set(q_user.uuid for q_user in current)
+        # Keep people the command did not touch unless they left since, then add people who joined since
+        restored = [q_user for q_user in step.before if q_user.uuid not in after_ids or q_user.uuid in current_ids]
+        restored_ids = set(q_user.uuid for q_user in restored)
+        restored.extend(q_user for q_user in current if q_user.uuid not in after_ids and q_user.uuid not in restored_ids)
+        restored_ids.update(q_user.uuid for q_user in restored)
+
+        back = [q_user for q_user in restored if q_user.uuid not in current_ids]
+        taken_out = [q_user for q_user in current if q_user.uuid not in restored_ids]
+        self._queue.replace(restored)
+        self._waitlist = deque(q_user for q_user in self._waitlist if q_user.uuid not in restored_ids)
+        self.publish_change(QueueEventType.UNDO, back)
+        self.logger.info(f"    > Undid {step.label} by {step.user}")
+
+        message = f"Undid `{step.label}` by {step.user.get_name()}"
+        if len(back) > 0:
+            message += ". Back in the queue: " + " ".join(q_user.get_mention() for q_user in back)
+        if len(taken_out) > 0:
+            message += ". Taken out of the queue: " + ", ".join(q_user.get_name() for q_user in taken_out)
+        await self.send(channel, message, CmdPrefix.SUCCESS)
+        return True
+
 
+def export_queue(users, fp, file_format):
+    """
+    Write queued users to a binary file one row at a time (see EXPORT_FIELDS)
+
+    Parameters:
+        users: iterable of DiscordUser objects in queue order
+        fp: binary file object to write to
+        file_format: "csv" or "json" (a JSON array of objects)
+
+    Returns: number of users written
+    """
+    text = io.TextIOWrapper(fp, encoding="utf-8", newline="")
+    writer = csv.writer(text) if file_format == "csv" else None
+    if writer is not None:
+        writer.writerow(EXPORT_FIELDS)
+    else:
+        text.write("[")
+
+    count = 0
+    for count, q_user in enumerate(users, start=1):
+        join_time = ""
+        if q_user.join_time is not None:
+            join_time = datetime.datetime.fromtimestamp(q_user.join_time, datetime.timezone.utc).isoformat()
+        row = [count, q_user.uuid, q_user.name, q_user.discriminator, q_user.nick or "", join_time]
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            text.write(("\n" if count == 1 else ",\n") + json.dumps(dict(zip(EXPORT_FIELDS, row))))
+
+    if writer is None:
+        text.write("\n]\n")
+    text.flush()
+    text.detach()  # Leave fp open
+    return count
+
+
+def iter_json_array(text, chunk_size=65536):
+    """
+    Parse a JSON array one element at a time, reading the file in chunks
+    so the whole document is never held in memory
+
+    Parameters:
+        text: text file object containing a JSON array
+        chunk_size: number of characters read at a time
+
+    Returns: generator of the array's elements
+    Raises: ValueError if the file is not a JSON array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    expect = "["  # "[", "value" (or "]" right after "["), "," (or "]")
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("expected a list of users" if expect == "[" else "unexpected end of file")
+            chunk = text.read(chunk_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = chunk == ""
+            continue
+
+        char = buffer[pos]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("expected a list of users")
+            pos += 1
+            expect = "first"
+        elif expect == "," or (expect == "first" and char == "]"):
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"expected ',' or ']' at character {pos}")
+            pos += 1
+            expect = "value"
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = len(buffer)
+            # A value running to the end of the buffer may continue in the next chunk
+            if end == len(buffer) and not eof:
+                chunk = text.read(chunk_size)
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                eof = chunk == ""
+                continue
+            yield value
+            pos = end
+            expect = ","
+
+
+def import_queue(fp, file_format):
+    """
+    Read users from a file written by export_queue
+    Rows are parsed one at a time, so a file is rejected as soon as it passes MAX_IMPORT_ROWS
+
+    Parameters:
+        fp: binary file object to read from
+        file_format: "csv" or "json"
+
+    Returns: (list of DiscordUser objects in position order without duplicates, number of invalid rows)
+    Raises: ValueError if the file can't be read or has more than MAX_IMPORT_ROWS rows
+    """
+    text = io.TextIOWrapper(fp, encoding="utf-8-sig", newline="")
+    rows = csv.DictReader(text) if file_format == "csv" else iter_json_array(text)
+
+    users = {}
+    invalid = 0
+    for i, row in enumerate(rows):
+        if i >= MAX_IMPORT_ROWS:
+            raise ValueError(f"more than {MAX_IMPORT_ROWS} rows")
+        try:
+            q_user = DiscordUser(int(row["uuid"]), str(row["name"]), str(row.get("discriminator") or "0000"),
+                                 row.get("nick") or None)
+            join_time = row.get("join_time")
+            q_user.join_time = datetime.datetime.fromisoformat(join_time).timestamp() if join_time else None
+            position = int(row.get("position") or i + 1)
+        except (KeyError, ValueError, TypeError, AttributeError):
+            invalid += 1
+            continue
+        # Keep the first row of each user
+        users.setdefault(q_user.uuid, (position, i, q_user))
+
+    text.detach()
+    return [q_user for _, _, q_user in sorted(users.values(), key=lambda entry: entry[:2])], invalid
 
 
 # TODO Move below functions to dedicated file
-def get_config_json():
+def get_config_json(path=CONFIG_FILE):
     """
     Opens and ensures config.json config file is valid
     If config.json does not exist, it creates it then exits the program
 
+    Parameters:
+        path: path to the config file
+
     Returns: Dictionary with config key/values
     """
-    CONFIG_FILE = "config.json"
-
     # Generate secrets.json if not exist
-    if not os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "w") as f:
+    if not os.path.exists(path):
+        with open(path, "w") as f:
             f.write("""{
     "SECRET_TOKEN": "YOUR_SECRET_TOKEN_HERE",
     "TA_ROLES": [],
@@ -964,7 +4622,24 @@ def get_config_json():
     "VOICE_WAITING": "",
     "ALERT_ON_FIRST_JOIN": "False",
     "ALERTS_CHANNEL": "",
-    "VOICE_OFFICES": []
+    "VOICE_OFFICES": [],
+    "SLASH_COMMANDS": "False",
+    "VOICE_WAITING_GRACE": "0",
+    "LAZY_MEMBERS": "False",
+    "MEMORY_LEAN": "False",
+    "STATE_FILE": "",
+    "LOCK_FILE": "",
+    "AUTO_DISPATCH": "False",
+    "AUTO_MOVE": "False",
+    "OFFICE_HOURS": [],
+    "CLOSING_MINUTES": "10",
+    "CAPACITY": "0",
+    "SEND_BACKLOG": "25",
+    "DATABASE_FILE": "",
+    "LOG_FORMAT": "text",
+    "LOG_SAMPLE_RATE": "1",
+    "DASHBOARD_PORT": "0",
+    "DASHBOARD_HOST": "127.0.0.1"
 }""")
 
         print("config.json not found. Please add your secret token and ensure \
@@ -972,7 +4647,7 @@ your bot is already in the desired server")
         sys.exit(1)
 
     # Read secrets.json file
-    with open(CONFIG_FILE) as f:
+    with open(path) as f:
         data = json.load(f)
 
     return data
@@ -995,20 +4670,180 @@ def get_config_env():
         "VOICE_WAITING": os.environ.get("QUEUE_VOICE_WAITING", "").strip(),
         "ALERT_ON_FIRST_JOIN": os.environ.get("QUEUE_ALERT_ON_FIRST_JOIN", "False"),
         "ALERTS_CHANNEL": os.environ.get("QUEUE_ALERTS_CHANNEL", "").strip(),
+        "SLASH_COMMANDS": os.environ.get("QUEUE_SLASH_COMMANDS", "False"),
+        "VOICE_WAITING_GRACE": os.environ.get("QUEUE_VOICE_WAITING_GRACE", "0"),
+        "LAZY_MEMBERS": os.environ.get("QUEUE_LAZY_MEMBERS", "False"),
+        "MEMORY_LEAN": os.environ.get("QUEUE_MEMORY_LEAN", "False"),
+        "STATE_FILE": os.environ.get("QUEUE_STATE_FILE", ""),
+        "LOCK_FILE": os.environ.get("QUEUE_LOCK_FILE", ""),
+        "AUTO_DISPATCH": os.environ.get("QUEUE_AUTO_DISPATCH", "False"),
+        "AUTO_MOVE": os.environ.get("QUEUE_AUTO_MOVE", "False"),
+        "OFFICE_HOURS": os.environ.get("QUEUE_OFFICE_HOURS", "").split(","),
+        "CLOSING_MINUTES": os.environ.get("QUEUE_CLOSING_MINUTES", "10"),
+        "CAPACITY": os.environ.get("QUEUE_CAPACITY", "0"),
+        "SEND_BACKLOG": os.environ.get("QUEUE_SEND_BACKLOG", "25"),
+        "DATABASE_FILE": os.environ.get("QUEUE_DATABASE_FILE", ""),
+        "LOG_FORMAT": os.environ.get("QUEUE_LOG_FORMAT", "text"),
+        "LOG_SAMPLE_RATE": os.environ.get("QUEUE_LOG_SAMPLE_RATE", "1"),
+        "DASHBOARD_PORT": os.environ.get("QUEUE_DASHBOARD_PORT", "0"),
+        "DASHBOARD_HOST": os.environ.get("QUEUE_DASHBOARD_HOST", "127.0.0.1"),
     }
 
 
+def read_config(from_env, path=CONFIG_FILE):
+    """
+    Read and validate the config from environment variables or config.json
+
+    Parameters:
+        from_env: True to read environment variables instead of config.json
+        path: path to the config file
+
+    Returns: QueueConfig object
+    Raises: ConfigError if a config option is invalid
+    """
+    if from_env:
+        return QueueConfig(get_config_env(), from_env=True)
+    else:
+        return QueueConfig(get_config_json(path))
+
+
 def get_config():
     """
     Get config information required to run QueueBot. First checks to see if environment
     flag variable is set. If not, check (and/or create) config.json file
+    NOTE: This function terminates the program if a config option is invalid
 
-    Returns: Dictionary with config key/values
+    Returns: QueueConfig object
     """
-    if "QUEUE_USE_ENV" in os.environ:
-        return QueueConfig(get_config_env())
-    else:
-        return QueueConfig(get_config_json())
+    try:
+        return read_config("QUEUE_USE_ENV" in os.environ)
+    except ConfigError as e:
+        print(e)
+        sys.exit(1)
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotates the log file once it reaches max_bytes. Rotated segments are named
+    <filename>.<timestamp> and gzipped to <filename>.<timestamp>.gz by a background
+    thread so logging never waits on compression. Old segments are deleted once the
+    compressed segments take more than archive_bytes or are older than archive_days
+
+    Parameters:
+        filename: path to the log file
+        max_bytes: size the log file is rotated at
+        archive_bytes: most space the compressed segments may take (0 for no limit)
+        archive_days: compressed segments older than this are deleted (0 for no limit)
+        encoding: log file encoding
+    """
+    def __init__(self, filename, max_bytes=LOG_SEGMENT_BYTES, archive_bytes=LOG_ARCHIVE_BYTES,
+                 archive_days=LOG_ARCHIVE_DAYS, encoding="utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, encoding=encoding)
+        self.archive_bytes = archive_bytes
+        self.archive_days = archive_days
+        self._segments = SimpleQueue()
+        self._compressor = threading.Thread(target=self._compress_segments, name="log-compressor", daemon=True)
+        self._compressor.start()
+        # Segments left uncompressed by a crash
+        for segment in log_segments(self.baseFilename):
+            if not segment.endswith(".gz"):
+                self._segments.put(segment)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        segment = f"{self.baseFilename}.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        if os.path.exists(self.baseFilename):
+            os.replace(self.baseFilename, segment)
+            self._segments.put(segment)
+        if not self.delay:
+            self.stream = self._open()
+
+    def _compress_segments(self):
+        # Runs on the background thread until close() sends None
+        while True:
+            segment = self._segments.get()
+            if segment is None:
+                return
+            try:
+                with open(segment, "rb") as src, gzip.open(segment + ".gz.tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(segment + ".gz.tmp", segment + ".gz")
+                os.remove(segment)
+                self._enforce_retention()
+            except OSError as e:
+                # Logging about the log file would only go back into it
+                print(f"Unable to compress log segment {segment}: {e}", file=sys.stderr)
+
+    def _enforce_retention(self):
+        archives = [path for path in log_segments(self.baseFilename) if path.endswith(".gz")]
+        cutoff = time.time() - self.archive_days * 24 * 3600
+        total = sum(os.path.getsize(path) for path in archives)
+        # Oldest first
+        for path in archives:
+            too_big = self.archive_bytes > 0 and total > self.archive_bytes
+            too_old = self.archive_days > 0 and os.path.getmtime(path) < cutoff
+            if not too_big and not too_old:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def close(self):
+        """
+        Stop logging and wait for the rotated segments to be compressed
+        """
+        super().close()
+        if self._compressor.is_alive():
+            self._segments.put(None)
+            self._compressor.join()
+
+
+def log_segments(path):
+    """
+    Get the rotated segments of a log file written by CompressingRotatingFileHandler
+
+    Parameters:
+        path: path to the log file
+
+    Returns: list of segment paths, oldest first (compressed segments end with .gz)
+    """
+    segments = {}
+    for segment in glob.glob(glob.escape(path) + ".*"):
+        timestamp = segment[len(path) + 1:]
+        if timestamp.endswith(".gz"):
+            timestamp = timestamp[:-3]
+        elif not re.fullmatch(r"\d{8}-\d{6}-\d{6}", timestamp):
+            continue  # .gz.tmp files and unrelated files
+        # Prefer the compressed copy if the segment was caught mid compression
+        if segment.endswith(".gz") or timestamp not in segments:
+            segments[timestamp] = segment
+    return [segments[timestamp] for timestamp in sorted(segments)]
+
+
+def read_logs(path):
+    """
+    Stream every line of a log file and its rotated segments (compressed or not), oldest first
+
+    Parameters:
+        path: path to the log file
+
+    Returns: generator of lines (with line endings)
+    """
+    for segment in log_segments(path):
+        if not os.path.exists(segment):
+            if segment.endswith(".gz") or not os.path.exists(segment + ".gz"):
+                continue  # Deleted by the retention limits since it was listed
+            segment += ".gz"  # Compressed since it was listed
+
+        opened = gzip.open(segment, "rt", encoding="utf-8") if segment.endswith(".gz") else \
+            open(segment, encoding="utf-8")
+        with opened as f:
+            yield from f
+
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            yield from f
 
 
 def setup_loggers():
@@ -1026,7 +4861,7 @@ def setup_loggers():
     queue_logger.setLevel(logging.DEBUG)
 
     # discord.py file logging
-    d_filehandler = logging.handlers.RotatingFileHandler(filename="logs/discord.log", encoding="utf-8", maxBytes=1000000, backupCount=5)
+    d_filehandler = CompressingRotatingFileHandler("logs/discord.log")
     d_filehandler.setLevel(logging.INFO)
     formatter = logging.Formatter('[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s')
     d_filehandler.setFormatter(formatter)
@@ -1040,7 +4875,7 @@ def setup_loggers():
     queue_logger.addHandler(console)
 
     # queuebot.py file logging
-    q_filehandler = logging.handlers.RotatingFileHandler(filename="logs/queuebot.log", encoding="utf-8", maxBytes=1000000, backupCount=5)
+    q_filehandler = CompressingRotatingFileHandler("logs/queuebot.log")
     formatter = logging.Formatter('[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s')
     q_filehandler.setFormatter(formatter)
     queue_logger.addHandler(q_filehandler)
@@ -0,0 +1,492 @@
+"""
+A local stand-in for Discord's gateway and REST API
+
+The real QueueBot (and discord.py) can connect to it, which exercises on_ready,
+on_message filtering, presence updates, rate limits and reconnects without
+touching the network. Used by test/test_end_to_end.py and the benchmarks.
+
+Usage:
+    fake = FakeDiscord()
+    fake.add_role("UGTA")
+    fake.add_text_channel("join-queue")
+    student = fake.add_user("Wumpus")
+    url = await fake.start()
+
+    discord.http.Route.BASE = url + "/api/v7"
+    bot = QueueBot(config, logger)
+    bot.api_url = url + "/api/v8"
+    asyncio.ensure_future(bot.start(config.SECRET_TOKEN))
+
+    await fake.send_message(student, "join-queue", "!q join")
+    await fake.wait_until(lambda: len(fake.sent) == 1)
+"""
+
+import json
+import time
+import asyncio
+import datetime
+import itertools
+
+import aiohttp
+from aiohttp import web
+
+# Gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+PRESENCE = 3
+RESUME = 6
+RECONNECT = 7
+REQUEST_MEMBERS = 8
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+CHANNEL_TEXT = 0
+CHANNEL_DM = 1
+CHANNEL_VOICE = 2
+
+# Like Discord, GUILD_CREATE only contains this many members. The rest must be chunked
+LARGE_THRESHOLD = 250
+CHUNK_SIZE = 1000
+
+
+def timestamp():
+    return datetime.datetime.utcnow().isoformat() + "+00:00"
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes responses whose content type is exactly "application/json"
+    headers = dict(headers or {}, **{"Content-Type": "application/json"})
+    return web.Response(body=json.dumps(data).encode("utf-8"), status=status, headers=headers)
+
+
+class SentMessage:
+    """
+    A message the bot sent through the REST API
+
+    Parameters:
+        channel_id: id of the channel the message was sent to
+        content: message text (or None)
+        embed: raw embed dictionary (or None)
+        sent_at: time.perf_counter() when the server received the message
+    """
+    def __init__(self, channel_id, content, embed, sent_at):
+        self.channel_id = channel_id
+        self.content = content
+        self.embed = embed
+        self.sent_at = sent_at
+
+    def __repr__(self):
+        return f"SentMessage({self.channel_id}, {self.content!r}, embed={self.embed is not None})"
+
+
+class FakeDiscord:
+    """
+    A single guild Discord server which serves both the gateway (websocket)
+    and REST API on one local port
+
+    Parameters:
+        guild_name: name of the guild the bot is in
+    """
+    def __init__(self, guild_name="CS 120"):
+        self._snowflakes = itertools.count(800000000000000000)
+        self.guild_id = self.snowflake()
+        self.guild_name = guild_name
+        self.bot_user = self._user("QueueBot", bot=True)
+
+        self.roles = {}           # role name -> raw role
+        self.channels = {}        # channel name -> raw channel
+        self.dm_channels = {}     # user id -> raw DM channel
+        self.members = {}         # user id -> raw member
+        self.voice_states = {}    # user id -> raw voice state
+
+        self.sent = []            # SentMessage objects in the order they were received
+        self.edits = []           # (message id, content) of every edited message
+        self.reactions = []       # (message id, emoji) of every reaction the bot added
+        self.presences = []       # raw presence updates sent by the bot
+        self.interaction_responses = []
+        self.member_requests = []  # raw REQUEST_GUILD_MEMBERS payloads
+        self.rate_limited = 0     # number of 429 responses served
+        self.chunk_delay = 0.0    # seconds to wait before sending each GUILD_MEMBERS_CHUNK
+        self.identifies = 0
+        self.resumes = 0
+
+        self._rate_limits = 0
+        self._rate_limit_every = 0
+        self._requests = 0
+        self._retry_after = 0.0
+        self._global_rate_limit = False
+        self._sequence = 0
+        self._session_id = None
+        self._ws = None
+        self._runner = None
+        self._changed = None
+        self.url = None
+
+        self.add_role("@everyone", role_id=self.guild_id)
+        self.members[self.bot_user["id"]] = self._member(self.bot_user, [])
+
+    def snowflake(self):
+        return str(next(self._snowflakes))
+
+    """ SERVER STATE """
+
+    def _user(self, name, bot=False):
+        return {"id": self.snowflake(), "username": name, "discriminator": "0001", "avatar": None, "bot": bot}
+
+    def _member(self, user, role_ids, nick=None):
+        return {"user": user, "roles": role_ids, "nick": nick, "joined_at": timestamp(), "deaf": False, "mute": False}
+
+    def add_role(self, name, role_id=None):
+        role = {"id": role_id or self.snowflake(), "name": name, "permissions": "0", "position": len(self.roles),
+                "color": 0, "hoist": False, "managed": False, "mentionable": False}
+        self.roles[name] = role
+        return role
+
+    def _add_channel(self, name, channel_type):
+        channel = {"id": self.snowflake(), "type": channel_type, "name": name, "position": len(self.channels),
+                   "guild_id": self.guild_id, "permission_overwrites": [], "parent_id": None, "nsfw": False}
+        if channel_type == CHANNEL_VOICE:
+            channel.update(bitrate=64000, user_limit=0)
+        else:
+            channel.update(topic=None, last_message_id=None, rate_limit_per_user=0)
+        self.channels[name] = channel
+        return channel
+
+    def add_text_channel(self, name):
+        return self._add_channel(name, CHANNEL_TEXT)
+
+    def add_voice_channel(self, name):
+        return self._add_channel(name, CHANNEL_VOICE)
+
+    def add_user(self, name, roles=(), nick=None):
+        """
+        Add a member to the guild. Must be called before the bot connects
+
+        Returns: the raw user dictionary
+        """
+        user = self._user(name)
+        self.members[user["id"]] = self._member(user, [self.roles[r]["id"] for r in roles], nick)
+        return user
+
+    def add_users(self, n, prefix="Student", roles=()):
+        return [self.add_user(f"{prefix}{i}", roles) for i in range(n)]
+
+    def _voice_state(self, user_id, channel_id):
+        return {"guild_id": self.guild_id, "channel_id": channel_id, "user_id": user_id,
+                "member": self.members[user_id], "session_id": "fake", "deaf": False, "mute": False,
+                "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False}
+
+    def _guild(self):
+        # Large guilds only get some of their members in GUILD_CREATE (like Discord),
+        # plus the bot and everyone connected to voice
+        members = list(itertools.islice(self.members.values(), LARGE_THRESHOLD))
+        included = {m["user"]["id"] for m in members}
+        for user_id in [self.bot_user["id"]] + list(self.voice_states):
+            if user_id not in included:
+                members.append(self.members[user_id])
+                included.add(user_id)
+
+        return {
+            "id": self.guild_id, "name": self.guild_name, "icon": None, "owner_id": self.bot_user["id"],
+            "region": "us-west", "afk_channel_id": None, "afk_timeout": 300, "verification_level": 0,
+            "default_message_notifications": 0, "explicit_content_filter": 0, "mfa_level": 0,
+            "features": [], "emojis": [], "presences": [], "unavailable": False,
+            "large": len(self.members) > LARGE_THRESHOLD, "member_count": len(self.members),
+            "roles": list(self.roles.values()), "channels": list(self.channels.values()),
+            "members": members, "voice_states": list(self.voice_states.values()),
+        }
+
+    def _message(self, channel_id, user, content, mentions=(), embeds=(), guild=True):
+        message = {
+            "id": self.snowflake(), "channel_id": channel_id, "author": user, "content": content or "",
+            "timestamp": timestamp(), "edited_timestamp": None, "tts": False, "mention_everyone": False,
+            "mentions": list(mentions), "mention_roles": [], "attachments": [], "embeds": list(embeds),
+            "pinned": False, "type": 0,
+        }
+        if guild:
+            message["guild_id"] = self.guild_id
+            member = dict(self.members[user["id"]])
+            del member["user"]
+            message["member"] = member
+        return message
+
+    """ SIMULATED EVENTS """
+
+    async def dispatch(self, event, data):
+        """
+        Send a gateway event to the connected bot
+        """
+        self._sequence += 1
+        await self._ws.send_str(json.dumps({"op": DISPATCH, "t": event, "s": self._sequence, "d": data}))
+
+    async def send_message(self, user, channel_name, content, mentions=()):
+        """
+        Simulate user sending a message to a guild text channel.
+        mentions must be in the same order as they appear in content
+
+        Returns: the raw message
+        """
+        raw_mentions = [dict(m, member=self._without_user(self.members[m["id"]])) for m in mentions]
+        message = self._message(self.channels[channel_name]["id"], user, content, raw_mentions)
+        await self.dispatch("MESSAGE_CREATE", message)
+        return message
+
+    @staticmethod
+    def _without_user(member):
+        member = dict(member)
+        del member["user"]
+        return member
+
+    async def member_join(self, name, roles=()):
+        """
+        Simulate a new member joining the guild after the bot connected
+
+        Returns: the raw user dictionary
+        """
+        user = self.add_user(name, roles)
+        await self.dispatch("GUILD_MEMBER_ADD", dict(self.members[user["id"]], guild_id=self.guild_id))
+        return user
+
+    async def move_voice(self, user, channel_name):
+        """
+        Simulate user joining a voice channel (or leaving voice if channel_name is None)
+        Works before (initial voice state) and after the bot connects
+        """
+        channel_id = self.channels[channel_name]["id"] if channel_name is not None else None
+        state = self._voice_state(user["id"], channel_id)
+        if channel_id is None:
+            self.voice_states.pop(user["id"], None)
+        else:
+            self.voice_states[user["id"]] = state
+
+        if self._ws is not None:
+            await self.dispatch("VOICE_STATE_UPDATE", state)
+
+    async def send_interaction(self, user, channel_name, subcommand, options=(), resolved=None):
+        """
+        Simulate user running "/q subcommand"
+        """
+        data = {"name": "q", "options": [{"type": 1, "name": subcommand, "options": list(options)}]}
+        if resolved is not None:
+            data["resolved"] = resolved
+        await self.dispatch("INTERACTION_CREATE", {
+            "id": self.snowflake(), "application_id": self.bot_user["id"], "type": 2, "token": "fake",
+            "guild_id": self.guild_id, "channel_id": self.channels[channel_name]["id"],
+            "member": self.members[user["id"]], "data": data,
+        })
+
+    def rate_limit(self, count=1, retry_after=0.05, is_global=False):
+        """
+        Respond to the next count REST requests with "429 Too Many Requests"
+        """
+        self._rate_limits += count
+        self._retry_after = retry_after
+        self._global_rate_limit = is_global
+
+    def rate_limit_every(self, every, retry_after=0.05):
+        """
+        Respond to every Nth REST request with "429 Too Many Requests" (0 disables it)
+        """
+        self._rate_limit_every = every
+        self._retry_after = retry_after
+
+    async def reconnect(self):
+        """
+        Ask the bot to reconnect (it should resume its session)
+        """
+        await self._ws.send_str(json.dumps({"op": RECONNECT, "d": None}))
+
+    async def disconnect(self, code=4000):
+        """
+        Drop the gateway connection like a network failure would
+        """
+        await self._ws.close(code=code)
+
+    async def wait_until(self, predicate, timeout=10.0):
+        """
+        Wait until predicate() is true. It is checked every time the bot
+        sends/edits a message, updates its presence or connects
+        """
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(predicate), timeout)
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    """ GATEWAY """
+
+    async def _send_op(self, ws, op, data):
+        await ws.send_str(json.dumps({"op": op, "d": data}))
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._ws = ws
+        await self._send_op(ws, HELLO, {"heartbeat_interval": 41250})
+
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+
+            payload = json.loads(msg.data)
+            op = payload["op"]
+            data = payload.get("d")
+            if op == HEARTBEAT:
+                await self._send_op(ws, HEARTBEAT_ACK, None)
+            elif op == IDENTIFY:
+                await self._identify()
+            elif op == RESUME:
+                self.resumes += 1
+                await self.dispatch("RESUMED", {"_trace": ["fake-discord"]})
+                await self._notify()
+            elif op == PRESENCE:
+                self.presences.append(data)
+                await self._notify()
+            elif op == REQUEST_MEMBERS:
+                await self._request_members(data)
+
+        if self._ws is ws:
+            self._ws = None
+        return ws
+
+    async def _identify(self):
+        self.identifies += 1
+        self._sequence = 0
+        self._session_id = self.snowflake()
+        await self.dispatch("READY", {
+            "v": 6, "user": self.bot_user, "session_id": self._session_id, "_trace": ["fake-discord"],
+            "guilds": [{"id": self.guild_id, "unavailable": True}], "private_channels": [], "relationships": [],
+        })
+        await self.dispatch("GUILD_CREATE", self._guild())
+        await self._notify()
+
+    async def _request_members(self, data):
+        self.member_requests.append(data)
+        if data.get("user_ids"):
+            members = [self.members[str(i)] for i in data["user_ids"] if str(i) in self.members]
+        else:
+            query = data.get("query", "").lower()
+            members = [m for m in self.members.values() if m["user"]["username"].lower().startswith(query)]
+            if data.get("limit"):
+                members = members[:data["limit"]]
+
+        chunks = [members[i:i + CHUNK_SIZE] for i in range(0, len(members), CHUNK_SIZE)] or [[]]
+        for index, chunk in enumerate(chunks):
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            await self.dispatch("GUILD_MEMBERS_CHUNK", {
+                "guild_id": self.guild_id, "members": chunk, "chunk_index": index,
+                "chunk_count": len(chunks), "nonce": data.get("nonce"),
+            })
+
+    """ REST API """
+
+    @web.middleware
+    async def _rate_limiter(self, request, handler):
+        if not request.path.startswith("/api/") or request.path.endswith("/users/@me"):
+            return await handler(request)
+
+        self._requests += 1
+        periodic = self._rate_limit_every and self._requests % self._rate_limit_every == 0
+        if self._rate_limits > 0 or periodic:
+            if not periodic:
+                self._rate_limits -= 1
+            self.rate_limited += 1
+            # discord.py only trusts 429s that went through Discord's proxy (the Via header)
+            return json_response({"message": "You are being rate limited.", "global": self._global_rate_limit,
+                                      "retry_after": self._retry_after * 1000},
+                                     status=429, headers={"Via": "1.1 fake-discord"})
+        return await handler(request)
+
+    async def get_me(self, request):
+        return json_response(self.bot_user)
+
+    async def get_gateway(self, request):
+        return json_response({"url": self.url.replace("http", "ws", 1) + "/gateway"})
+
+    async def get_application(self, request):
+        return json_response({"id": self.bot_user["id"], "name": "QueueBot", "icon": None, "description": "",
+                                  "rpc_origins": None, "bot_public": False, "bot_require_code_grant": False,
+                                  "owner": self.bot_user, "summary": "", "verify_key": ""})
+
+    async def put_commands(self, request):
+        return json_response(await request.json())
+
+    async def create_dm(self, request):
+        recipient = (await request.json())["recipient_id"]
+        if recipient not in self.dm_channels:
+            self.dm_channels[recipient] = {"id": self.snowflake(), "type": CHANNEL_DM, "last_message_id": None,
+                                           "recipients": [self.members[recipient]["user"]]}
+        return json_response(self.dm_channels[recipient])
+
+    async def post_message(self, request):
+        channel_id = request.match_info["channel_id"]
+        data = await request.json()
+        self.sent.append(SentMessage(channel_id, data.get("content"), data.get("embed"), time.perf_counter()))
+
+        is_guild = any(c["id"] == channel_id for c in self.channels.values())
+        embeds = [data["embed"]] if data.get("embed") else []
+        message = self._message(channel_id, self.bot_user, data.get("content"), embeds=embeds, guild=is_guild)
+        await self._notify()
+        return json_response(message)
+
+    async def edit_message(self, request):
+        data = await request.json()
+        self.edits.append((request.match_info["message_id"], data.get("content")))
+        message = self._message(request.match_info["channel_id"], self.bot_user, data.get("content"))
+        message["id"] = request.match_info["message_id"]
+        await self._notify()
+        return json_response(message)
+
+    async def add_reaction(self, request):
+        self.reactions.append((request.match_info["message_id"], request.match_info["emoji"]))
+        return web.Response(status=204)
+
+    async def interaction_callback(self, request):
+        self.interaction_responses.append(await request.json())
+        await self._notify()
+        return web.Response(status=204)
+
+    async def interaction_followup(self, request):
+        self.interaction_responses.append(await request.json())
+        await self._notify()
+        return json_response({})
+
+    """ STARTUP """
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Start the server (port=0 picks a free port)
+
+        Returns: base url of the server (ex: "http://127.0.0.1:12345")
+        """
+        self._changed = asyncio.Condition()
+
+        app = web.Application(middlewares=[self._rate_limiter])
+        api = "/api/{version}"
+        app.router.add_get("/gateway", self.gateway)
+        app.router.add_get(api + "/gateway", self.get_gateway)
+        app.router.add_get(api + "/users/@me", self.get_me)
+        app.router.add_post(api + "/users/@me/channels", self.create_dm)
+        app.router.add_get(api + "/oauth2/applications/@me", self.get_application)
+        app.router.add_put(api + "/applications/{app_id}/guilds/{guild_id}/commands", self.put_commands)
+        app.router.add_post(api + "/channels/{channel_id}/messages", self.post_message)
+        app.router.add_patch(api + "/channels/{channel_id}/messages/{message_id}", self.edit_message)
+        app.router.add_put(api + "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+                           self.add_reaction)
+        app.router.add_post(api + "/interactions/{id}/{token}/callback", self.interaction_callback)
+        app.router.add_post(api + "/webhooks/{app_id}/{token}", self.interaction_followup)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.url = f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+        return self.url
+
+    async def stop(self):
+        if self._ws is not None:
+            await self._ws.close()
+        await self._runner.cleanup()
@@ -0,0 +1,118 @@
+import io
+import sys
+import unittest
+import asyncio
+from contextlib import redirect_stdout
+from .utils import *
+
+from queuebot import QueueConfig, ConfigError, OfficeTracker
+
+russ = MockAuthor("Russ", None, ["UGTA"])
+ta2 = MockAuthor("Kate", None, ["UGTA"])
+
+
+class QueueTest(BotTestCase):
+    config_changes = {"ALERT_ON_FIRST_JOIN": "True", "AUTO_DISPATCH": "True"}
+    transport_class = None
+
+    def setUp(self):
+        super().setUp()
+        self.rooms = [MockVoice("Office Hours Room 1"), MockVoice("Office Hours Room 2")]
+        self.bot.office_rooms = self.rooms
+        run(self.bot.reset_office_tracker())
+
+    def move(self, member, before, after):
+        # Keep the mock rooms in sync like discord.py does
+        if before is not None:
+            before.members.remove(member)
+        if after is not None:
+            after.members.append(member)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.on_voice_state_update(member, MockVoiceState(before), MockVoiceState(after)))
+            return buf.getvalue()
+
+    def join_queue(self, students):
+        for student in students:
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.run_command(MockMessage("!q join", student)))
+                output = buf.getvalue()
+        return output
+
+    def test_requires_office_rooms(self):
+        with self.assertRaises(ConfigError):
+            QueueConfig(dict(CONFIG_DICT, AUTO_DISPATCH="True"))
+
+    def test_tracker(self):
+        tracker = OfficeTracker(self.rooms)
+        room1, room2 = (r.id for r in self.rooms)
+        tracker.join(room1, 1, True)
+        tracker.join(room2, 2, True)
+        self.assertEqual(list(tracker.available), [room1, room2])
+
+        tracker.join(room1, 3, False)
+        self.assertEqual(list(tracker.available), [room2])
+        tracker.leave(room1, 3)
+        self.assertEqual(list(tracker.available), [room2, room1])
+
+        tracker.reserve(room2, 4)
+        self.assertEqual(list(tracker.available), [room1])
+        self.assertFalse(tracker.release(room2, 5))
+        self.assertTrue(tracker.release(room2, 4))
+        self.assertEqual(list(tracker.available), [room1, room2])
+
+        tracker.leave(room1, 1)
+        self.assertEqual(list(tracker.available), [room2])
+
+    def test_ta_becomes_free(self):
+        students = get_n_rand(ALL_STUDENTS, 2)
+        self.join_queue(students)
+        self.assertEqual(len(self.bot._queue), 2)
+
+        output = self.move(russ, None, self.rooms[0])
+        self.assertEqual(output, f"SEND: {students[0].get_mention()} please join the 'Office Hours Room 1' voice channel. " +
+                                 f"{russ.get_mention()} will help you there\nRemaining people in the queue: 1\n")
+        self.assertEqual(len(self.bot._queue), 1)
+
+        # The room is held for the student, so no one else is sent there
+        self.assertEqual(self.move(ta2, None, self.rooms[0]), "")
+        self.assertEqual(len(self.bot._queue), 1)
+
+        # Student arrives then leaves: the room is free again
+        self.move(students[0], None, self.rooms[0])
+        output = self.move(students[0], self.rooms[0], None)
+        self.assertIn(f"{students[1].get_mention()} please join the 'Office Hours Room 1'", output)
+        self.assertEqual(len(self.bot._queue), 0)
+
+    def test_join_while_ta_free(self):
+        self.move(russ, None, self.rooms[1])
+        student = get_rand_element(ALL_STUDENTS)
+        output = self.join_queue([student])
+        self.assertIn(f"{student.get_mention()} please join the 'Office Hours Room 2'", output)
+        self.assertEqual(len(self.bot._queue), 0)
+
+        # TA busy with the dispatched student
+        self.move(student, None, self.rooms[1])
+        other = get_rand_element([s for s in ALL_STUDENTS if s is not student])
+        output = self.join_queue([other])
+        self.assertNotIn("please join", output)
+        self.assertEqual(len(self.bot._queue), 1)
+
+    def test_no_show(self):
+        student = get_rand_element(ALL_STUDENTS)
+        self.join_queue([student])
+        self.move(russ, None, self.rooms[0])
+        room_id = self.rooms[0].id
+
+        other = get_rand_element([s for s in ALL_STUDENTS if s is not student])
+        self.join_queue([other])
+        self.assertEqual(len(self.bot._queue), 1)
+
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.bot._expire_dispatch(room_id, student.id)
+            run(asyncio.sleep(0))
+            self.assertIn(f"{other.get_mention()} please join the 'Office Hours Room 1'", buf.getvalue())
+        self.assertEqual(len(self.bot._queue), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
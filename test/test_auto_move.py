@@ -0,0 +1,104 @@
+import io
+import sys
+import unittest
+import asyncio
+import random
+from contextlib import redirect_stdout
+from .utils import *
+
+from queuebot import QueueBot, QueueConfig, DiscordUser, ConfigError
+
+config_dict = {
+    "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "True",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+    "AUTO_MOVE": "True",
+}
+config = QueueConfig(config_dict, test_mode=True)
+
+
+class QueueTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(SEED)
+        self.config = config.copy()
+        self.bot = QueueBot(self.config, None, testing=True)
+        self.bot.logger = MockLogger()
+        self.guild = MockGuild()
+        self.bot.waiting_room = MockVoice("waiting-room")
+        self.bot.waiting_room.guild = self.guild
+        self.offices = [MockVoice("Office Hours Room 1"), MockVoice("Office Hours Room 2")]
+
+        self.tas = [self.member(f"TA{i}", ["UGTA"], self.offices[i]) for i in range(2)]
+        self.students = [self.member(f"Student{i}", [], self.bot.waiting_room) for i in range(3)]
+        for student in self.students:
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.queue_command(MockMessage("!q join", student)))
+
+    def member(self, name, roles, channel):
+        member = MockAuthor(name, None, roles)
+        member.voice = MockVoiceState(channel)
+        if channel is self.bot.waiting_room:
+            channel.members.append(member)
+        self.guild.members[member.id] = member
+        return member
+
+    def command(self, content, author, mentions=None):
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage(content, author, mentions)))
+            run(asyncio.gather(*self.bot._move_tasks))
+            return buf.getvalue()
+
+    def test_requires_waiting_room(self):
+        with self.assertRaises(ConfigError):
+            QueueConfig(dict(config_dict, CHECK_VOICE_WAITING="False"))
+
+    def test_move_to_ta_room(self):
+        self.command("!q next", self.tas[1])
+        self.assertIs(self.students[0].voice.channel, self.offices[1])
+        self.assertIs(self.students[1].voice.channel, self.bot.waiting_room)
+
+    def test_reply_not_delayed(self):
+        self.students[0].move_delay = 0.2
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage("!q next", self.tas[0])))
+            self.assertIn(f"The next person is {self.students[0].get_mention()} (in voice)", buf.getvalue())
+        self.assertIs(self.students[0].voice.channel, self.bot.waiting_room)
+
+        run(asyncio.gather(*self.bot._move_tasks))
+        self.assertIs(self.students[0].voice.channel, self.offices[0])
+
+    def test_batch_moves(self):
+        self.command(f"!q next {self.tas[1].mention} {self.tas[0].mention}", self.tas[0], [self.tas[1], self.tas[0]])
+        self.assertIs(self.students[0].voice.channel, self.offices[1])
+        self.assertIs(self.students[1].voice.channel, self.offices[0])
+
+    def test_not_moved(self):
+        # TA not in an office room
+        self.tas[0].voice = MockVoiceState(None)
+        self.command("!q next", self.tas[0])
+        self.assertIs(self.students[0].voice.channel, self.bot.waiting_room)
+
+        # Student not in the waiting room
+        self.students[1].voice = MockVoiceState(None)
+        self.command("!q next", self.tas[1])
+        self.assertIsNone(self.students[1].voice.channel)
+
+    def test_missing_permission(self):
+        self.students[0].move_error = discord.Forbidden(MockResponse(403, "Forbidden"), "Missing Permissions")
+        output = self.command("!q next", self.tas[0])
+        self.assertIn(f"⚠️ Unable to move {self.students[0].get_mention()} to 'Office Hours Room 1'. " +
+                      "The bot needs the Move Members permission", output)
+
+        # Other errors are only logged
+        self.students[1].move_error = discord.HTTPException(MockResponse(400, "Bad Request"), "Target user is not connected to voice")
+        output = self.command("!q next", self.tas[0])
+        self.assertNotIn("Unable to move", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,12 +31,19 @@ class QueueTest(unittest.TestCase):
         self.bot.logger = MockLogger()
         self.bot.office_rooms = [MockVoice(name) for name in config.VOICE_OFFICES]
 
+    def queue_command(self, message):
+        """
+        Run a command, then wait for the event bus subscribers (which send the alerts)
+        """
+        run(self.bot.queue_command(message))
+        run(self.bot.events.drain())
+
     def reset_vc_queue(self):
         # Reset queue
         russ = get_rand_element(ALL_TAS)
         message = MockMessage("!q clear", russ)
         with io.StringIO() as buf, redirect_stdout(buf):
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
 
         self.assertEqual(len(self.bot._queue), 0)
 
@@ -52,7 +59,7 @@ class QueueTest(unittest.TestCase):
 
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", student)
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
             self.assertTrue(buf.getvalue().strip().startswith(
                 f"SEND: ✅ {student.get_mention()} you have been added at position #1"))
 
@@ -70,10 +77,9 @@ class QueueTest(unittest.TestCase):
 
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", student)
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
 
-            self.assertTrue(buf.getvalue().strip().startswith(
-                f"SEND: {ta.get_mention()} The queue is no longer empty"))
+            self.assertIn(f"SEND: {ta.get_mention()} The queue is no longer empty", buf.getvalue())
 
         self.assertEqual(len(self.bot._queue), 1)
 
@@ -81,7 +87,8 @@ class QueueTest(unittest.TestCase):
 
 
     def get_mentions_from_send(self, buf):
-        send_str = buf.getvalue().strip().split("\n", 1)[0]
+        # The alert comes after the reply to "!q join"
+        send_str = buf.getvalue().strip().split("\n")[-1]
 
         assert send_str.startswith("SEND:")
         assert "<@" in send_str
@@ -100,7 +107,7 @@ class QueueTest(unittest.TestCase):
         student = get_rand_element(ALL_STUDENTS)
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", student)
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
             mentions = self.get_mentions_from_send(buf)
             mention_set.update(mentions)
 
@@ -127,7 +134,7 @@ class QueueTest(unittest.TestCase):
         student = get_rand_element(ALL_STUDENTS)
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", student)
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
             mentions = self.get_mentions_from_send(buf)
             mention_set.update(mentions)
 
@@ -149,7 +156,7 @@ class QueueTest(unittest.TestCase):
 
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", busy_student)
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
             mentions = self.get_mentions_from_send(buf)
         self.assertEqual(mentions, [open_ta.get_mention()])
 
@@ -171,7 +178,7 @@ class QueueTest(unittest.TestCase):
 
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", open_student)
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
 
             mentions = self.get_mentions_from_send(buf)
         self.assertEqual(mentions, [open_ta.get_mention()])
@@ -187,7 +194,7 @@ class QueueTest(unittest.TestCase):
         # Check for both alerted
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", students[0])
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
             ta_list = set(self.get_mentions_from_send(buf))
 
         for ta in tas:
@@ -197,7 +204,7 @@ class QueueTest(unittest.TestCase):
         # Remove first student from queue
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q next", tas[0])
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
 
         self.assertEqual(len(self.bot._queue), 0)
 
@@ -207,7 +214,7 @@ class QueueTest(unittest.TestCase):
         # Another student joins
         with io.StringIO() as buf, redirect_stdout(buf):
             message = MockMessage("!q join", students[1])
-            run(self.bot.queue_command(message))
+            self.queue_command(message)
             ta_list = self.get_mentions_from_send(buf)
             self.assertEqual(ta_list, [tas[1].get_mention()])
 
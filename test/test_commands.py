@@ -6,7 +6,7 @@ import random
 from contextlib import redirect_stdout
 from .utils import *
 
-from queuebot import QueueBot, QueueConfig, DiscordUser
+from queuebot import QueueBot, QueueConfig, DiscordUser, DM_POOL_SIZE, HELP_COOLDOWN
 
 config = {
     "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
@@ -261,9 +261,68 @@ class QueueTest(unittest.TestCase):
 
         self.assertEqual(len(self.bot._queue), 0)
 
-    # TODO Implement
     def test_help(self):
-        pass
+        student = MockAuthor("Student", None)
+        message = MockMessage("!q help", student)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            self.assertEqual(f"SEND: ✅ {student.get_mention()} a list of the commands has been sent to your Direct Messages\n",
+                             buf.getvalue())
+
+        dm_channel = self.bot._dm_channels[student.id]
+        self.assertEqual(dm_channel.sent, [self.bot.msg_help["STUDENT"]])
+
+        message = MockMessage("!q help", russ)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+        self.assertEqual(self.bot._dm_channels[russ.id].sent,
+                         [self.bot.msg_help["STUDENT"] + "\n\n" + self.bot.msg_help["TA"]])
+
+    def test_help_cooldown(self):
+        student = MockAuthor("Student", None)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage("!q help", student)))
+
+        message = MockMessage("!q help", student)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            self.assertEqual(f"SEND: ⚠️ {student.get_mention()} the list of commands was already sent to your Direct Messages\n",
+                             buf.getvalue())
+        self.assertEqual(len(self.bot._dm_channels[student.id].sent), 1)
+
+        # Once the cooldown is over, the pooled DM channel is reused
+        self.bot._help_sent[student.id] -= HELP_COOLDOWN
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage("!q help", student)))
+        self.assertEqual(len(self.bot._dm_channels[student.id].sent), 2)
+        self.assertEqual(student.dms_created, 1)
+
+    def test_help_dms_closed(self):
+        student = MockAuthor("Student", None)
+        student.dms_open = False
+
+        message = MockMessage("!q help", student)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertFalse(run(self.bot.queue_command(message)))
+            self.assertEqual(f"SEND: ‼️ {student.get_mention()} I could not send you a Direct Message. " +
+                             "Please allow Direct Messages from server members and try again\n", buf.getvalue())
+        self.assertNotIn(student.id, self.bot._dm_channels)
+        self.assertNotIn(student.id, self.bot._help_sent)
+
+        # No cooldown after a failed DM
+        student.dms_open = True
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage("!q help", student)))
+        self.assertEqual(len(self.bot._dm_channels[student.id].sent), 1)
+
+    def test_dm_pool_bounded(self):
+        students = [MockAuthor(f"Student{i}", None) for i in range(DM_POOL_SIZE + 1)]
+        for student in students:
+            run(self.bot.get_dm_channel(student))
+
+        self.assertEqual(len(self.bot._dm_channels), DM_POOL_SIZE)
+        self.assertNotIn(students[0].id, self.bot._dm_channels)
+        self.assertIn(students[-1].id, self.bot._dm_channels)
 
     def test_small_list(self):
         students = get_n_rand(ALL_STUDENTS, 10)
@@ -533,5 +592,82 @@ class QueueTest(unittest.TestCase):
 
     # TODO Test a variety of invalid commands
 
+    def test_next_many(self):
+        ta1, ta2, ta3 = get_n_rand(ALL_TAS, 3)
+        students = get_n_rand(ALL_STUDENTS, 5)
+        for s in students:
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.queue_command(MockMessage("!q join", s)))
+
+        # Mention order (not message.mentions order) decides who gets who
+        message = MockMessage(f"!q next 3 {ta2.get_mention()} {ta1.get_mention()} {ta3.get_mention()}", ta1, [ta1, ta3, ta2])
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertTrue(run(self.bot.queue_command(message)))
+            self.assertEqual(f"""SEND: The next 3 people are:
+**1.** {students[0].get_mention()} -> {ta2.get_mention()}
+**2.** {students[1].get_mention()} -> {ta1.get_mention()}
+**3.** {students[2].get_mention()} -> {ta3.get_mention()}
+Remaining people in the queue: 2
+""", buf.getvalue())
+
+        # Asking for more people than are in the queue pops everyone
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertTrue(run(self.bot.queue_command(MockMessage("!q next 5", ta1))))
+            self.assertEqual(f"""SEND: The next 2 people are: (only 2 of 5 requested were in the queue)
+**1.** {students[3].get_mention()}
+**2.** {students[4].get_mention()}
+Remaining people in the queue: 0
+""", buf.getvalue())
+
+    def test_next_many_invalid(self):
+        ta1, ta2 = get_n_rand(ALL_TAS, 2)
+        student = get_rand_element(ALL_STUDENTS)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage("!q join", student)))
+
+        for content, mentions in [("!q next 0", []), ("!q next abc", []), ("!q next 1 2", []),
+                                  (f"!q next 3 {ta1.get_mention()} {ta2.get_mention()}", [ta1, ta2])]:
+            with io.StringIO() as buf, redirect_stdout(buf):
+                self.assertFalse(run(self.bot.queue_command(MockMessage(content, ta1, mentions))))
+                self.assertTrue(buf.getvalue().startswith("SEND: ‼️"), content)
+
+        self.assertEqual(len(self.bot._queue), 1)
+
+    def test_add_remove_many(self):
+        ta = get_rand_element(ALL_TAS)
+        wumpus, quirky, cyber, squid = get_n_rand(ALL_STUDENTS, 4)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage("!q join", quirky)))
+
+        mentions = [cyber, quirky, wumpus]
+        message = MockMessage("!q add " + " ".join(m.get_mention() for m in mentions), ta, [wumpus, quirky, cyber])
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertTrue(run(self.bot.queue_command(message)))
+            self.assertEqual(f"SEND: ✅ {ta.get_mention()} added 2 people at positions #2-#3: {cyber.nick or cyber.name}, {wumpus.nick or wumpus.name}\n"
+                             f"Already in the queue: {quirky.nick or quirky.name} (#1)\n", buf.getvalue())
+        self.assertEqual([u.uuid for u in self.bot._queue], [quirky.id, cyber.id, wumpus.id])
+
+        mentions = [wumpus, squid, quirky]
+        message = MockMessage("!q remove " + " ".join(m.get_mention() for m in mentions), ta, mentions)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertTrue(run(self.bot.queue_command(message)))
+        self.assertEqual([u.uuid for u in self.bot._queue], [cyber.id])
+
+    def test_front_many(self):
+        ta = get_rand_element(ALL_TAS)
+        students = get_n_rand(ALL_STUDENTS, 5)
+        for s in students:
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.queue_command(MockMessage("!q join", s)))
+
+        mentions = [students[4], students[2]]
+        message = MockMessage("!q front " + " ".join(m.get_mention() for m in mentions), ta, mentions[::-1])
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertTrue(run(self.bot.queue_command(message)))
+
+        expected = [students[4], students[2], students[0], students[1], students[3]]
+        self.assertEqual([u.uuid for u in self.bot._queue], [s.id for s in expected])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,138 @@
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+import asyncio
+from contextlib import redirect_stdout
+from .utils import *
+
+from queuebot import QueueConfig, ConfigError
+
+
+class QueueTest(BotTestCase):
+    transport_class = None
+
+    def setUp(self):
+        super().setUp()
+        self.guild = MockGuild(text_channels=["join-queue", "help-queue", "queue-alerts"],
+                               voice_channels=["waiting-room", "Office Hours Room 1"])
+
+    def test_invalid_config_raises(self):
+        with self.assertRaises(ConfigError):
+            make_config(TA_ROLES=[])
+        with self.assertRaises(ConfigError):
+            make_config(SECRET_TOKEN="YOUR_SECRET_TOKEN_HERE")
+        with self.assertRaises(ConfigError):
+            make_config(VOICE_WAITING_GRACE="soon")
+
+        missing = dict(CONFIG_DICT)
+        del missing["LISTEN_CHANNELS"]
+        with self.assertRaises(ConfigError):
+            QueueConfig(missing)
+
+    def test_reload_keeps_queue(self):
+        students = get_n_rand(ALL_STUDENTS, 3)
+        for s in students:
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.queue_command(MockMessage("!q join", s)))
+
+        grad_ta = MockAuthor("GradTA", None, ["GTA"])
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertFalse(run(self.bot.queue_command(MockMessage("!q next", grad_ta))))
+
+        new_config = make_config(TA_ROLES=["UGTA", "GTA"], LISTEN_CHANNELS=["join-queue", "help-queue"])
+        self.assertTrue(run(self.bot.reload_config(new_config, self.guild)))
+        self.assertIs(self.bot.config, new_config)
+        self.assertEqual([c.name for c in self.bot.listen_channels], ["join-queue", "help-queue"])
+        self.assertEqual([u.uuid for u in self.bot._queue], [s.id for s in students])
+
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertTrue(run(self.bot.queue_command(MockMessage("!q next", grad_ta))))
+        self.assertEqual(len(self.bot._queue), 2)
+
+    def test_on_message_listen_channels(self):
+        self.bot.is_initialized = True
+        join_queue, help_queue, alerts = self.guild.text_channels
+        run(self.bot.apply_config(self.bot.config, self.guild))
+        self.assertEqual(self.bot.listen_channel_ids, frozenset([join_queue.id]))
+
+        def on_message(content, channel):
+            message = MockMessage(content, get_rand_element(ALL_STUDENTS))
+            message.channel = channel
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.on_message(message))
+                return buf.getvalue()
+
+        self.assertEqual(on_message("!q ping", join_queue), "SEND: Pong!\n")
+        self.assertEqual(on_message("!Q ping", join_queue), "SEND: Pong!\n")
+        self.assertEqual(on_message("is anyone around?", join_queue), "")
+        self.assertEqual(on_message("!q ping", help_queue), "")
+
+        # Channels are looked up again on reload
+        self.assertTrue(run(self.bot.reload_config(make_config(LISTEN_CHANNELS=["help-queue"]), self.guild)))
+        self.assertEqual(on_message("!q ping", help_queue), "SEND: Pong!\n")
+        self.assertEqual(on_message("!q ping", join_queue), "")
+
+    def test_reload_missing_channel(self):
+        old_config = self.bot.config
+        new_config = make_config(LISTEN_CHANNELS=["does-not-exist"])
+
+        self.assertFalse(run(self.bot.reload_config(new_config, self.guild)))
+        self.assertIs(self.bot.config, old_config)
+
+    def test_reload_needs_restart(self):
+        # The members intent can only be turned on when connecting
+        old_config = self.bot.config
+        new_config = make_config(CHECK_VOICE_WAITING="True")
+
+        self.assertFalse(run(self.bot.reload_config(new_config, self.guild)))
+        self.assertIs(self.bot.config, old_config)
+
+    def test_restart_options_kept(self):
+        new_config = make_config(TA_ROLES=["UGTA", "GTA"], MEMORY_LEAN="True", DASHBOARD_PORT="8080",
+                                 SECRET_TOKEN="NEW_TOKEN")
+        with io.StringIO() as buf, redirect_stdout(buf):
+            self.assertTrue(run(self.bot.reload_config(new_config, self.guild)))
+        self.assertEqual(self.bot.config.TA_ROLES, ["UGTA", "GTA"])
+        self.assertFalse(self.bot.config.MEMORY_LEAN)
+        self.assertEqual(self.bot.config.DASHBOARD_PORT, 0)
+        self.assertEqual(self.bot.config.SECRET_TOKEN, self.config.SECRET_TOKEN)
+        # Copies keep them too
+        self.assertFalse(self.bot.config.copy().MEMORY_LEAN)
+
+    def test_poll_config_file(self):
+        reloaded = []
+
+        async def reload_config(new_config, guild=None):
+            reloaded.append(new_config)
+            return True
+        self.bot.reload_config = reload_config
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            with open(path, "w") as f:
+                json.dump(CONFIG_DICT, f)
+
+            # First check only remembers the modification time
+            self.assertFalse(run(self.bot.poll_config_file(path)))
+            self.assertFalse(run(self.bot.poll_config_file(path)))
+
+            with open(path, "w") as f:
+                json.dump(dict(CONFIG_DICT, TA_ROLES=["GTA"]), f)
+            os.utime(path, (0, os.stat(path).st_mtime + 10))
+
+            self.assertTrue(run(self.bot.poll_config_file(path)))
+            self.assertEqual(reloaded[0].TA_ROLES, ["GTA"])
+
+            # Invalid edits are ignored
+            with open(path, "w") as f:
+                f.write("{ not json")
+            os.utime(path, (0, os.stat(path).st_mtime + 10))
+            self.assertFalse(run(self.bot.poll_config_file(path)))
+            self.assertEqual(len(reloaded), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
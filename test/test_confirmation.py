@@ -0,0 +1,109 @@
+import io
+import sys
+import unittest
+import asyncio
+import random
+from contextlib import redirect_stdout
+from .utils import *
+
+from queuebot import QueueBot, QueueConfig, DiscordUser
+
+config = {
+    "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "False",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+}
+config = QueueConfig(config, test_mode=True)
+
+
+class QueueTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(SEED)
+        self.config = config.copy()
+        self.bot = QueueBot(self.config, None, testing=True)
+        self.bot.logger = MockLogger()
+        self.confirmed_by = []
+
+    async def on_confirm(self, message, member):
+        self.confirmed_by.append(member)
+        await message.edit(content="Confirmed")
+
+    def add_confirmation(self, timeout=60.0):
+        message = MockMessage("Are you sure?", get_rand_element(ALL_TAS))
+
+        async def add():
+            self.bot.add_confirmation(message, self.on_confirm, "Canceled", timeout)
+        run(add())
+        return message
+
+    def react(self, message, member, emoji):
+        run(self.bot.on_raw_reaction_add(MockReactionPayload(message, member, emoji)))
+
+    def test_confirm(self):
+        ta = get_rand_element(ALL_TAS)
+        message = self.add_confirmation()
+        self.assertIn(message.id, self.bot._confirmations)
+
+        self.react(message, ta, "✅")
+
+        self.assertEqual(self.confirmed_by, [ta])
+        self.assertEqual(message.content, "Confirmed")
+        self.assertNotIn(message.id, self.bot._confirmations)
+
+        # Further reactions do nothing once resolved
+        self.react(message, ta, "✅")
+        self.assertEqual(self.confirmed_by, [ta])
+
+    def test_cancel(self):
+        message = self.add_confirmation()
+
+        self.react(message, get_rand_element(ALL_TAS), "❌")
+
+        self.assertEqual(self.confirmed_by, [])
+        self.assertEqual(message.content, "Canceled")
+        self.assertNotIn(message.id, self.bot._confirmations)
+
+    def test_bystanders_ignored(self):
+        message = self.add_confirmation()
+
+        # Students can neither confirm nor cancel
+        self.react(message, get_rand_element(ALL_STUDENTS), "✅")
+        self.react(message, get_rand_element(ALL_STUDENTS), "❌")
+        # Unrelated emoji from a TA does not cancel
+        self.react(message, get_rand_element(ALL_TAS), "👍")
+
+        self.assertEqual(self.confirmed_by, [])
+        self.assertIn(message.id, self.bot._confirmations)
+
+        ta = get_rand_element(ALL_TAS)
+        self.react(message, ta, "✅")
+        self.assertEqual(self.confirmed_by, [ta])
+
+    def test_expire(self):
+        message = self.add_confirmation(timeout=0.01)
+        run(asyncio.sleep(0.05))
+
+        self.assertNotIn(message.id, self.bot._confirmations)
+        self.assertEqual(message.content, "Canceled")
+
+        self.react(message, get_rand_element(ALL_TAS), "✅")
+        self.assertEqual(self.confirmed_by, [])
+
+    def test_many_pending(self):
+        messages = [self.add_confirmation() for _ in range(5)]
+        self.assertEqual(len(self.bot._confirmations), 5)
+
+        ta = get_rand_element(ALL_TAS)
+        self.react(messages[2], ta, "✅")
+        self.assertEqual(len(self.bot._confirmations), 4)
+        self.assertEqual(messages[2].content, "Confirmed")
+        self.assertEqual(messages[0].content, "Are you sure?")
+
+
+if __name__ == '__main__':
+    unittest.main()
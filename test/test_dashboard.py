@@ -0,0 +1,156 @@
+import json
+import asyncio
+import unittest
+import aiohttp
+from .utils import *
+
+from queuebot import ConfigError, QueueDashboard, DASHBOARD_CLIENT_BUFFER
+
+
+async def read_event(response):
+    """
+    Returns: (event name, data) of the next server-sent event (comments are skipped)
+    """
+    fields = {}
+    while True:
+        line = (await asyncio.wait_for(response.content.readline(), 5)).decode().rstrip("\n")
+        if line == "":
+            if "data" in fields:
+                return fields.get("event"), json.loads(fields["data"])
+            fields = {}
+        elif not line.startswith(":"):
+            name, _, value = line.partition(": ")
+            fields[name] = value
+
+
+class DashboardTest(BotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.students = get_n_rand(ALL_STUDENTS, 6)
+        self.ta = get_rand_element(ALL_TAS)
+        self.dashboard = QueueDashboard(self.bot, "127.0.0.1", 0)
+        self.bot.dashboard = self.dashboard
+        self.subscription = self.bot.events.subscribe(self.dashboard.on_queue_event)
+
+    def tearDown(self):
+        run(self.dashboard.stop())
+
+    @staticmethod
+    def shown(student):
+        return student.nick if student.nick is not None else student.name
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.dashboard.port}{path}"
+
+    def test_config(self):
+        self.assertEqual(self.config.DASHBOARD_PORT, 0)
+        self.assertEqual(self.config.DASHBOARD_HOST, "127.0.0.1")
+        for port in ("-1", "65536", "http"):
+            with self.assertRaises(ConfigError):
+                make_config(DASHBOARD_PORT=port)
+
+    def test_diffs(self):
+        a, b, c, d = self.students[:4]
+        for student in (a, b, c):
+            self.command("!q join", student)
+        self.assertEqual(self.dashboard.version, 3)
+        diff = self.dashboard.publish()
+        self.assertIsNone(diff)
+
+        self.command("!q join", d)
+        self.assertEqual(self.dashboard._diffs[-1][0], 4)
+        self.command("!q next", self.ta)
+        self.command("!q leave", c)
+        self.command("!q front " + d.get_mention(), self.ta, [d])
+        expected = [
+            {"start": 3, "delete": 0, "insert": [self.shown(d)]},
+            {"start": 0, "delete": 1, "insert": []},
+            {"start": 1, "delete": 1, "insert": []},
+            {"start": 0, "delete": 2, "insert": [self.shown(d), self.shown(b)]},
+        ]
+        diffs = [json.loads(event.decode().split("data: ")[1]) for _, event in list(self.dashboard._diffs)[3:]]
+        for diff, want in zip(diffs, expected):
+            self.assertEqual((diff["start"], diff["delete"], [e["name"] for e in diff["insert"]]),
+                             (want["start"], want["delete"], want["insert"]))
+            self.assertEqual(diff["base"], diff["version"] - 1)
+
+        # Applying every diff gives the same queue as the snapshot
+        queue = []
+        for _, event in self.dashboard._diffs:
+            diff = json.loads(event.decode().split("data: ")[1])
+            queue[diff["start"]:diff["start"] + diff["delete"]] = diff["insert"]
+        self.assertEqual(queue, self.dashboard.snapshot()["queue"])
+        self.assertEqual([e["name"] for e in queue], [self.shown(d), self.shown(b)])
+
+    def test_catch_up(self):
+        for student in self.students[:3]:
+            self.command("!q join", student)
+        self.assertEqual(self.dashboard.catch_up(3), b"")
+        self.assertEqual(self.dashboard.catch_up(1).count(b"event: diff"), 2)
+        for last_version in (None, 7, -1):
+            self.assertTrue(self.dashboard.catch_up(last_version).startswith(
+                f"id: {self.dashboard.epoch}:3\nevent: snapshot".encode()))
+
+    def test_event_ids(self):
+        epoch = self.dashboard.epoch
+        self.assertEqual(self.dashboard.last_version(f"{epoch}:2"), 2)
+        for event_id in (None, "", "2", f"{epoch}:two", "0badcafe:2"):
+            self.assertIsNone(self.dashboard.last_version(event_id))
+        # A restarted bot starts over at version 0 with a new epoch
+        self.assertNotEqual(QueueDashboard(self.bot, "127.0.0.1", 0).epoch, epoch)
+
+    def test_events(self):
+        async def scenario():
+            # start() subscribes the dashboard to queue events itself
+            self.bot.events.unsubscribe(self.subscription)
+            await self.dashboard.start()
+            async with aiohttp.ClientSession() as session:
+                async with session.get(self.url("/")) as response:
+                    self.assertIn("EventSource", await response.text())
+
+                async with session.get(self.url("/events")) as response:
+                    self.assertEqual(response.headers["Content-Type"], "text/event-stream")
+                    event, data = await read_event(response)
+                    self.assertEqual((event, data), ("snapshot", {"version": 0, "queue": [], "waitlist": 0}))
+
+                    await self.bot.run_command(MockMessage("!q join", self.students[0]))
+                    await self.bot.run_command(MockMessage("!q join", self.students[1]))
+                    event, data = await read_event(response)
+                    self.assertEqual((event, data["version"], data["start"]), ("diff", 1, 0))
+                    event, data = await read_event(response)
+                    self.assertEqual((event, data["version"], data["start"]), ("diff", 2, 1))
+                    self.assertEqual(data["insert"][0]["name"], self.shown(self.students[1]))
+
+                # Reconnecting clients only get what they missed
+                await self.bot.run_command(MockMessage("!q leave", self.students[0]))
+                async with session.get(self.url("/events"), headers={"Last-Event-ID": f"{self.dashboard.epoch}:2"}) as response:
+                    event, data = await read_event(response)
+                    self.assertEqual((event, data["version"], data["delete"]), ("diff", 3, 1))
+
+                # Ids from before a restart get a snapshot
+                async with session.get(self.url("/events"), headers={"Last-Event-ID": "0badcafe:2"}) as response:
+                    event, data = await read_event(response)
+                    self.assertEqual((event, data["version"]), ("snapshot", 3))
+
+                async with session.get(self.url("/queue")) as response:
+                    data = await response.json()
+                    self.assertEqual(data["version"], 3)
+                    self.assertEqual([e["name"] for e in data["queue"]], [self.shown(self.students[1])])
+
+        run(scenario())
+
+    def test_slow_client_dropped(self):
+        client = asyncio.Queue(maxsize=DASHBOARD_CLIENT_BUFFER)
+        self.dashboard._clients.add(client)
+        for i in range(DASHBOARD_CLIENT_BUFFER):
+            self.command("!q join" if i % 2 == 0 else "!q leave", self.students[0])
+        self.assertEqual(self.dashboard.client_count, 1)
+        self.command("!q join", self.students[1])
+        self.assertEqual(self.dashboard.client_count, 0)
+        self.assertEqual(self.dashboard.dropped, 1)
+        # The handler is told to end the stream instead of being sent a partial history
+        self.assertIsNone(client.get_nowait())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+import io
+import sys
+import unittest
+import asyncio
+import random
+import discord
+from .utils import *
+from .fake_discord import FakeDiscord
+
+from queuebot import QueueBot, QueueConfig, DiscordUser
+from .fake_discord import LARGE_THRESHOLD
+
+config = {
+    "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "True",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+}
+config = QueueConfig(config, test_mode=True)
+
+
+class QueueTest(unittest.TestCase):
+    """
+    Runs the real QueueBot (connected through discord.py) against a local fake Discord server
+    """
+    def setUp(self):
+        random.seed(SEED)
+        self.fake = FakeDiscord()
+        self.fake.add_role("UGTA")
+        self.fake.add_text_channel("join-queue")
+        self.fake.add_text_channel("general")
+        self.fake.add_voice_channel("waiting-room")
+        self.ta = self.fake.add_user("Russ", ["UGTA"])
+        self.students = self.fake.add_users(5)
+
+        url = run(self.fake.start())
+        self.old_base = discord.http.Route.BASE
+        discord.http.Route.BASE = url + "/api/v7"
+
+        self.bot = QueueBot(config.copy(), MockLogger(), guild_ready_timeout=0.05)
+        self.bot.api_url = url + "/api/v8"
+        self.bot_task = asyncio.get_event_loop().create_task(self.bot.start(config.SECRET_TOKEN))
+        run(self.wait_until(lambda: self.bot.is_initialized))
+
+    def tearDown(self):
+        run(self.bot.close())
+        run(self.bot_task)
+        run(self.fake.stop())
+        discord.http.Route.BASE = self.old_base
+
+    async def wait_until(self, predicate, timeout=10.0):
+        # Bot state (not just fake server state) may need to be checked
+        deadline = asyncio.get_event_loop().time() + timeout
+        while not predicate():
+            self.assertLess(asyncio.get_event_loop().time(), deadline, "Timed out")
+            await asyncio.sleep(0.005)
+
+    def command(self, user, content, channel="join-queue", replies=1):
+        expected = len(self.fake.sent) + replies
+
+        async def send():
+            await self.fake.send_message(user, channel, content)
+            await self.fake.wait_until(lambda: len(self.fake.sent) >= expected)
+        run(send())
+        return self.fake.sent[-1].content
+
+    def test_ready(self):
+        self.assertEqual(self.fake.identifies, 1)
+        self.assertEqual(self.bot.waiting_room.name, "waiting-room")
+        self.assertEqual(self.fake.presences[-1]["game"]["name"], "0 people in queue")
+
+    def test_join_through_voice(self):
+        student = self.students[0]
+        reply = self.command(student, "!q join")
+        self.assertIn("Please join the 'waiting-room' voice channel", reply)
+
+        run(self.fake.move_voice(student, "waiting-room"))
+        run(self.wait_until(lambda: len(self.bot.waiting_room.members) == 1))
+
+        reply = self.command(student, "!q join")
+        self.assertTrue(reply.startswith(f"✅ <@{student['id']}> you have been added at position #1"), reply)
+        run(self.fake.wait_until(lambda: self.fake.presences[-1]["game"]["name"] == "1 person in queue"))
+
+        reply = self.command(self.ta, "!q next")
+        self.assertEqual(reply, f"The next person is <@{student['id']}> (in voice)\nRemaining people in the queue: 0")
+
+    def test_ignores_other_channels(self):
+        run(self.fake.send_message(self.students[0], "general", "!q ping"))
+        self.command(self.students[1], "!q ping")
+
+        self.assertEqual(len(self.fake.sent), 1)
+        self.assertEqual(self.fake.sent[0].channel_id, self.fake.channels["join-queue"]["id"])
+
+    def test_rate_limited(self):
+        self.fake.rate_limit(count=2, retry_after=0.01)
+
+        reply = self.command(self.students[0], "!q ping")
+        self.assertEqual(reply, "Pong!")
+        self.assertEqual(self.fake.rate_limited, 2)
+
+    def test_reconnect(self):
+        run(self.fake.reconnect())
+        run(self.fake.wait_until(lambda: self.fake.resumes == 1))
+
+        reply = self.command(self.students[0], "!q ping")
+        self.assertEqual(reply, "Pong!")
+
+        run(self.fake.disconnect())
+        run(self.fake.wait_until(lambda: self.fake.resumes == 2))
+
+        reply = self.command(self.students[0], "!q ping")
+        self.assertEqual(reply, "Pong!")
+        self.assertEqual(self.fake.identifies, 1)
+
+
+class LazyMembersTest(unittest.TestCase):
+    """
+    Starts the bot with LAZY_MEMBERS against a server too large to be sent in full at startup
+    """
+    options = {"LAZY_MEMBERS": "True"}
+
+    def setUp(self):
+        random.seed(SEED)
+        self.fake = FakeDiscord()
+        self.fake.add_role("UGTA")
+        self.fake.add_text_channel("join-queue")
+        self.fake.add_voice_channel("waiting-room")
+        self.ta = self.fake.add_user("Russ", ["UGTA"])
+        self.students = self.fake.add_users(LARGE_THRESHOLD + 50)
+        # Only in the member list Discord sends at startup because they are in voice
+        self.in_voice = self.students[-1]
+        self.fake.voice_states[self.in_voice["id"]] = self.fake._voice_state(self.in_voice["id"], self.fake.channels["waiting-room"]["id"])
+
+        url = run(self.fake.start())
+        self.old_base = discord.http.Route.BASE
+        discord.http.Route.BASE = url + "/api/v7"
+
+        lazy_config = QueueConfig(dict(config.original_config, **self.options), test_mode=True)
+        self.bot = QueueBot(lazy_config, MockLogger(), guild_ready_timeout=0.05)
+        self.bot.api_url = url + "/api/v8"
+        self.bot_task = asyncio.get_event_loop().create_task(self.bot.start(config.SECRET_TOKEN))
+        run(self.fake.wait_until(lambda: self.bot.is_initialized))
+
+    def tearDown(self):
+        run(self.bot.close())
+        run(self.bot_task)
+        run(self.fake.stop())
+        discord.http.Route.BASE = self.old_base
+
+    def command(self, user, content):
+        expected = len(self.fake.sent) + 1
+
+        async def send():
+            await self.fake.send_message(user, "join-queue", content)
+            await self.fake.wait_until(lambda: len(self.fake.sent) >= expected)
+        run(send())
+        return self.fake.sent[-1].content
+
+    def test_no_chunking(self):
+        guild = self.bot.guilds[0]
+        self.assertEqual(self.fake.member_requests, [])
+        self.assertLess(len(guild.members), len(self.fake.members))
+        self.assertIsNotNone(self.bot.startup_time)
+
+        self.assertIn(int(self.in_voice["id"]), [m.id for m in self.bot.waiting_room.members])
+        reply = self.command(self.in_voice, "!q join")
+        self.assertIn("you have been added at position #1", reply)
+
+    def test_command_authors_cached(self):
+        guild = self.bot.guilds[0]
+        student = self.students[-2]
+        self.assertIsNone(guild.get_member(int(student["id"])))
+
+        reply = self.command(student, "!q join")
+        self.assertIn("Please join the 'waiting-room' voice channel", reply)
+        self.assertIsNotNone(guild.get_member(int(student["id"])))
+
+        run(self.fake.move_voice(student, "waiting-room"))
+        run(self.fake.wait_until(lambda: self.bot.in_waiting_room(DiscordUser(int(student["id"]), "", "", None))))
+        reply = self.command(student, "!q join")
+        self.assertIn("you have been added at position #1", reply)
+
+
+class MemoryLeanTest(LazyMembersTest):
+    """
+    Same as LazyMembersTest but only caches members while they are in voice
+    """
+    options = {"MEMORY_LEAN": "True"}
+
+    def test_command_authors_cached(self):
+        self.skipTest("authors are not cached in MEMORY_LEAN")
+
+    def test_lean_caches(self):
+        guild = self.bot.guilds[0]
+        # Only the bot and the member in voice (fetched after startup)
+        self.assertEqual({m.id for m in guild.members}, {self.bot.user.id, int(self.in_voice["id"])})
+        self.assertEqual(len(self.fake.member_requests), 1)
+
+        reply = self.command(self.students[0], "!q join")
+        self.assertIn("Please join the 'waiting-room' voice channel", reply)
+        self.assertEqual(len(self.bot.cached_messages), 0)
+        self.assertIsNone(guild.get_member(int(self.students[0]["id"])))
+
+        # Members are dropped from the cache when they leave voice
+        run(self.fake.move_voice(self.in_voice, None))
+        run(self.fake.wait_until(lambda: guild.get_member(int(self.in_voice["id"])) is None))
+
+        run(self.fake.move_voice(self.students[0], "waiting-room"))
+        run(self.fake.wait_until(lambda: guild.get_member(int(self.students[0]["id"])) is not None))
+        reply = self.command(self.students[0], "!q join")
+        self.assertIn("you have been added at position #1", reply)
+
+    def test_no_chunking(self):
+        self.assertIsNotNone(self.bot.startup_time)
+        self.assertIn(int(self.in_voice["id"]), [m.id for m in self.bot.waiting_room.members])
+        reply = self.command(self.in_voice, "!q join")
+        self.assertIn("you have been added at position #1", reply)
+
+
+if __name__ == '__main__':
+    unittest.main()
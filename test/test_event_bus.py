@@ -0,0 +1,155 @@
+import asyncio
+import unittest
+from .utils import *
+
+from queuebot import EventBus, QueueEvent, QueueEventType, Overflow, EVENT_BUFFER_SIZE
+
+
+def make_event(i, kind=QueueEventType.JOIN):
+    return QueueEvent(kind, [], i, 0)
+
+
+class EventBusTest(unittest.TestCase):
+    def setUp(self):
+        self.errors = []
+        self.bus = EventBus(asyncio.get_event_loop(), lambda subscription, event, e: self.errors.append(e))
+
+    def tearDown(self):
+        self.bus.close()
+
+    def test_sync_subscriber(self):
+        seen = []
+        self.bus.subscribe(seen.append, kinds=[QueueEventType.POP])
+        self.bus.publish(make_event(1))
+        self.bus.publish(make_event(2, QueueEventType.POP))
+        # Called right away without running the loop
+        self.assertEqual([event.queue_length for event in seen], [2])
+
+    def test_async_subscriber(self):
+        seen = []
+
+        async def handler(event):
+            await asyncio.sleep(0)
+            seen.append(event.queue_length)
+
+        self.bus.subscribe(handler)
+        for i in range(10):
+            self.bus.publish(make_event(i))
+        self.assertEqual(seen, [])
+        self.assertEqual(self.bus.pending, 1)
+        run(self.bus.drain())
+        self.assertEqual(seen, list(range(10)))
+        self.assertEqual(self.bus.pending, 0)
+
+    def test_overflow(self):
+        release = asyncio.Event()
+        seen = {policy: [] for policy in Overflow}
+
+        def handler(policy):
+            async def handle(event):
+                await release.wait()
+                seen[policy].append(event.queue_length)
+            return handle
+
+        subscriptions = {policy: self.bus.subscribe(handler(policy), maxsize=3, overflow=policy) for policy in Overflow}
+
+        async def publish_all():
+            for i in range(10):
+                self.bus.publish(make_event(i))
+                # Let the handlers start on the first event
+                await asyncio.sleep(0)
+            release.set()
+            await self.bus.drain()
+
+        run(publish_all())
+        self.assertEqual(seen[Overflow.DROP_OLDEST], [0, 7, 8, 9])
+        self.assertEqual(seen[Overflow.DROP_NEWEST], [0, 1, 2, 3])
+        self.assertEqual(subscriptions[Overflow.DROP_OLDEST].dropped, 6)
+        self.assertEqual(subscriptions[Overflow.DROP_NEWEST].dropped, 6)
+        # Disconnected once it fell 3 events behind. The event it was handling is not delivered
+        self.assertTrue(subscriptions[Overflow.DISCONNECT].closed)
+        self.assertEqual(seen[Overflow.DISCONNECT], [0])
+        self.assertEqual(subscriptions[Overflow.DISCONNECT].dropped, 1)
+
+    def test_errors(self):
+        seen = []
+
+        async def failing(event):
+            if event.queue_length == 1:
+                raise ValueError("bad event")
+            seen.append(event.queue_length)
+
+        def failing_sync(event):
+            raise KeyError("sync")
+
+        self.bus.subscribe(failing)
+        self.bus.subscribe(failing_sync)
+        for i in range(3):
+            self.bus.publish(make_event(i))
+        run(self.bus.drain())
+        self.assertEqual(seen, [0, 2])
+        self.assertEqual(len(self.errors), 4)
+
+
+class QueueEventTest(BotTestCase):
+    config_changes = {"CAPACITY": "2"}
+
+    def setUp(self):
+        super().setUp()
+        self.students = get_n_rand(ALL_STUDENTS, 4)
+        self.ta = get_rand_element(ALL_TAS)
+        self.events = []
+        self.bot.events.subscribe(self.events.append)
+        self.presences = []
+
+    async def change_presence(self, activity=None):
+        self.presences.append(activity.name)
+
+    def test_command_events(self):
+        a, b, c, d = self.students
+        self.command("!q join", a)
+        self.command("!q join", b)
+        self.command("!q join", c)
+        self.command("!q front " + b.get_mention(), self.ta, [b])
+        self.command("!q next", self.ta)
+        self.command("!q remove " + a.get_mention(), self.ta, [a])
+        self.command("!q add " + d.get_mention(), self.ta, [d])
+        self.command("!q leave", d)
+        self.command("!q clear", self.ta)
+
+        kinds = [event.kind for event in self.events]
+        self.assertEqual(kinds, [
+            QueueEventType.JOIN, QueueEventType.JOIN, QueueEventType.WAITLIST, QueueEventType.FRONT,
+            QueueEventType.POP, QueueEventType.PROMOTE, QueueEventType.REMOVE, QueueEventType.ADD,
+            QueueEventType.LEAVE, QueueEventType.CLEAR])
+        pop = self.events[4]
+        self.assertEqual((pop.users, pop.queue_length, pop.waitlist_length), ([b], 1, 1))
+        self.assertEqual(self.events[5].users, [c])
+        self.assertEqual(self.events[-1].queue_length, 0)
+
+    def test_presence_subscriber(self):
+        for student in self.students[:2]:
+            self.command("!q join", student)
+        run(self.bot.events.drain())
+        # Joins made while the first update was being sent are covered by the latest count
+        self.assertEqual(self.presences[-1], "2 people in queue")
+        self.assertLessEqual(len(self.presences), 2)
+
+    def test_slow_subscriber(self):
+        release = asyncio.Event()
+
+        async def stuck(event):
+            await release.wait()
+
+        subscription = self.bot.events.subscribe(stuck)
+        for i in range(EVENT_BUFFER_SIZE + 10):
+            self.command("!q join" if i % 2 == 0 else "!q leave", self.students[0])
+        # Commands kept running while the subscriber was stuck
+        self.assertEqual(len(self.events), EVENT_BUFFER_SIZE + 10)
+        self.assertEqual(subscription.dropped, 9)
+        release.set()
+        run(self.bot.events.drain())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import unittest
+from .utils import *
+
+from queuebot import ConfigError, DiscordTransport, NullTransport, CmdPrefix
+
+
+class RecordingLogger(MockLogger):
+    def __init__(self):
+        self.lines = []
+
+    def info(self, str):
+        self.lines.append(str)
+
+    def events(self, event=None):
+        events = [json.loads(line) for line in self.lines]
+        return [e for e in events if event is None or e["event"] == event]
+
+
+class RecordingChannel(MockChannel):
+    async def send(self, content=None, embed=None, allowed_mentions=None):
+        return content
+
+
+class EventLogTest(BotTestCase):
+    config_changes = {"LOG_FORMAT": "json"}
+    transport_class = NullTransport
+
+    def make_bot(self, **changes):
+        bot = super().make_bot(**dict(self.config_changes, **changes))
+        bot.logger = RecordingLogger()
+        return bot
+
+    def test_invalid_options(self):
+        with self.assertRaises(ConfigError):
+            make_config(LOG_FORMAT="xml")
+        for rate in ("2", "-0.5", "often"):
+            with self.assertRaises(ConfigError):
+                make_config(LOG_SAMPLE_RATE=rate)
+
+    def test_command_events(self):
+        bot = self.bot
+        student = get_rand_element(ALL_STUDENTS)
+        run(bot.run_command(MockMessage("!q JOIN", student)))
+        run(bot.run_command(MockMessage("!q position", student)))
+
+        join, position = bot.logger.events("command")
+        self.assertEqual(join["command"], "join")
+        self.assertEqual(join["user"], student.id)
+        self.assertTrue(join["updated"])
+        self.assertEqual(join["queue_length"], 1)
+        self.assertGreaterEqual(join["latency_ms"], 0)
+        self.assertFalse(position["updated"])
+
+        presence, = bot.logger.events("presence")
+        self.assertEqual(presence["queue_length"], 1)
+        # Every line is compact JSON
+        self.assertTrue(all(" " not in line for line in bot.logger.lines))
+
+    def test_sampling(self):
+        bot = self.make_bot(LOG_SAMPLE_RATE="0")
+        bot.transport = DiscordTransport(bot)
+        message = MockMessage("!q join", get_rand_element(ALL_STUDENTS))
+        message.channel = RecordingChannel("join-queue")
+        run(bot.run_command(message))
+        # Commands are never sampled
+        self.assertEqual([e["event"] for e in bot.logger.events()], ["command"])
+
+        bot = self.make_bot(LOG_SAMPLE_RATE="0.5")
+        bot.transport = DiscordTransport(bot)
+        for _ in range(200):
+            run(bot.send(RecordingChannel("join-queue"), "hello", CmdPrefix.SUCCESS))
+        sends = bot.logger.events("send")
+        self.assertTrue(50 < len(sends) < 150)
+        self.assertEqual(sends[0]["sample_rate"], 0.5)
+        self.assertEqual(sends[0]["type"], "SUCCESS")
+        self.assertEqual(sends[0]["length"], len("✅ hello"))
+
+    def test_snapshot(self):
+        bot = self.bot
+        self.assertFalse(bot.log_snapshot())
+        students = get_n_rand(ALL_STUDENTS, 3)
+        for student in students:
+            run(bot.run_command(MockMessage("!q join", student)))
+
+        # Only logged when the queue changed since the last one
+        self.assertTrue(bot.log_snapshot())
+        self.assertFalse(bot.log_snapshot())
+        snapshot, = bot.logger.events("snapshot")
+        self.assertEqual(snapshot["queue"], [s.id for s in students])
+        self.assertEqual(snapshot["queue_length"], 3)
+
+    def test_text_mode(self):
+        bot = self.make_bot(LOG_FORMAT="text")
+        students = get_n_rand(ALL_STUDENTS, 2)
+        for student in students:
+            run(bot.run_command(MockMessage("!q join", student)))
+        # The queue is no longer logged on every change
+        self.assertEqual(bot.logger.lines, ["Queue length: 1", "Queue length: 2"])
+        self.assertTrue(bot.log_snapshot())
+        self.assertTrue(bot.logger.lines[-1].startswith("Queue state: "))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import unittest
+import unittest.mock
+from .utils import *
+
+from queuebot import CmdPrefix, DiscordUser, MAX_IMPORT_ROWS, export_queue, import_queue, iter_json_array
+
+
+class ExportTest(BotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.students = get_n_rand(ALL_STUDENTS, 5)
+        self.ta = get_rand_element(ALL_TAS)
+
+    def command(self, text, author, attachments=()):
+        """
+        Returns: every reply as a SendRecord (so tests can read the files sent)
+        """
+        self.transport.sent.clear()
+        message = MockMessage(text, author)
+        message.attachments = list(attachments)
+        run(self.bot.run_command(message))
+        return list(self.transport.sent)
+
+    def export(self, file_format):
+        sent = self.command(f"!q export {file_format}", self.ta)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0].message_type, CmdPrefix.SUCCESS)
+        self.assertTrue(sent[0].file.filename.endswith("." + file_format))
+        return sent[0].file.fp.read()
+
+    def test_export_csv(self):
+        for student in self.students[:3]:
+            self.command("!q join", student)
+        rows = list(csv.DictReader(io.StringIO(self.export("csv").decode())))
+        self.assertEqual([int(row["uuid"]) for row in rows], [s.id for s in self.students[:3]])
+        self.assertEqual([row["position"] for row in rows], ["1", "2", "3"])
+        self.assertTrue(all(row["join_time"] for row in rows))
+
+    def test_export_json(self):
+        self.assertEqual(json.loads(self.export("json")), [])
+        self.command("!q join", self.students[0])
+        rows = json.loads(self.export("json"))
+        self.assertEqual([row["uuid"] for row in rows], [self.students[0].id])
+        self.assertEqual(rows[0]["name"], self.students[0].name)
+
+    def test_export_requires_ta(self):
+        sent = self.command("!q export", self.students[0])
+        self.assertIsNone(sent[0].file)
+
+    def test_export_invalid_format(self):
+        sent = self.command("!q export xml", self.ta)
+        self.assertEqual(sent[0].message_type, CmdPrefix.WARNING)
+        self.assertIsNone(sent[0].file)
+
+    def test_round_trip(self):
+        for student in self.students:
+            self.command("!q join", student)
+        join_times = [q_user.join_time for q_user in self.bot._queue]
+        for file_format in ("csv", "json"):
+            data = self.export(file_format)
+            self.command("!q clear", self.ta)
+            self.assertEqual(len(self.bot._queue), 0)
+
+            sent = self.command("!q import", self.ta, [MockAttachment(f"queue.{file_format}", data)])
+            self.assertEqual([r.text for r in sent], [
+                f"✅ {self.ta.get_mention()} imported 5 people from queue.{file_format} (positions #1-#5)"])
+            self.assertEqual([q_user.uuid for q_user in self.bot._queue], [s.id for s in self.students])
+            for imported, join_time in zip([q_user.join_time for q_user in self.bot._queue], join_times):
+                self.assertAlmostEqual(imported, join_time, places=3)
+
+    def test_import_skips_queued_and_invalid(self):
+        a, b, c = self.students[:3]
+        self.command("!q join", a)
+        data = (f"position,uuid,name,discriminator,nick,join_time\n"
+                f"3,{c.id},{c.name},{c.discriminator},,\n"
+                f"1,{a.id},{a.name},{a.discriminator},,\n"
+                f"2,not-a-number,x,0000,,\n"
+                f"2,{b.id},{b.name},{b.discriminator},{b.nick or ''},\n"
+                f"4,{b.id},{b.name},{b.discriminator},,\n").encode()
+        sent = self.command("!q import", self.ta, [MockAttachment("queue.csv", data)])
+        self.assertEqual([r.text for r in sent], [
+            f"✅ {self.ta.get_mention()} imported 2 people from queue.csv (positions #2-#3). "
+            f"1 already in the queue. Skipped 1 invalid row"])
+        self.assertEqual([q_user.uuid for q_user in self.bot._queue], [a.id, b.id, c.id])
+
+    def test_import_errors(self):
+        sent = self.command("!q import", self.ta)
+        self.assertEqual(sent[0].message_type, CmdPrefix.ERROR)
+        sent = self.command("!q import", self.ta, [MockAttachment("queue.json", b"{\"uuid\": 1}")])
+        self.assertEqual(sent[0].message_type, CmdPrefix.ERROR)
+        sent = self.command("!q import", self.ta, [MockAttachment("queue.json", b"not json")])
+        self.assertEqual(sent[0].message_type, CmdPrefix.ERROR)
+        self.assertEqual(len(self.bot._queue), 0)
+
+    def test_export_streams_to_file(self):
+        users = [DiscordUser(i, f"user{i}", "0001", None) for i in range(1, 1001)]
+        fp = io.BytesIO()
+        self.assertEqual(export_queue(iter(users), fp, "json"), 1000)
+        fp.seek(0)
+        imported, invalid = import_queue(fp, "json")
+        self.assertEqual(invalid, 0)
+        self.assertEqual([q_user.uuid for q_user in imported], list(range(1, 1001)))
+
+    def test_export_file_closed(self):
+        files = []
+        with unittest.mock.patch("tempfile.TemporaryFile", side_effect=lambda: files.append(io.BytesIO()) or files[-1]):
+            self.assertEqual(json.loads(self.export("json")), [])
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].closed)
+
+    def test_iter_json_array(self):
+        for data in ('[]', ' [ ] ', '[{"a": [1, "]"]}, 2 ,"x"]', '[\n{"a": 1},\n{"b": 2}\n]\n'):
+            self.assertEqual(list(iter_json_array(io.StringIO(data), chunk_size=3)), json.loads(data))
+        for data in ('', '{"uuid": 1}', '[1 2]', '[1,', '[{"a": }]'):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(io.StringIO(data), chunk_size=3))
+
+    def test_import_row_limit(self):
+        fp = io.BytesIO(("[" + ",".join(['{"uuid": 1, "name": "a"}'] * (MAX_IMPORT_ROWS + 1)) + ",not json").encode())
+        with self.assertRaisesRegex(ValueError, "more than"):
+            import_queue(fp, "json")
+
+
+if __name__ == "__main__":
+    unittest.main()
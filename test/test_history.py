@@ -0,0 +1,124 @@
+import io
+import sys
+import time
+import unittest
+import asyncio
+import random
+from contextlib import redirect_stdout
+from .utils import *
+
+from queuebot import QueueBot, QueueConfig, DiscordUser, RingBuffer, QueueHistory, sparkline
+
+config = {
+    "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "False",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+}
+config = QueueConfig(config, test_mode=True)
+
+russ = MockAuthor("Russ", None, ["UGTA"])
+
+# Start of a day (so minute/hour/day samples line up)
+DAY = 1600000000 - 1600000000 % 86400
+
+
+class QueueTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(SEED)
+        self.config = config.copy()
+        self.bot = QueueBot(self.config, None, testing=True)
+        self.bot.logger = MockLogger()
+
+    def test_ring_buffer(self):
+        ring = RingBuffer(3)
+        self.assertIsNone(ring.last())
+        for i in range(5):
+            ring.append(i)
+        self.assertEqual(list(ring), [2, 3, 4])
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring.last(), 4)
+
+        ring.replace_last(10)
+        self.assertEqual(list(ring), [2, 3, 10])
+
+    def test_downsample(self):
+        history = QueueHistory()
+        history.record(3, DAY + 10)
+        history.record(8, DAY + 20)
+        history.record(1, DAY + 50)
+        history.record(2, DAY + 3600 + 5)
+
+        minutes = list(history.tiers["minutes"][1])
+        self.assertEqual(minutes, [(DAY, 8, 1), (DAY + 3600, 2, 2)])
+        self.assertEqual(list(history.tiers["hours"][1]), [(DAY, 8, 1), (DAY + 3600, 2, 2)])
+        self.assertEqual(list(history.tiers["days"][1]), [(DAY, 8, 2)])
+
+        # Minutes without changes repeat the last length
+        series = history.series("minutes", 61, now=DAY + 3600 + 5)
+        self.assertEqual(series[0], (DAY, 8))
+        self.assertEqual([peak for _, peak in series[1:60]], [1] * 59)
+        self.assertEqual(series[60], (DAY + 3600, 2))
+
+        # Nothing is known before the first sample
+        series = history.series("minutes", 3, now=DAY)
+        self.assertEqual([peak for _, peak in series], [None, None, 8])
+
+    def test_bounded(self):
+        history = QueueHistory({"minutes": (60, 10)})
+        for i in range(1000):
+            history.record(i % 7, DAY + i * 60)
+        self.assertEqual(len(history.tiers["minutes"][1]), 10)
+
+        # A new interval starts at the previous length (the queue had it until the change)
+        self.assertEqual(history.series("minutes", 1, now=DAY + 999 * 60), [(DAY + 999 * 60, 5)])
+
+    def test_sparkline(self):
+        self.assertEqual(sparkline([0, 1, 2, 3, 4, 5, 6, 7]), "▁▂▃▄▅▆▇█")
+        self.assertEqual(sparkline([None, 0, 0]), " ▁▁")
+        self.assertEqual(sparkline([]), "")
+
+    def test_history_command(self):
+        message = MockMessage("!q history", russ)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            self.assertEqual(f"SEND: {russ.get_mention()} no queue history yet\n", buf.getvalue())
+
+        now = time.time()
+        self.bot.history.record(4, now - 300)
+        self.bot.history.record(7, now - 120)
+        self.bot.history.record(2, now)
+
+        message = MockMessage("!q history", russ)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            output = buf.getvalue()
+        self.assertIn("queue length over the last 60 minutes (peak 7 at", output)
+        # The minute with the change to 2 peaked at 7 (the length before the change)
+        self.assertIn("```\n" + " " * 54 + "▅▅▅███\n", output)
+
+        for tier in ["hour", "days"]:
+            message = MockMessage(f"!q history {tier}", russ)
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.queue_command(message))
+                self.assertIn("peak 7 at", buf.getvalue())
+
+        message = MockMessage("!q history weeks", russ)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            self.assertIn("invalid format", buf.getvalue())
+
+    def test_history_ta_only(self):
+        student = get_rand_element(ALL_STUDENTS)
+        message = MockMessage("!q history", student)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            self.assertIn("invalid format", buf.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
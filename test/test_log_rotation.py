@@ -0,0 +1,91 @@
+import os
+import time
+import gzip
+import logging
+import tempfile
+import unittest
+
+from queuebot import CompressingRotatingFileHandler, log_segments, read_logs
+
+
+class LogRotationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queuebot.log")
+        self.logger = logging.getLogger("queuebot.test_log_rotation")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.handlers = []
+
+    def tearDown(self):
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+            handler.close()
+        self.tmp.cleanup()
+
+    def add_handler(self, **kwargs):
+        handler = CompressingRotatingFileHandler(self.path, **kwargs)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+        self.handlers.append(handler)
+        return handler
+
+    def log_lines(self, count, start=0):
+        for i in range(start, start + count):
+            self.logger.info(f"line {i:05d} " + "x" * 50)
+
+    def test_compressed_segments(self):
+        handler = self.add_handler(max_bytes=1000, archive_bytes=0, archive_days=0)
+        self.log_lines(200)
+        handler.close()
+
+        segments = log_segments(self.path)
+        self.assertGreater(len(segments), 5)
+        self.assertTrue(all(segment.endswith(".gz") for segment in segments))
+        with gzip.open(segments[0], "rt") as f:
+            self.assertEqual(f.readline().split()[:2], ["line", "00000"])
+
+        # Every line comes back in order from the compressed segments and the current file
+        lines = [line.split()[1] for line in read_logs(self.path)]
+        self.assertEqual(lines, [f"{i:05d}" for i in range(200)])
+
+    def test_uncompressed_segments(self):
+        # Segments compressed after a crash
+        with open(self.path + ".20240101-120000-000000", "w") as f:
+            f.write("line 00000 from before the crash\n")
+        self.assertEqual(len(list(read_logs(self.path))), 1)
+
+        handler = self.add_handler(max_bytes=1000)
+        self.log_lines(5, start=1)
+        handler.close()
+        self.assertEqual(log_segments(self.path), [self.path + ".20240101-120000-000000.gz"])
+        self.assertEqual([line.split()[1] for line in read_logs(self.path)], ["00000", "00001", "00002", "00003", "00004", "00005"])
+
+    def test_retention_size(self):
+        handler = self.add_handler(max_bytes=1000, archive_bytes=500, archive_days=0)
+        self.log_lines(300)
+        handler.close()
+
+        segments = log_segments(self.path)
+        self.assertLessEqual(sum(os.path.getsize(segment) for segment in segments), 500)
+        # The newest lines are kept
+        lines = [line.split()[1] for line in read_logs(self.path)]
+        self.assertEqual(lines[-1], "00299")
+        self.assertNotEqual(lines[0], "00000")
+
+    def test_retention_age(self):
+        old = self.path + ".20240101-120000-000000.gz"
+        with gzip.open(old, "wt") as f:
+            f.write("line 00000 very old\n")
+        week_ago = time.time() - 7 * 24 * 3600
+        os.utime(old, (week_ago, week_ago))
+
+        handler = self.add_handler(max_bytes=1000, archive_bytes=0, archive_days=3)
+        self.log_lines(30)
+        handler.close()
+        self.assertFalse(os.path.exists(old))
+        self.assertGreater(len(log_segments(self.path)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
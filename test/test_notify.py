@@ -0,0 +1,130 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from .utils import *
+
+from queuebot import MAX_NOTIFY_POSITION
+
+
+class NotifyTest(BotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.students = get_n_rand(ALL_STUDENTS, 8)
+        self.ta = get_rand_element(ALL_TAS)
+        self.dms = {}
+        for student in self.students:
+            student.dms_open = True
+            self.dms[student.id] = run(student.create_dm())
+            self.bot._dm_channels[student.id] = self.dms[student.id]
+
+    def command(self, text, author, mentions=None):
+        super().command(text, author, mentions)
+        # Let the notifications go out
+        run(asyncio.sleep(0.01))
+        return self.transport.texts()
+
+    def test_join_notify(self):
+        a, b, c, d = self.students[:4]
+        for student in (a, b, c):
+            self.command("!q join", student)
+        replies = self.command("!q join notify 2", d)
+        self.assertTrue(replies[0].endswith("*You will get a Direct Message once you are at position #2*"))
+        self.assertEqual(self.bot._notify_at, {d.id: 2})
+
+        self.command("!q next", self.ta)
+        self.assertEqual(self.dms[d.id].sent, [])
+        self.command("!q leave", b)
+        self.assertEqual(self.dms[d.id].sent, ["You are now at position #2 in the queue. Please get ready"])
+        self.assertEqual(self.bot._notify_at, {})
+
+        # Only sent once
+        self.command("!q next", self.ta)
+        self.assertEqual(len(self.dms[d.id].sent), 1)
+
+    def test_batched_notifications(self):
+        front = self.students[:3]
+        watchers = self.students[3:6]
+        for student in front:
+            self.command("!q join", student)
+        for student in watchers:
+            self.command("!q join notify 3", student)
+
+        # One pop of three moves every watcher to their position
+        self.command("!q next 3", self.ta)
+        for position, student in enumerate(watchers, start=1):
+            self.assertEqual(self.dms[student.id].sent, [f"You are now at position #{position} in the queue. Please get ready"])
+        self.assertIsNone(self.bot._notify_task)
+
+    def test_closed_dms(self):
+        a, b, c = self.students[:3]
+        self.command("!q join", a)
+        self.command("!q join notify 1", b)
+        self.command("!q join notify 1", c)
+        for student in (b, c):
+            student.dms_open = False
+        replies = self.command("!q front " + c.get_mention(), self.ta, [c])
+        self.assertEqual(self.dms[c.id].sent, [])
+        # Mentioned in the channel instead
+        self.assertEqual(replies[-1], f"⚠️ {c.get_mention()} you are almost at the front of the queue")
+        self.assertEqual(self.bot._notify_at, {b.id: 1})
+
+    def test_already_close(self):
+        a, b = self.students[:2]
+        self.command("!q join", a)
+        replies = self.command("!q join notify 3", b)
+        self.assertTrue(replies[0].endswith("*You are already within the first 3*"))
+        self.assertEqual(self.bot._notify_at, {})
+
+        # Students already in the queue can ask to be told
+        self.command("!q join", self.students[2])
+        self.command("!q join", self.students[3])
+        replies = self.command("!q join notify 2", self.students[3])
+        self.assertIn("you are already in the queue at position #4", replies[0])
+        self.assertEqual(self.bot._notify_at, {self.students[3].id: 2})
+
+    def test_invalid(self):
+        for text in ("!q join foo bar", "!q join notify", "!q join notify 0", "!q join notify three", f"!q join notify {MAX_NOTIFY_POSITION + 1}"):
+            replies = self.command(text, self.students[0])
+            self.assertIn("invalid syntax", replies[0])
+        self.assertEqual(len(self.bot._queue), 0)
+
+    def test_cleanup(self):
+        a, b, c = self.students[:3]
+        self.command("!q join", a)
+        self.command("!q join notify 1", b)
+        self.command("!q join notify 1", c)
+        self.command("!q remove " + b.get_mention(), self.ta, [b])
+        self.assertEqual(self.bot._notify_at, {c.id: 1})
+        self.command("!q clear", self.ta)
+        self.assertEqual(self.bot._notify_at, {})
+
+    def test_only_front_checked(self):
+        for student in self.students[:2]:
+            self.command("!q join", student)
+        watcher = self.students[2]
+        self.command("!q join notify 1", watcher)
+        # Everyone past MAX_NOTIFY_POSITION is never looked at
+        heads = []
+        head = self.bot._queue.head
+        self.bot._queue.head = lambda count: heads.append(count) or head(count)
+        self.command("!q next", self.ta)
+        self.assertEqual(heads, [MAX_NOTIFY_POSITION])
+        self.command("!q next", self.ta)
+        self.assertEqual(len(self.dms[watcher.id].sent), 1)
+        del self.bot._queue.head
+
+    def test_state_file(self):
+        a, b = self.students[:2]
+        self.command("!q join", a)
+        self.command("!q join notify 1", b)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "queue.json")
+            self.bot.save_state(path)
+            bot = self.make_bot()
+            self.assertTrue(bot.load_state(path))
+        self.assertEqual(bot._notify_at, {b.id: 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
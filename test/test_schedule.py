@@ -0,0 +1,151 @@
+import os
+import time
+import unittest
+import unittest.mock
+import datetime
+from .utils import *
+
+from queuebot import QueueBot, QueueState, OfficeHours, ConfigError, CmdPrefix
+
+SCHEDULE = {
+    "OFFICE_HOURS": ["Mon 14:00-16:00", "Wednesday 9:30-11:00"],
+    "CLOSING_MINUTES": "10",
+}
+config = make_config(**SCHEDULE)
+
+# 2024-01-01 was a Monday
+MONDAY = datetime.datetime(2024, 1, 1)
+
+
+def at(day, hour, minute=0):
+    return MONDAY + datetime.timedelta(days=day, hours=hour, minutes=minute)
+
+
+class OfficeHoursTest(unittest.TestCase):
+    def test_states(self):
+        hours = OfficeHours(config.OFFICE_HOURS, 10)
+        self.assertEqual(hours.state(at(0, 13, 59))[:2], (QueueState.CLOSED, 60))
+        self.assertEqual(hours.state(at(0, 14))[:2], (QueueState.OPEN, 110 * 60))
+        self.assertEqual(hours.state(at(0, 15, 50))[:2], (QueueState.CLOSING, 10 * 60))
+
+        # Next session is Wednesday morning
+        state, delay, next_open = hours.state(at(0, 16))
+        self.assertEqual(state, QueueState.CLOSED)
+        self.assertEqual(next_open, at(2, 9, 30))
+        self.assertEqual(delay, (next_open - at(0, 16)).total_seconds())
+
+        # Wraps around to next week
+        state, _, next_open = hours.state(at(4, 12))
+        self.assertEqual(next_open, at(7, 14))
+
+    def test_invalid(self):
+        for entries in (["Funday 14:00-16:00"], ["Mon 14:00"], ["Mon 16:00-14:00"], ["Mon 25:00-26:00"]):
+            with self.assertRaises(ConfigError):
+                make_config(**dict(SCHEDULE, OFFICE_HOURS=entries))
+
+        with self.assertRaises(ConfigError):
+            make_config(**dict(SCHEDULE, CLOSING_MINUTES="soon"))
+
+    def test_no_schedule(self):
+        bot = QueueBot(make_config(), None, testing=True)
+        bot.reset_schedule()
+        self.assertIs(bot.queue_state, QueueState.OPEN)
+        self.assertIsNone(bot._schedule_timer)
+
+
+class ScheduleTest(BotTestCase):
+    config_changes = SCHEDULE
+
+    def setUp(self):
+        super().setUp()
+        self.channel, = self.bot.listen_channels
+
+    def tearDown(self):
+        if self.bot._schedule_timer is not None:
+            self.bot._schedule_timer.cancel()
+
+    def join(self, student):
+        self.transport.sent.clear()
+        run(self.bot.run_command(MockMessage("!q join", student)))
+        return self.transport.sent[-1]
+
+    def test_closed_join(self):
+        self.bot.reset_schedule(at(0, 12))
+        self.assertIs(self.bot.queue_state, QueueState.CLOSED)
+
+        student = get_rand_element(ALL_STUDENTS)
+        record = self.join(student)
+        self.assertEqual(record.message_type, CmdPrefix.WARNING)
+        self.assertEqual(record.content, f"{student.get_mention()} the queue is closed. Office hours start again Mon Jan 01 at 14:00")
+        self.assertEqual(len(self.bot._queue), 0)
+
+        # TAs can still add people
+        run(self.bot.run_command(MockMessage(f"!q add {student.get_mention()}", get_rand_element(ALL_TAS), [student])))
+        self.assertEqual(len(self.bot._queue), 1)
+
+    def test_session(self):
+        wumpus, quirky, cyber = get_n_rand(ALL_STUDENTS, 3)
+        self.bot.reset_schedule(at(0, 13))
+        self.transport.sent.clear()
+
+        # Opening sends the queue list rendered when the schedule was loaded
+        self.assertIs(run(self.bot.advance_schedule(at(0, 14))), QueueState.OPEN)
+        record, = self.transport.sent
+        self.assertEqual(record.content, "Office hours have started. Type `!q join` to join the queue")
+        self.assertEqual(record.embed.description, "Total in queue: 0")
+
+        self.assertEqual(self.join(wumpus).message_type, CmdPrefix.SUCCESS)
+        self.assertEqual(self.join(quirky).message_type, CmdPrefix.SUCCESS)
+
+        # Closing: no new students, but TAs keep going
+        self.transport.sent.clear()
+        self.assertIs(run(self.bot.advance_schedule(at(0, 15, 50))), QueueState.CLOSING)
+        self.assertEqual(self.transport.texts(), ["⚠️ Office hours end in 10 minutes. The queue is closed to new students"])
+        self.assertIn("ending soon", self.join(cyber).content)
+        run(self.bot.run_command(MockMessage("!q next", get_rand_element(ALL_TAS))))
+        self.assertEqual(len(self.bot._queue), 1)
+
+        # Closed: the rest of the queue is removed in one message
+        self.transport.sent.clear()
+        self.assertIs(run(self.bot.advance_schedule(at(0, 16))), QueueState.CLOSED)
+        self.assertEqual(len(self.bot._queue), 0)
+        record, = self.transport.sent
+        self.assertEqual(record.content, f"Office hours are over and the queue is closed. Removed from the queue: {quirky.get_mention()}")
+        self.assertIsNotNone(self.bot._open_board)
+
+        # Same state again does nothing
+        self.transport.sent.clear()
+        self.assertIs(run(self.bot.advance_schedule(at(0, 17))), QueueState.CLOSED)
+        self.assertEqual(len(self.transport.sent), 0)
+
+        self.assertIs(run(self.bot.advance_schedule(at(2, 9, 30))), QueueState.OPEN)
+        self.assertIsNone(self.bot._open_board)
+
+    def test_dst_change(self):
+        # Clocks went forward on Sunday 2024-03-10 in New York: Saturday noon to Monday 14:00 is one hour shorter
+        with unittest.mock.patch.dict(os.environ, {"TZ": "America/New_York"}):
+            time.tzset()
+            try:
+                self.bot.reset_schedule(datetime.datetime(2024, 3, 9, 12))
+                delay = self.bot._schedule_timer.when() - self.bot.loop.time()
+            finally:
+                self.bot._schedule_timer.cancel()
+                self.bot._schedule_timer = None
+        time.tzset()
+        self.assertAlmostEqual(delay, (2 * 24 + 2 - 1) * 3600, delta=1)
+
+    def test_board_rerendered(self):
+        # A queue change while closed makes the opening board render again
+        self.bot.reset_schedule(at(0, 12))
+        run(self.bot.close_queue(None))
+        student = get_rand_element(ALL_STUDENTS)
+        run(self.bot.run_command(MockMessage(f"!q add {student.get_mention()}", get_rand_element(ALL_TAS), [student])))
+        self.assertIsNone(self.bot._open_board)
+
+        self.transport.sent.clear()
+        run(self.bot.advance_schedule(at(0, 14)))
+        self.assertEqual(self.transport.sent[0].embed.description, "Total in queue: 1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+import asyncio
+import random
+import discord
+from .utils import *
+from .fake_discord import FakeDiscord
+
+from queuebot import QueueBot, QueueConfig, DiscordUser
+
+config_dict = {
+    "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "False",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+}
+
+
+class QueueTest(unittest.TestCase):
+    """
+    Shuts down/hands over real QueueBots connected to a local fake Discord server
+    """
+    def setUp(self):
+        random.seed(SEED)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.tmp.name, "queue.json")
+        self.config = QueueConfig(dict(config_dict, STATE_FILE=self.state_file,
+                                       LOCK_FILE=os.path.join(self.tmp.name, "queuebot.lock")), test_mode=True)
+
+        self.fake = FakeDiscord()
+        self.fake.add_role("UGTA")
+        self.fake.add_text_channel("join-queue")
+        self.ta = self.fake.add_user("Russ", ["UGTA"])
+        self.students = self.fake.add_users(5)
+
+        self.url = run(self.fake.start())
+        self.old_base = discord.http.Route.BASE
+        discord.http.Route.BASE = self.url + "/api/v7"
+        self.bots = []
+
+    def tearDown(self):
+        for bot, task in self.bots:
+            run(bot.close())
+            run(task)
+        run(self.fake.stop())
+        discord.http.Route.BASE = self.old_base
+        self.tmp.cleanup()
+
+    def start_bot(self, wait=True):
+        bot = QueueBot(self.config.copy(), MockLogger(), guild_ready_timeout=0.05)
+        bot.api_url = self.url + "/api/v8"
+        task = asyncio.get_event_loop().create_task(bot.start(self.config.SECRET_TOKEN))
+        self.bots.append((bot, task))
+        if wait:
+            run(self.fake.wait_until(lambda: bot.is_initialized))
+        return bot
+
+    def command(self, user, content):
+        expected = len(self.fake.sent) + 1
+
+        async def send():
+            await self.fake.send_message(user, "join-queue", content)
+            await self.fake.wait_until(lambda: len(self.fake.sent) >= expected)
+        run(send())
+        return self.fake.sent[-1].content
+
+    def test_shutdown_saves_queue(self):
+        bot = self.start_bot()
+        for student in self.students[:3]:
+            self.command(student, "!q join")
+
+        run(bot.shutdown())
+        self.assertTrue(bot.is_closed())
+
+        with open(self.state_file) as f:
+            state = json.load(f)
+        self.assertEqual([u["uuid"] for u in state["queue"]], [int(s["id"]) for s in self.students[:3]])
+
+    def test_shutdown_drains_commands(self):
+        bot = self.start_bot()
+        # Hold the reply back so the command is still running when the shutdown starts
+        self.fake.rate_limit(count=1, retry_after=0.2)
+
+        async def join_then_shutdown():
+            await self.fake.send_message(self.students[0], "join-queue", "!q join")
+            await self.fake.wait_until(lambda: bot._running_commands == 1)
+            shutdown = asyncio.ensure_future(bot.shutdown())
+            await asyncio.sleep(0)
+            # New commands are ignored once shutting down
+            await self.fake.send_message(self.students[1], "join-queue", "!q join")
+            await shutdown
+        run(join_then_shutdown())
+
+        self.assertEqual(len(self.fake.sent), 1)
+        self.assertIn(str(self.students[0]["id"]), self.fake.sent[0].content)
+        self.assertEqual(len(bot._queue), 1)
+
+        with open(self.state_file) as f:
+            self.assertEqual(len(json.load(f)["queue"]), 1)
+
+    def test_standby_takes_over(self):
+        active = self.start_bot()
+        for student in self.students[:2]:
+            self.command(student, "!q join")
+
+        standby = self.start_bot(wait=False)
+        run(asyncio.sleep(0.2))
+        self.assertFalse(standby.is_initialized)
+        self.assertEqual(self.fake.identifies, 1)
+
+        run(active.shutdown())
+        run(self.fake.wait_until(lambda: standby.is_initialized))
+        self.assertEqual(self.fake.identifies, 2)
+        self.assertEqual([u.uuid for u in standby._queue], [int(s["id"]) for s in self.students[:2]])
+
+        reply = self.command(self.students[1], "!q position")
+        self.assertIn("you are at position #2", reply)
+
+    def test_load_bad_state(self):
+        with open(self.state_file, "w") as f:
+            f.write("{ not json")
+
+        bot = QueueBot(self.config.copy(), MockLogger(), testing=True)
+        self.assertFalse(bot.load_state(self.state_file))
+        self.assertEqual(len(bot._queue), 0)
+        self.assertFalse(bot.load_state(os.path.join(self.tmp.name, "missing.json")))
+
+
+if __name__ == '__main__':
+    unittest.main()
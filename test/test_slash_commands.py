@@ -0,0 +1,153 @@
+import io
+import sys
+import unittest
+import asyncio
+from contextlib import redirect_stdout
+from aiohttp import web
+from .utils import *
+
+from queuebot import INTERACTION_FLAG_EPHEMERAL
+
+class InteractionsStandIn:
+    """
+    Local stand-in for Discord's interaction endpoints. Records every
+    interaction response and followup message it receives
+    """
+    def __init__(self):
+        self.responses = []
+        self.followups = []
+        self.runner = None
+
+    async def respond(self, request):
+        self.responses.append(await request.json())
+        return web.Response(status=204)
+
+    async def followup(self, request):
+        self.followups.append(await request.json())
+        return web.json_response({})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/interactions/{id}/{token}/callback", self.respond)
+        app.router.add_post("/webhooks/{app_id}/{token}", self.followup)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class QueueTest(BotTestCase):
+    config_changes = {"SLASH_COMMANDS": "True"}
+    # Not in testing mode so replies go through the interaction endpoint
+    transport_class = None
+    testing = False
+
+    def setUp(self):
+        super().setUp()
+        self.bot.is_initialized = True
+
+        self.guild = MockGuild(["UGTA"])
+        self.channel = MockChannel("join-queue")
+        self.other_channel = MockChannel("general")
+        # Same name as a listen channel but not the channel the config was resolved to
+        self.same_name = MockChannel("join-queue")
+        channels = {c.id: c for c in (self.channel, self.other_channel, self.same_name)}
+        self.bot.listen_channels = [self.channel]
+        self.bot.listen_channel_ids = frozenset([self.channel.id])
+        self.bot.get_guild = lambda guild_id: self.guild
+        self.bot.get_channel = lambda channel_id: channels.get(channel_id)
+
+        self.standin = InteractionsStandIn()
+        self.bot.api_url = run(self.standin.start())
+
+    def tearDown(self):
+        run(self.bot.close())
+        run(self.standin.stop())
+
+    def interaction(self, author, subcommand, channel=None, user=None):
+        channel = channel if channel is not None else self.channel
+        roles = [str(self.guild.get_role_id(r.name)) for r in author.roles]
+        raw_user = lambda u: {"id": str(u.id), "username": u.name, "discriminator": u.discriminator}
+
+        option = {"type": 1, "name": subcommand}
+        data = {"name": "q", "options": [option]}
+        if user is not None:
+            option["options"] = [{"type": 6, "name": "user", "value": str(user.id)}]
+            data["resolved"] = {"users": {str(user.id): raw_user(user)}}
+
+        return {
+            "id": str(gen_id(18)),
+            "application_id": "1234",
+            "type": 2,
+            "token": "interaction-token",
+            "guild_id": str(self.guild.id),
+            "channel_id": str(channel.id),
+            "member": {"user": raw_user(author), "roles": roles, "nick": author.nick},
+            "data": data,
+        }
+
+    def run_interaction(self, *args, **kwargs):
+        run(self.bot.on_socket_response({"t": "INTERACTION_CREATE", "d": self.interaction(*args, **kwargs)}))
+        return self.standin.responses[-1]
+
+    def test_join_is_public(self):
+        student = get_rand_element(ALL_STUDENTS)
+        response = self.run_interaction(student, "join")
+
+        self.assertEqual(len(self.bot._queue), 1)
+        self.assertEqual(response["type"], 4)
+        self.assertNotIn("flags", response["data"])
+        self.assertTrue(response["data"]["content"].startswith(
+            f"✅ {student.get_mention()} you have been added at position #1"))
+
+    def test_read_only_is_ephemeral(self):
+        students = get_n_rand(ALL_STUDENTS, 3)
+        for s in students:
+            self.run_interaction(s, "join")
+
+        response = self.run_interaction(students[1], "position")
+        self.assertEqual(response["data"]["flags"], INTERACTION_FLAG_EPHEMERAL)
+        self.assertEqual(response["data"]["content"], f"{students[1].get_mention()} you are at position #2")
+
+        response = self.run_interaction(students[0], "count")
+        self.assertEqual(response["data"]["flags"], INTERACTION_FLAG_EPHEMERAL)
+        self.assertEqual(response["data"]["content"], f"{students[0].get_mention()} there are 3 people in the queue")
+
+        response = self.run_interaction(students[2], "list")
+        self.assertEqual(response["data"]["flags"], INTERACTION_FLAG_EPHEMERAL)
+        self.assertEqual(response["data"]["embeds"][0]["description"], "Total in queue: 3")
+
+    def test_ta_commands(self):
+        ta = get_rand_element(ALL_TAS)
+        student = get_rand_element(ALL_STUDENTS)
+
+        response = self.run_interaction(ta, "add", user=student)
+        self.assertEqual(list(self.bot._queue), [student.id])
+        self.assertTrue(response["data"]["content"].endswith("the person has been added at position #1"))
+
+        response = self.run_interaction(ta, "next")
+        self.assertEqual(len(self.bot._queue), 0)
+        self.assertTrue(response["data"]["content"].startswith(f"The next person is {student.get_mention()}"))
+
+    def test_student_cannot_run_ta_commands(self):
+        wumpus, quirky = get_n_rand(ALL_STUDENTS, 2)
+        self.run_interaction(quirky, "join")
+
+        self.run_interaction(wumpus, "next")
+        self.assertEqual(len(self.bot._queue), 1)
+
+    def test_other_channel(self):
+        student = get_rand_element(ALL_STUDENTS)
+        for channel in (self.other_channel, self.same_name):
+            response = self.run_interaction(student, "join", channel=channel)
+            self.assertEqual(len(self.bot._queue), 0)
+            self.assertEqual(response["data"]["flags"], INTERACTION_FLAG_EPHEMERAL)
+
+
+if __name__ == '__main__':
+    unittest.main()
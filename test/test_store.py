@@ -0,0 +1,175 @@
+import os
+import unittest
+import tempfile
+from .utils import *
+
+from queuebot import DiscordUser, MemoryStore, SQLiteStore
+
+
+USERS = [DiscordUser(author.id, author.name, author.discriminator, author.nick) for author in ALL_STUDENTS[:6]]
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queue.db")
+        self.stores = [MemoryStore(), SQLiteStore(self.path)]
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.tmp.cleanup()
+
+    def check(self, expected):
+        for store in self.stores:
+            self.assertEqual([q_user.uuid for q_user in store], [q_user.uuid for q_user in expected])
+            self.assertEqual(len(store), len(expected))
+
+    def test_operations(self):
+        a, b, c, d, e, f = USERS
+        for store in self.stores:
+            store.append(a)
+            store.extend([b, c, d])
+        self.check([a, b, c, d])
+
+        for store in self.stores:
+            self.assertIn(c, store)
+            self.assertNotIn(e, store)
+            self.assertEqual(store.index(c), 2)
+            self.assertEqual(store[1].uuid, b.uuid)
+            self.assertEqual(store[-1].uuid, d.uuid)
+            self.assertEqual([q_user.uuid for q_user in store.head(2)], [a.uuid, b.uuid])
+            with self.assertRaises(ValueError):
+                store.index(e)
+            with self.assertRaises(IndexError):
+                store[4]
+
+        for store in self.stores:
+            store.move_to_front([d, e])
+        self.check([d, e, a, b, c])
+
+        for store in self.stores:
+            self.assertEqual(store.popleft().uuid, d.uuid)
+            self.assertEqual([q_user.uuid for q_user in store.popleft_many(2)], [e.uuid, a.uuid])
+        self.check([b, c])
+
+        for store in self.stores:
+            store.extend([d, e, f])
+            store.remove(c)
+            store.remove_ids({d.uuid, f.uuid})
+            with self.assertRaises(ValueError):
+                store.remove(c)
+        self.check([b, e])
+
+        for store in self.stores:
+            store.replace([f, a])
+        self.check([f, a])
+
+        for store in self.stores:
+            store.clear()
+            self.assertEqual(store.popleft_many(3), [])
+            with self.assertRaises(IndexError):
+                store.popleft()
+        self.check([])
+
+    def test_add_discard(self):
+        a, b, c = USERS[:3]
+        for store in self.stores:
+            self.assertEqual(store.add(a), (True, 0))
+            self.assertEqual(store.add(b), (True, 1))
+            self.assertEqual(store.add(a), (False, 0))
+            self.assertEqual(store.find(b), 1)
+            self.assertIsNone(store.find(c))
+            self.assertTrue(store.discard(a))
+            self.assertFalse(store.discard(a))
+            self.assertEqual(store.find(b), 0)
+        self.check([b])
+
+    def test_shared(self):
+        a, b, c = USERS[:3]
+        store = self.stores[1]
+        other = SQLiteStore(self.path)
+        self.stores.append(other)
+
+        self.assertFalse(store.changed())
+        other.extend([a, b])
+        self.assertTrue(store.changed())
+        self.assertFalse(store.changed())
+        self.assertEqual([q_user.uuid for q_user in store], [a.uuid, b.uuid])
+
+        # Own changes are not reported
+        store.append(c)
+        self.assertFalse(store.changed())
+        self.assertTrue(other.changed())
+
+        # Adding someone who is already in the queue does nothing
+        other.append(a)
+        self.assertEqual(len(store), 3)
+
+    def test_rollback(self):
+        a, b = USERS[:2]
+        store = self.stores[1]
+        store.extend([a, b])
+        # Fails after the queue was emptied. Nothing is changed
+        with self.assertRaises(AttributeError):
+            store.replace([a, None])
+        self.assertEqual([q_user.uuid for q_user in store], [a.uuid, b.uuid])
+
+
+class SQLiteBotTest(BotTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queue.db")
+        self.config_changes = {"DATABASE_FILE": self.path}
+        super().setUp()
+
+    def tearDown(self):
+        self.bot._queue.close()
+        self.tmp.cleanup()
+
+    def command(self, text, author, mentions=None):
+        return super().command(text, author, mentions)[-1]
+
+    def test_commands(self):
+        self.assertIsInstance(self.bot._queue, SQLiteStore)
+        wumpus, quirky, cyber = get_n_rand(ALL_STUDENTS, 3)
+        ta = get_rand_element(ALL_TAS)
+
+        self.command("!q join", wumpus)
+        self.command("!q join", quirky)
+        self.assertEqual(self.command("!q position", quirky), f"{quirky.get_mention()} you are at position #2")
+        self.command(f"!q front {cyber.get_mention()}", ta, [cyber])
+        self.assertEqual(self.command("!q next", ta),
+                         f"The next person is {cyber.get_mention()}\nRemaining people in the queue: 2")
+
+        # Another process (ex: a web board) sees the same queue
+        board = SQLiteStore(self.path)
+        self.assertEqual(list(board), [wumpus, quirky])
+        board.remove(wumpus)
+        board.close()
+
+        self.assertTrue(self.bot._queue.changed())
+        self.assertEqual(self.command("!q position", quirky), f"{quirky.get_mention()} you are at position #1")
+        self.command(f"!q remove {quirky.get_mention()}", ta, [quirky])
+        self.assertEqual(len(self.bot._queue), 0)
+
+    def test_other_process_races(self):
+        wumpus, quirky = get_n_rand(ALL_STUDENTS, 2)
+        board = SQLiteStore(self.path)
+        board.append(DiscordUser(quirky.id, quirky.name, quirky.discriminator, quirky.nick))
+
+        # Another process adds the student after "!q join" checked the queue
+        self.bot.config.CHECK_VOICE_WAITING = True
+        self.bot.in_waiting_room = lambda user: board.append(user) is None
+        self.assertEqual(self.command("!q join", wumpus),
+                         f"⚠️ {wumpus.get_mention()} you are already in the queue at position #2")
+
+        # ... or removes them before "!q leave" does
+        board.remove(wumpus)
+        board.close()
+        self.assertEqual(self.command("!q leave", wumpus),
+                         f"⚠️ {wumpus.get_mention()} you can not be removed from the queue because you never joined it")
+
+
+if __name__ == '__main__':
+    unittest.main()
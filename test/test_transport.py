@@ -0,0 +1,116 @@
+import io
+import unittest
+import random
+from contextlib import redirect_stdout
+from .utils import *
+
+import discord
+from queuebot import (QueueBot, QueueConfig, CmdPrefix, SendRecord, Transport, StdoutTransport,
+                      MemoryTransport, NullTransport, DiscordTransport, LocalMessage)
+
+config = {
+    "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "False",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+}
+config = QueueConfig(config, test_mode=True)
+
+
+class TransportTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(SEED)
+        self.transport = MemoryTransport()
+        self.bot = QueueBot(config.copy(), None, testing=True, transport=self.transport)
+        self.bot.logger = MockLogger()
+        self.bot.waiting_room = MockVoice("Waiting Room")
+        self.bot.change_presence = self.change_presence
+
+    async def change_presence(self, **kwargs):
+        pass
+
+    def test_default_transports(self):
+        # Testing mode prints, otherwise messages go to Discord
+        self.assertIsInstance(QueueBot(config.copy(), None, testing=True).transport, StdoutTransport)
+        bot = QueueBot(config.copy(), None)
+        self.assertIsInstance(bot.transport, DiscordTransport)
+        self.assertIs(bot.transport.bot, bot)
+
+    def test_records(self):
+        student = get_rand_element(ALL_STUDENTS)
+        channel = MockChannel("join-queue")
+        message = MockMessage("!q join", student)
+        message.channel = channel
+
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            run(self.bot.queue_command(message))
+            # Nothing is printed
+            self.assertEqual("", buf.getvalue())
+
+        first, second = self.transport.sent
+        self.assertIs(first.channel, channel)
+        self.assertEqual(first.message_type, CmdPrefix.SUCCESS)
+        self.assertEqual(first.text, "✅ " + first.content)
+        self.assertIn(student.get_mention(), first.content)
+        self.assertEqual(second.message_type, CmdPrefix.WARNING)
+        self.assertTrue(second.text.startswith("⚠️ "))
+        self.assertEqual(self.transport.texts(), [first.text, second.text])
+
+        self.transport.sent.clear()
+        ta = get_rand_element(ALL_TAS)
+        message = MockMessage("!q list", ta)
+        run(self.bot.queue_command(message))
+        record, = self.transport.sent
+        self.assertIsNone(record.message_type)
+        self.assertIsInstance(record.embed, discord.Embed)
+
+    def test_memory_maxlen(self):
+        transport = MemoryTransport(maxlen=2)
+        for i in range(5):
+            run(transport.send(SendRecord(None, str(i))))
+        self.assertEqual(transport.texts(), ["3", "4"])
+
+    def test_null(self):
+        transport = NullTransport()
+        self.bot.transport = transport
+        message = MockMessage("!q ping", get_rand_element(ALL_STUDENTS))
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(message))
+            run(self.bot.queue_command(message))
+            self.assertEqual("", buf.getvalue())
+        self.assertEqual(transport.count, 2)
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Transport()
+
+    def test_confirmation(self):
+        # Outside of testing mode "!q clear" asks for a confirmation through any transport
+        self.bot.testing = False
+        self.bot.listen_channels = [MockChannel("join-queue")]
+        ta = get_rand_element(ALL_TAS)
+        run(self.bot.run_command(MockMessage("!q join", get_rand_element(ALL_STUDENTS))))
+        run(self.bot.run_command(MockMessage("!q clear", ta)))
+
+        (message_id, pending), = self.bot._confirmations.items()
+        self.assertIsInstance(pending.message, LocalMessage)
+        self.assertEqual(pending.message.reactions, ["✅", "❌"])
+        run(self.bot.on_raw_reaction_add(MockReactionPayload(pending.message, ta, "✅")))
+        self.assertEqual(pending.message.content, "Queue has been emptied")
+        self.assertEqual(len(self.bot._queue), 0)
+
+    def test_stdout_format(self):
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(StdoutTransport().send(SendRecord(None, "Queue is empty", CmdPrefix.ERROR)))
+            run(StdoutTransport().send(SendRecord(None, None, embed=discord.Embed(title="Queue", description="Empty"))))
+            self.assertEqual("SEND: ‼️ Queue is empty\n"
+                             "SEND: None embed.title='Queue', embed.description=Empty, fields=[]\n", buf.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from .utils import *
+
+from queuebot import DiscordUser, QueueVersion, MemoryStore, UNDO_HISTORY, VERSION_CHUNK_SIZE
+
+
+USERS = [DiscordUser(i, f"user{i}", "0001", None) for i in range(1, 201)]
+
+
+def ids(users):
+    return [q_user.uuid for q_user in users]
+
+
+class QueueVersionTest(unittest.TestCase):
+    def test_versions_are_unchanged(self):
+        store = MemoryStore(USERS[:100])
+        snapshot = store.snapshot()
+        store.popleft_many(3)
+        store.append(USERS[150])
+        store.move_to_front([USERS[50]])
+        store.remove(USERS[10])
+        self.assertEqual(ids(snapshot), ids(USERS[:100]))
+        self.assertEqual(ids(store), [51, 4, 5, 6, 7, 8, 9, 10] + list(range(12, 51)) + list(range(52, 101)) + [151])
+        self.assertEqual(len(store), 97)
+
+    def test_iteration_while_changing(self):
+        store = MemoryStore(USERS[:10])
+        seen = []
+        for q_user in store:
+            seen.append(q_user.uuid)
+            store.popleft_many(1)
+        # Iteration sees the version it started with
+        self.assertEqual(seen, list(range(1, 11)))
+        self.assertEqual(len(store), 0)
+
+    def test_shared_chunks(self):
+        version = QueueVersion.of(USERS)
+        self.assertEqual(len(version.chunks), len(USERS) // VERSION_CHUNK_SIZE + 1)
+        _, popped = version.popleft_many(1)
+        appended = version.append(USERS[0])
+        removed = version.remove_ids({USERS[100].uuid})
+        # Only the chunk that changed is new
+        self.assertEqual(sum(a is not b for a, b in zip(version.chunks[1:], popped.chunks[1:])), 0)
+        self.assertEqual(sum(a is not b for a, b in zip(version.chunks[:-1], appended.chunks[:-1])), 0)
+        self.assertEqual(sum(a is not b for a, b in zip(version.chunks, removed.chunks)), 1)
+
+    def test_lookup(self):
+        version = QueueVersion.of(USERS[:70]).popleft_many(5)[1].extend(USERS[100:110])
+        expected = USERS[5:70] + USERS[100:110]
+        self.assertEqual(len(version), len(expected))
+        for i in (0, 26, 27, 64, 74, -1, -75):
+            self.assertEqual(version[i].uuid, expected[i].uuid)
+        with self.assertRaises(IndexError):
+            version[75]
+        self.assertEqual(version.index(USERS[101]), 66)
+        self.assertIn(USERS[69], version)
+        self.assertNotIn(USERS[0], version)
+
+
+class UndoTest(BotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.students = get_n_rand(ALL_STUDENTS, 6)
+        self.ta = get_rand_element(ALL_TAS)
+
+    def queued(self):
+        return [q_user.uuid for q_user in self.bot._queue]
+
+    def test_undo_next(self):
+        a, b, c, d = self.students[:4]
+        for student in (a, b, c):
+            self.command("!q join", student)
+        self.command("!q next", self.ta)
+        # Changes made since the command are kept
+        self.command("!q join", d)
+        self.command("!q leave", c)
+        replies = self.command("!q undo", self.ta)
+        self.assertEqual(self.queued(), [a.id, b.id, d.id])
+        self.assertEqual(replies, [f"✅ Undid `!q next` by {self.ta.nick or self.ta.name}. Back in the queue: {a.get_mention()}"])
+
+    def test_undo_clear_and_add(self):
+        a, b, c = self.students[:3]
+        self.command("!q join", a)
+        self.command("!q join", b)
+        self.command("!q clear", self.ta)
+        self.assertEqual(self.queued(), [])
+        self.command("!q undo", self.ta)
+        self.assertEqual(self.queued(), [a.id, b.id])
+
+        self.command("!q add " + c.get_mention(), self.ta, [c])
+        replies = self.command("!q undo", self.ta)
+        self.assertEqual(self.queued(), [a.id, b.id])
+        self.assertIn(f"Taken out of the queue: {c.nick or c.name}", replies[0])
+
+    def test_undo_front(self):
+        a, b, c = self.students[:3]
+        for student in (a, b, c):
+            self.command("!q join", student)
+        self.command("!q front " + c.get_mention(), self.ta, [c])
+        self.assertEqual(self.queued(), [c.id, a.id, b.id])
+        self.command("!q undo", self.ta)
+        self.assertEqual(self.queued(), [a.id, b.id, c.id])
+
+    def test_undo_history(self):
+        self.assertIn("nothing to undo", self.command("!q undo", self.ta)[0])
+        # Student commands and commands that change nothing are not recorded
+        self.command("!q join", self.students[0])
+        self.command("!q add " + self.students[0].get_mention(), self.ta, [self.students[0]])
+        self.assertEqual(len(self.bot._undo), 0)
+
+        for _ in range(UNDO_HISTORY + 5):
+            self.command("!q front " + self.students[0].get_mention(), self.ta, [self.students[0]])
+        self.assertEqual(len(self.bot._undo), UNDO_HISTORY)
+
+    def test_undo_forgotten_on_reload_and_close(self):
+        self.command("!q join", self.students[0])
+        self.command("!q next", self.ta)
+        run(self.bot.close_queue(None))
+        self.assertIn("nothing to undo", self.command("!q undo", self.ta)[0])
+
+        self.command("!q join", self.students[0])
+        self.command("!q next", self.ta)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state.json")
+            self.bot.save_state(path)
+            self.assertTrue(self.bot.load_state(path))
+        self.assertIn("nothing to undo", self.command("!q undo", self.ta)[0])
+        self.assertEqual(self.queued(), [])
+
+    def test_undo_requires_ta(self):
+        self.command("!q join", self.students[0])
+        self.command("!q next", self.ta)
+        self.command("!q undo", self.students[1])
+        self.assertEqual(self.queued(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
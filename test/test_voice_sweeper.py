@@ -0,0 +1,166 @@
+import io
+import sys
+import unittest
+import asyncio
+from contextlib import redirect_stdout
+from .utils import *
+
+from queuebot import TimerWheel
+
+class TimerWheelTest(unittest.TestCase):
+    def setUp(self):
+        self.expired = []
+        self.wheel = TimerWheel(asyncio.get_event_loop(), self.on_expire, tick=0.01, slots=8)
+
+    async def on_expire(self, keys):
+        self.expired.append(sorted(keys))
+
+    def test_batches_same_tick(self):
+        async def schedule():
+            self.wheel.schedule("a", 0.03)
+            self.wheel.schedule("b", 0.03)
+            self.wheel.schedule("c", 0.06)
+            await asyncio.sleep(0.15)
+        run(schedule())
+
+        self.assertEqual(self.expired, [["a", "b"], ["c"]])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cancel_and_reschedule(self):
+        async def schedule():
+            self.wheel.schedule("a", 0.03)
+            self.wheel.schedule("b", 0.03)
+            self.assertTrue(self.wheel.cancel("a"))
+            self.assertFalse(self.wheel.cancel("a"))
+            # Rescheduling restarts the timer
+            self.wheel.schedule("b", 0.06)
+            await asyncio.sleep(0.15)
+        run(schedule())
+
+        self.assertEqual(self.expired, [["b"]])
+
+    def test_wraps_around(self):
+        # 8 slots * 0.01s = 0.08s per trip around the wheel
+        async def schedule():
+            self.wheel.schedule("a", 0.2)
+            await asyncio.sleep(0.1)
+            self.assertIn("a", self.wheel)
+            await asyncio.sleep(0.2)
+        run(schedule())
+
+        self.assertEqual(self.expired, [["a"]])
+
+    def test_on_expire_raises(self):
+        errors = []
+
+        async def on_expire(keys):
+            if "a" in keys:
+                raise ValueError("bad key")
+            self.expired.append(keys)
+
+        wheel = TimerWheel(asyncio.get_event_loop(), on_expire, tick=0.01, slots=8,
+                           on_error=lambda keys, e: errors.append((keys, e)))
+
+        async def schedule():
+            wheel.schedule("a", 0.03)
+            wheel.schedule("b", 0.06)
+            await asyncio.sleep(0.15)
+        run(schedule())
+
+        # The wheel kept going after the error
+        self.assertEqual(self.expired, [["b"]])
+        self.assertEqual([keys for keys, _ in errors], [["a"]])
+        self.assertIsNone(wheel._task)
+
+
+class QueueTest(BotTestCase):
+    config_changes = {"CHECK_VOICE_WAITING": "True", "VOICE_WAITING_GRACE": "0.1"}
+    transport_class = None
+
+    def setUp(self):
+        super().setUp()
+        self.bot.waiting_room = MockVoice(self.config.VOICE_WAITING)
+        self.other_room = MockVoice("Office Hours Room 1")
+
+    def join(self, students):
+        for s in students:
+            self.bot.waiting_room.add_member(s)
+            with io.StringIO() as buf, redirect_stdout(buf):
+                run(self.bot.queue_command(MockMessage("!q join", s)))
+
+    def move(self, student, before, after):
+        if before is not None:
+            before.remove_member(student)
+        if after is not None:
+            after.add_member(student)
+        run(self.bot.on_voice_state_update(student, MockVoiceState(before), MockVoiceState(after)))
+
+    def test_removed_after_grace(self):
+        wumpus, quirky, cyber = get_n_rand(ALL_STUDENTS, 3)
+        self.join([wumpus, quirky, cyber])
+
+        self.move(wumpus, self.bot.waiting_room, None)
+        self.move(cyber, self.bot.waiting_room, self.other_room)
+        self.assertEqual(len(self.bot.voice_sweeper), 2)
+
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(asyncio.sleep(0.3))
+            output = buf.getvalue()
+
+        self.assertEqual([u.uuid for u in self.bot._queue], [quirky.id])
+        # Both removals are announced in one message
+        self.assertEqual(output.count("SEND:"), 1)
+        self.assertIn(wumpus.get_mention(), output)
+        self.assertIn(cyber.get_mention(), output)
+
+    def test_returns_in_time(self):
+        wumpus, quirky = get_n_rand(ALL_STUDENTS, 2)
+        self.join([wumpus, quirky])
+
+        self.move(wumpus, self.bot.waiting_room, None)
+        self.move(wumpus, None, self.bot.waiting_room)
+        self.assertEqual(len(self.bot.voice_sweeper), 0)
+
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(asyncio.sleep(0.3))
+            self.assertEqual(buf.getvalue(), "")
+
+        self.assertEqual(len(self.bot._queue), 2)
+
+    def test_not_queued_ignored(self):
+        wumpus = get_rand_element(ALL_STUDENTS)
+        self.bot.waiting_room.add_member(wumpus)
+
+        self.move(wumpus, self.bot.waiting_room, None)
+        self.assertEqual(len(self.bot.voice_sweeper), 0)
+
+    def test_left_queue_during_grace(self):
+        wumpus, quirky = get_n_rand(ALL_STUDENTS, 2)
+        self.join([wumpus, quirky])
+
+        self.move(wumpus, self.bot.waiting_room, None)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(self.bot.queue_command(MockMessage("!q leave", wumpus)))
+            run(asyncio.sleep(0.3))
+            self.assertEqual(buf.getvalue().count("SEND:"), 1)  # Only the leave reply
+
+        self.assertEqual([u.uuid for u in self.bot._queue], [quirky.id])
+
+    def test_waitlist_pruned(self):
+        self.bot.config.CAPACITY = 1
+        wumpus, quirky, cyber = get_n_rand(ALL_STUDENTS, 3)
+        self.join([wumpus, quirky, cyber])
+        self.assertEqual([u.uuid for u in self.bot._waitlist], [quirky.id, cyber.id])
+
+        self.move(quirky, self.bot.waiting_room, None)
+        self.assertEqual(len(self.bot.voice_sweeper), 1)
+        with io.StringIO() as buf, redirect_stdout(buf):
+            run(asyncio.sleep(0.3))
+            self.assertIn(quirky.get_mention(), buf.getvalue())
+
+        self.assertEqual([u.uuid for u in self.bot._queue], [wumpus.id])
+        self.assertEqual([u.uuid for u in self.bot._waitlist], [cyber.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import os
+import unittest
+import tempfile
+from .utils import *
+
+from queuebot import ConfigError
+
+
+class WaitlistTest(BotTestCase):
+    config_changes = {"CAPACITY": "2"}
+
+    def setUp(self):
+        super().setUp()
+        self.students = get_n_rand(ALL_STUDENTS, 5)
+
+    def test_invalid_capacity(self):
+        for capacity in ("-1", "lots", "2.5"):
+            with self.assertRaises(ConfigError):
+                make_config(CAPACITY=capacity)
+        self.assertEqual(make_config(CAPACITY="").CAPACITY, 0)
+
+    def test_waitlist(self):
+        a, b, c, d, e = self.students
+        self.command("!q join", a)
+        self.command("!q join", b)
+        self.assertEqual(self.command("!q join", c), [
+            f"✅ {c.get_mention()} the queue is full (2 people). You have been added to the waitlist at position #1\n"
+            "*You will be moved into the queue as it goes down*"])
+        self.command("!q join", d)
+        self.command("!q join", e)
+        self.assertEqual(len(self.bot._queue), 2)
+        self.assertEqual(len(self.bot._waitlist), 3)
+
+        self.assertEqual(self.command("!q join", d), [f"⚠️ {d.get_mention()} you are already on the waitlist at position #2"])
+        self.assertEqual(self.command("!q position", d), [
+            f"{d.get_mention()} the queue is full. You are #2 on the waitlist and will be moved into the queue as it goes down"])
+        self.assertEqual(self.command("!q count", d), [f"{d.get_mention()} there are 2 people in the queue and 3 on the waitlist"])
+
+        # Leaving the waitlist doesn't promote anyone
+        self.command("!q leave", e)
+        self.assertEqual(list(self.bot._waitlist), [c, d])
+
+        # Popping two people promotes both waiting students in one message
+        output = self.command("!q next 2", get_rand_element(ALL_TAS))
+        self.assertEqual(output[-1], f"✅ {c.get_mention()} {d.get_mention()} you have been moved from the waitlist " +
+                         "into the queue (positions #1-#2)")
+        self.assertEqual(list(self.bot._queue), [c, d])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+        # Room again: joins go straight into the queue
+        self.command("!q leave", d)
+        self.assertEqual(self.command("!q join", e)[0].split("\n")[0], f"✅ {e.get_mention()} you have been added at position #2")
+
+    def test_no_capacity(self):
+        self.bot.config = make_config(CAPACITY="0")
+        for student in self.students:
+            self.command("!q join", student)
+        self.assertEqual(len(self.bot._queue), 5)
+
+        # Turning CAPACITY off moves everyone on the waitlist into the queue
+        self.bot.config = self.config.copy()
+        self.bot._queue.clear()
+        for student in self.students:
+            self.command("!q join", student)
+        self.bot.config = make_config(CAPACITY="0")
+        self.command("!q leave", self.students[0])
+        self.assertEqual(list(self.bot._queue), self.students[1:])
+
+    def test_shed_joins(self):
+        self.bot._sends_in_flight = self.config.SEND_BACKLOG
+        first, second = self.students[:2]
+        self.assertEqual(self.command("!q join", first), ["⚠️ The bot is busy. Please wait a few seconds then run `!q join` again"])
+        # Only one reply while the backlog lasts
+        self.assertEqual(self.command("!q join", second), [])
+        self.assertEqual(len(self.bot._queue), 0)
+
+        self.bot._sends_in_flight = 0
+        self.command("!q join", first)
+        self.assertEqual(list(self.bot._queue), [first])
+
+    def test_no_shedding(self):
+        for backlog in ("-1", "many"):
+            with self.assertRaises(ConfigError):
+                make_config(SEND_BACKLOG=backlog)
+
+        self.bot.config = make_config(SEND_BACKLOG="0")
+        self.bot._sends_in_flight = 1000
+        self.command("!q join", self.students[0])
+        self.assertEqual(list(self.bot._queue), self.students[:1])
+
+    def test_clear_promotes(self):
+        a, b, c, d = self.students[:4]
+        for student in (a, b, c, d):
+            self.command("!q join", student)
+        output = self.command("!q clear", get_rand_element(ALL_TAS))
+        self.assertEqual(output[-1], f"✅ {c.get_mention()} {d.get_mention()} you have been moved from the waitlist " +
+                         "into the queue (positions #1-#2)")
+        self.assertEqual(list(self.bot._queue), [c, d])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+    def test_confirmed_clear_promotes(self):
+        a, b, c = self.students[:3]
+        for student in (a, b, c):
+            self.command("!q join", student)
+
+        # Outside of testing mode the queue is cleared once a TA reacts, not by run_command
+        self.bot.testing = False
+        ta = get_rand_element(ALL_TAS)
+        self.command("!q clear", ta)
+        self.assertEqual(list(self.bot._queue), [a, b])
+
+        self.transport.sent.clear()
+        pending, = self.bot._confirmations.values()
+        run(self.bot.on_raw_reaction_add(MockReactionPayload(pending.message, ta, "✅")))
+        self.assertEqual(list(self.bot._queue), [c])
+        self.assertEqual(len(self.bot._waitlist), 0)
+        self.assertEqual(self.transport.texts(), [
+            f"✅ {c.get_mention()} you have been moved from the waitlist into the queue (position #1)"])
+
+    def waitlist_three(self):
+        a, b, c = self.students[:3]
+        for student in (a, b, c):
+            self.command("!q join", student)
+        self.assertEqual(list(self.bot._waitlist), [c])
+        return a, b, c
+
+    def test_add_waitlisted(self):
+        a, b, c = self.waitlist_three()
+        ta = get_rand_element(ALL_TAS)
+        self.command("!q add " + c.get_mention(), ta, [c])
+        self.assertEqual(list(self.bot._queue), [a, b, c])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+        # c is only served once
+        for _ in range(3):
+            self.command("!q next", ta)
+        self.assertEqual(len(self.bot._queue), 0)
+
+    def test_front_waitlisted(self):
+        a, b, c = self.waitlist_three()
+        self.command("!q front " + c.get_mention(), get_rand_element(ALL_TAS), [c])
+        self.assertEqual(list(self.bot._queue), [c, a, b])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+    def test_import_waitlisted(self):
+        a, b, c = self.waitlist_three()
+        data = (f"position,uuid,name,discriminator,nick,join_time\n"
+                f"1,{c.id},{c.name},{c.discriminator},,\n").encode()
+        message = MockMessage("!q import", get_rand_element(ALL_TAS))
+        message.attachments = [MockAttachment("queue.csv", data)]
+        run(self.bot.run_command(message))
+        self.assertEqual(list(self.bot._queue), [a, b, c])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+    def test_remove_waitlisted(self):
+        a, b, c = self.waitlist_three()
+        ta = get_rand_element(ALL_TAS)
+        self.assertEqual(self.command("!q remove " + c.get_mention(), ta, [c]),
+                         [f"✅ {c.nick or c.name} has been removed from the waitlist"])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+        d = self.students[3]
+        self.command("!q join", d)
+        output = self.command(f"!q remove {a.get_mention()} {d.get_mention()} {c.get_mention()}", ta, [a, d, c])
+        self.assertEqual(output, [f"✅ Removed from the queue: {a.nick or a.name}\n"
+                                  f"Removed from the waitlist: {d.nick or d.name}\n"
+                                  f"Not in the queue: {c.nick or c.name}"])
+        self.assertEqual(list(self.bot._queue), [b])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+    def test_promote_skips_queued(self):
+        a, b, c = self.waitlist_three()
+        # Both lists hold c (as they could before add/front/import took people off the waitlist)
+        self.bot._queue.append(self.bot._waitlist[0])
+        self.command("!q next 2", get_rand_element(ALL_TAS))
+        self.assertEqual(list(self.bot._queue), [c])
+        self.assertEqual(len(self.bot._waitlist), 0)
+
+    def test_saved_waitlist(self):
+        for student in self.students[:3]:
+            self.command("!q join", student)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "queue.json")
+            self.bot.save_state(path)
+            bot = self.make_bot(**self.config_changes)
+            self.assertTrue(bot.load_state(path))
+        self.assertEqual(list(bot._queue), self.students[:2])
+        self.assertEqual(list(bot._waitlist), self.students[2:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
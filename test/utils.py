@@ -1,6 +1,10 @@
 import unittest
 import asyncio
 import random
+import itertools
+import discord
+
+from queuebot import QueueBot, QueueConfig, MemoryTransport
 
 def run(ctx):
     return asyncio.get_event_loop().run_until_complete(ctx)
@@ -38,9 +42,15 @@ class MockLogger:
     def info(self, str):
         pass
 
+    def warning(self, str):
+        pass
+
     def debug(self, str):
         pass
 
+    def error(self, str):
+        pass
+
 class MockRole:
     def __init__(self, name):
         self.name = name
@@ -62,10 +72,25 @@ class MockAuthor:
         self.nick = nick
         self.mention = self.get_mention()
         self.roles = [MockRole(r) for r in roles]
+        self.dms_open = True
+        self.dms_created = 0
+        self.voice = None
+        self.move_delay = 0
+        self.move_error = None
+
+    async def move_to(self, channel, reason=None):
+        await asyncio.sleep(self.move_delay)
+        if self.move_error is not None:
+            raise self.move_error
+        self.voice = MockVoiceState(channel)
 
     def get_mention(self):
         return f"<@{self.id}>"
 
+    async def create_dm(self):
+        self.dms_created += 1
+        return MockDMChannel(self)
+
     def __eq__(self, other):
         return self.id == other
 
@@ -76,12 +101,57 @@ class MockAuthor:
         return f"MockAuthor('{self.name}')"
 
 
+class MockResponse:
+    def __init__(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+class MockDMChannel:
+    def __init__(self, recipient):
+        self.recipient = recipient
+        self.sent = []
+
+    async def send(self, content=None):
+        if not self.recipient.dms_open:
+            raise discord.Forbidden(MockResponse(403, "Forbidden"), "Cannot send messages to this user")
+        self.sent.append(content)
+
+
+_message_ids = itertools.count(1)
+
 class MockMessage:
     def __init__(self, content, author, mentions=None):
+        self.id = next(_message_ids)
         self.content = content
         self.author = author
         self.channel = None
+        self.guild = None
         self.mentions = mentions if mentions is not None else []
+        self.attachments = []
+        self.reactions = []
+
+    async def edit(self, content=None):
+        self.content = content
+
+    async def add_reaction(self, emoji):
+        self.reactions.append(emoji)
+
+class MockAttachment:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.data = data
+        self.size = len(data)
+
+    async def save(self, fp):
+        fp.write(self.data)
+        return len(self.data)
+
+class MockReactionPayload:
+    def __init__(self, message, member, emoji):
+        self.message_id = message.id
+        self.user_id = member.id
+        self.member = member
+        self.emoji = emoji
 
 class MockVoice:
     def __init__(self, name, members=None):
@@ -119,6 +189,37 @@ class MockVoice:
     def __repr__(self):
         return f"MockVoice('{self.name}', members={self.members})"
 
+class MockVoiceState:
+    def __init__(self, channel=None):
+        self.channel = channel
+
+class MockChannel:
+    def __init__(self, name):
+        self.id = gen_id(18)
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+class MockGuild:
+    def __init__(self, roles=[], text_channels=[], voice_channels=[]):
+        self.id = gen_id(18)
+        self.roles = {gen_id(18): MockRole(r) for r in roles}
+        self.text_channels = [MockChannel(name) for name in text_channels]
+        self.voice_channels = [MockVoice(name) for name in voice_channels]
+        self.members = {}
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def get_role_id(self, name):
+        for role_id, role in self.roles.items():
+            if role.name == name:
+                return role_id
+
 TA_NAMES = [
     ("Russ", None),
     ("Nick", None),
@@ -159,3 +260,55 @@ ALL_STUDENTS = [ MockAuthor(*user) for user in STUDENT_NAMES ]
 ALL_TAS = [ MockAuthor(*user, ["UGTA"]) for user in TA_NAMES ]
 
 assert len(set([user.id for user in ALL_STUDENTS])) == len(ALL_STUDENTS), "User IDs not unique"
+
+
+# Config the bot tests start from. Tests which need other options pass them to make_config
+CONFIG_DICT = {
+    "SECRET_TOKEN": "NOONEWILLEVERGUESSTHISSUPERSECRETSTRINGMWAHAHAHA",
+    "TA_ROLES": ["UGTA"],
+    "LISTEN_CHANNELS": ["join-queue"],
+    "CHECK_VOICE_WAITING": "False",
+    "VOICE_WAITING": "waiting-room",
+    "ALERT_ON_FIRST_JOIN": "False",
+    "VOICE_OFFICES": ["Office Hours Room 1", "Office Hours Room 2"],
+    "ALERTS_CHANNEL": "queue-alerts",
+}
+
+def make_config(**changes):
+    return QueueConfig(dict(CONFIG_DICT, **changes), test_mode=True)
+
+class BotTestCase(unittest.TestCase):
+    """
+    Runs commands against a QueueBot which keeps its replies in self.transport
+
+    Subclasses set config_changes for the options they need (on top of CONFIG_DICT).
+    Set transport_class to None to have replies printed like other tests (testing=True)
+    """
+    config_changes = {}
+    transport_class = MemoryTransport
+    testing = True
+
+    def setUp(self):
+        random.seed(SEED)
+        self.bot = self.make_bot(**self.config_changes)
+        self.config = self.bot.config
+        self.transport = self.bot.transport
+        self.bot.listen_channels = [MockChannel("join-queue")]
+
+    def make_bot(self, **changes):
+        transport = self.transport_class() if self.transport_class is not None else None
+        bot = QueueBot(make_config(**changes), None, testing=self.testing, transport=transport)
+        bot.logger = MockLogger()
+        bot.change_presence = self.change_presence
+        return bot
+
+    async def change_presence(self, activity=None):
+        pass
+
+    def command(self, text, author, mentions=None):
+        """
+        Returns: text of every reply to the command (with its prefix emote)
+        """
+        self.transport.sent.clear()
+        run(self.bot.run_command(MockMessage(text, author, mentions)))
+        return self.transport.texts()